@@ -1,5 +1,10 @@
 import streamlit as st
+from utils import opta_prefetch
 
 st.set_page_config(page_title="Football Pro", layout="wide")
 st.title("⚽ Главная страница")
-st.write("👈 Выбери **Match Analysis** в меню слева, чтобы смотреть графики!")
\ No newline at end of file
+st.write("👈 Выбери **Match Analysis** в меню слева, чтобы смотреть графики!")
+
+# Фоновая предзагрузка последних матчей Opta (если задан PREFETCH_COMPETITIONS).
+# Служебные панели (кэши, загрузки, рендер, импорты) - на странице Cache Admin
+opta_prefetch.start()
@@ -1,21 +1,17 @@
 import streamlit as st
 import requests
-import json
-import re
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import to_rgba, LinearSegmentedColormap
 import matplotlib.colors as mcolors
-from matplotlib.font_manager import FontProperties
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-from matplotlib.lines import Line2D
-from mplsoccer import Pitch, VerticalPitch, add_image
-from PIL import Image
-from scipy.interpolate import make_interp_spline
 from urllib.request import urlopen
 import warnings
 import io
+from utils import lazy, opta_feed, shared_cache
+
+# Графический стек импортируется при первом графике, а не при открытии страницы (utils/lazy.py)
+Pitch, VerticalPitch = lazy.attrs('mplsoccer', 'Pitch', 'VerticalPitch')
+pitch_cache = lazy.module('utils.pitch_cache')
+render = lazy.module('utils.render')
 
 # Игнорируем предупреждения pandas
 warnings.simplefilter(action="ignore", category=pd.errors.SettingWithCopyWarning)
@@ -25,11 +21,12 @@ st.set_page_config(page_title="WT Analysis - Match Visuals", layout="wide", page
 
 # --- ЗАГРУЗКА ЛОКАЛЬНЫХ ФАЙЛОВ (БЕЗОПАСНАЯ) ---
 def load_local_asset(filename, file_type="excel"):
+    # Файл читается один раз на процесс, а не при каждом перезапуске страницы
     try:
         if file_type == "excel":
-            return pd.read_excel(filename)
+            return lazy.table(filename)
         elif file_type == "image":
-            return Image.open(filename)
+            return lazy.image(filename)
     except FileNotFoundError:
         return None
 
@@ -85,49 +82,36 @@ if selected_season != "-- Select Season --" and selected_competition != "-- Sele
         st.sidebar.warning("Competition ID not found.")
 
 # --- 2. ЗАГРУЗКА СПИСКА МАТЧЕЙ ---
-headers = {
-    'Referer': 'https://www.scoresway.com/',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
-}
-
 @st.cache_data(ttl=3600)
+@shared_cache.cached('performfeeds.schedule', ttl=3600)
 def fetch_matches(season_id):
     all_matches = []
     page = 1
-    page_size = 400
     while True:
-        callback = "W385e5c699195bebaec15e4789d8caa477937fcb98"
-        url = (f"https://api.performfeeds.com/soccerdata/match/ft1tiv1inq7v1sk3y9tv12yh5/"
-               f"?_rt=c&tmcl={season_id}&live=yes&_pgSz={page_size}&_pgNm={page}"
-               f"&_lcl=en&_fmt=jsonp&sps=widgets&_clbk={callback}")
-        
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code != 200: break
-            
-            jsonp_data = response.text
-            match = re.search(r'\((.*)\)', jsonp_data)
-            if not match: break
-            
-            schedule_data = json.loads(match.group(1))
-            matches = schedule_data.get('match', [])
-            if not matches: break
-            
-            if not isinstance(matches, list): matches = [matches]
-            
-            for m in matches:
-                info = m.get('matchInfo', {})
-                if info:
-                    all_matches.append({
-                        'id': info.get('id'),
-                        'description': info.get('description'),
-                        'date': info.get('date'),
-                        'time': info.get('time')
-                    })
-            page += 1
+            # Страница расписания через общий загрузчик фидов (одна загрузка на все сессии)
+            schedule_data = opta_feed.fetch_schedule_page(season_id, page)
+        except (requests.HTTPError, ValueError):
+            break
         except Exception as e:
             st.error(f"Error fetching matches: {e}")
             break
+
+        matches = schedule_data.get('match', [])
+        if not matches: break
+
+        if not isinstance(matches, list): matches = [matches]
+
+        for m in matches:
+            info = m.get('matchInfo', {})
+            if info:
+                all_matches.append({
+                    'id': info.get('id'),
+                    'description': info.get('description'),
+                    'date': info.get('date'),
+                    'time': info.get('time')
+                })
+        page += 1
     return pd.DataFrame(all_matches)
 
 matchlink = None
@@ -161,11 +145,7 @@ if dataafterleague:
 if matchlink:
     with st.spinner("Fetching Match Data..."):
         try:
-            url = f'https://api.performfeeds.com/soccerdata/matchevent/ft1tiv1inq7v1sk3y9tv12yh5/{matchlink}?_rt=c&_lcl=en&_fmt=jsonp&sps=widgets&_clbk=W351bc3acc0d0c4e5b871ac99dfbfeb44bb58ba1dc'
-            resp = requests.get(url, headers=headers)
-            
-            cleaned_text = re.sub(r'^.*?\(', '', resp.text)[:-1]
-            data = json.loads(cleaned_text)
+            data = opta_feed.fetch_matchevent(matchlink)
             
             matchevents = data.get('liveData', {})
             matchinfo = data.get('matchInfo', {})
@@ -248,23 +228,24 @@ if matchlink:
                     with col1:
                         # Рисуем поле
                         pitch = VerticalPitch(pitch_type='opta', pitch_color='white', line_color='black')
-                        fig, ax = pitch.draw(figsize=(10, 14))
+                        with render.chart('comparison_event_map', figsize=(10, 14)) as (fig, ax):
+                            pitch_cache.draw(pitch, ax=ax)
                         
-                        # Пасы
-                        passes = p_events[p_events['typeId'] == 'Pass']
-                        succ_pass = passes[passes['outcome'] == 1]
-                        fail_pass = passes[passes['outcome'] == 0]
+                            # Пасы
+                            passes = p_events[p_events['typeId'] == 'Pass']
+                            succ_pass = passes[passes['outcome'] == 1]
+                            fail_pass = passes[passes['outcome'] == 0]
                         
-                        pitch.lines(succ_pass.x, succ_pass.y, succ_pass.end_x, succ_pass.end_y, ax=ax, color='green', label='Completed')
-                        pitch.lines(fail_pass.x, fail_pass.y, fail_pass.end_x, fail_pass.end_y, ax=ax, color='red', alpha=0.5, label='Incomplete')
+                            pitch.lines(succ_pass.x, succ_pass.y, succ_pass.end_x, succ_pass.end_y, ax=ax, color='green', label='Completed')
+                            pitch.lines(fail_pass.x, fail_pass.y, fail_pass.end_x, fail_pass.end_y, ax=ax, color='red', alpha=0.5, label='Incomplete')
                         
-                        # Удары
-                        shots = p_events[p_events['typeId'].isin(['Goal', 'Miss', 'Attempt Saved'])]
-                        pitch.scatter(shots.x, shots.y, ax=ax, color='blue', s=100, label='Shot')
+                            # Удары
+                            shots = p_events[p_events['typeId'].isin(['Goal', 'Miss', 'Attempt Saved'])]
+                            pitch.scatter(shots.x, shots.y, ax=ax, color='blue', s=100, label='Shot')
                         
-                        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.05), ncol=3)
-                        ax.set_title(f"{player_choice} - Event Map")
-                        st.pyplot(fig)
+                            ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.05), ncol=3)
+                            ax.set_title(f"{player_choice} - Event Map")
+                            st.pyplot(fig)
                     
                     with col2:
                         st.write(f"**Total Events:** {len(p_events)}")
@@ -280,15 +261,15 @@ if matchlink:
                     # Сглаживание
                     momentum_df['diff'] = (momentum_df.get(hometeamname, 0) - momentum_df.get(awayteamname, 0)).rolling(5).mean()
                     
-                    fig, ax = plt.subplots(figsize=(12, 6))
-                    x = momentum_df.index
-                    y = momentum_df['diff']
+                    with render.chart('comparison_momentum', figsize=(12, 6)) as (fig, ax):
+                        x = momentum_df.index
+                        y = momentum_df['diff']
                     
-                    ax.fill_between(x, y, where=(y > 0), color=homecolor1, alpha=0.5, label=hometeamname)
-                    ax.fill_between(x, y, where=(y <= 0), color=awaycolor1, alpha=0.5, label=awayteamname)
-                    ax.axhline(0, color='black', linewidth=1)
-                    ax.set_title("Match Momentum (Events Rolling Avg)")
-                    st.pyplot(fig)
+                        ax.fill_between(x, y, where=(y > 0), color=homecolor1, alpha=0.5, label=hometeamname)
+                        ax.fill_between(x, y, where=(y <= 0), color=awaycolor1, alpha=0.5, label=awayteamname)
+                        ax.axhline(0, color='black', linewidth=1)
+                        ax.set_title("Match Momentum (Events Rolling Avg)")
+                        st.pyplot(fig)
                 else:
                     st.warning("Not enough data for momentum.")
 
@@ -303,13 +284,14 @@ if matchlink:
                 team_pos = avg_pos[avg_pos['team_name'] == team_choice]
                 
                 pitch = Pitch(pitch_type='opta', pitch_color='#aabb97', line_color='white', stripe=True)
-                fig, ax = pitch.draw(figsize=(10, 6))
+                with render.chart('comparison_avg_positions', figsize=(10, 6)) as (fig, ax):
+                    pitch_cache.draw(pitch, ax=ax)
                 
-                pitch.scatter(team_pos.x, team_pos.y, s=300, c='red', edgecolors='black', ax=ax)
-                for index, row in team_pos.iterrows():
-                    pitch.annotate(row['playerName'], xy=(row.x, row.y), c='white', va='center', ha='center', size=8, ax=ax)
+                    pitch.scatter(team_pos.x, team_pos.y, s=300, c='red', edgecolors='black', ax=ax)
+                    for index, row in team_pos.iterrows():
+                        pitch.annotate(row['playerName'], xy=(row.x, row.y), c='white', va='center', ha='center', size=8, ax=ax)
                 
-                st.pyplot(fig)
+                    st.pyplot(fig)
 
             # TAB 4: PASS MAP (NETWORK)
             with tab4:
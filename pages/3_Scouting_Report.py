@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from mplsoccer import Pitch, VerticalPitch
-from scipy.spatial import ConvexHull
-from matplotlib.colors import LinearSegmentedColormap
-import matplotlib.patheffects as path_effects
-from utils.data import get_competitions, get_matches, get_events
+from utils.data import get_competitions, get_matches, get_events, get_events_index
+from utils import lazy, season_index, similarity, percentiles
+
+# Графический стек - при первом графике, а не при открытии страницы (utils/lazy.py)
+plt = lazy.module('matplotlib.pyplot')
+Pitch, VerticalPitch, PyPizza = lazy.attrs('mplsoccer', 'Pitch', 'VerticalPitch', 'PyPizza')
+ConvexHull = lazy.attrs('scipy.spatial', 'ConvexHull')
+pitch_cache = lazy.module('utils.pitch_cache')
+render = lazy.module('utils.render')
+from utils.utils.season_engine import player_minutes, load_season_per_90, PER_90_STATS
 
 st.set_page_config(page_title="Match Dashboard", layout="wide")
 
@@ -34,12 +38,13 @@ match_id = matches[match_list == selected_match]['match_id'].values[0]
 
 with st.spinner('Loading tactical data...'):
     events = get_events(match_id)
+    events_idx = get_events_index(match_id)
 
-players = sorted(events['player'].dropna().unique())
+players = season_index.players(events_idx)
 player_name = st.selectbox("Select Player to Analyze", players)
 
-# Filter Data
-p_df = events[events['player'] == player_name].copy()
+# Filter Data (срез по индексу игрока вместо маски по всей таблице)
+p_df = season_index.player_events(events_idx, player_name).copy()
 if p_df.empty:
     st.error("No data for this player.")
     st.stop()
@@ -51,111 +56,164 @@ col1, col2, col3 = st.columns(3)
 with col1:
     st.markdown("<h4 style='text-align: center; color: #E63946;'>Offensive Actions</h4>", unsafe_allow_html=True)
     pitch = VerticalPitch(pitch_type='statsbomb', line_color='#444444', pitch_color='#1a1a1a')
-    fig, ax = pitch.draw(figsize=(10, 14))
-
-    # 1. Passes (Arrows)
-    passes = p_df[p_df['type'] == 'Pass']
-    # Successful
-    succ_pass = passes[passes['pass_outcome'].isna()]
-    if not succ_pass.empty and 'pass_end_location' in succ_pass.columns:
-        pitch.arrows(succ_pass.x, succ_pass.y,
-                     succ_pass['pass_end_location'].apply(lambda x: x[0] if isinstance(x, list) else 0),
-                     succ_pass['pass_end_location'].apply(lambda x: x[1] if isinstance(x, list) else 0),
-                     ax=ax, width=2, headwidth=8, color='#00b4d8', alpha=0.7, label='Succ. Pass')
+    with render.chart('scouting_offense', figsize=(10, 14)) as (fig, ax):
+        pitch_cache.draw(pitch, ax=ax)
+
+        # 1. Passes (Arrows)
+        passes = p_df[p_df['type'] == 'Pass']
+        # Successful
+        succ_pass = passes[passes['pass_outcome'].isna()]
+        if not succ_pass.empty:
+            pitch.arrows(succ_pass.x, succ_pass.y,
+                         succ_pass.end_x.fillna(0), succ_pass.end_y.fillna(0),
+                         ax=ax, width=2, headwidth=8, color='#00b4d8', alpha=0.7, label='Succ. Pass')
     
-    # Key Passes (Purple)
-    key_passes = passes[passes.get('pass_shot_assist', False) == True]
-    if not key_passes.empty:
-        pitch.lines(key_passes.x, key_passes.y,
-                    key_passes['pass_end_location'].apply(lambda x: x[0]),
-                    key_passes['pass_end_location'].apply(lambda x: x[1]),
-                    ax=ax, lw=4, color='#9d4edd', transparent=True, comet=True, label='Key Pass')
-
-    # 2. Shots (Circles)
-    shots = p_df[p_df['type'] == 'Shot']
-    goals = shots[shots['shot_outcome'] == 'Goal']
-    no_goals = shots[shots['shot_outcome'] != 'Goal']
+        # Key Passes (Purple)
+        key_passes = passes[passes.get('pass_shot_assist', False) == True]
+        if not key_passes.empty:
+            pitch.lines(key_passes.x, key_passes.y,
+                        key_passes.end_x, key_passes.end_y,
+                        ax=ax, lw=4, color='#9d4edd', transparent=True, comet=True, label='Key Pass')
+
+        # 2. Shots (Circles)
+        shots = p_df[p_df['type'] == 'Shot']
+        goals = shots[shots['shot_outcome'] == 'Goal']
+        no_goals = shots[shots['shot_outcome'] != 'Goal']
     
-    pitch.scatter(no_goals.x, no_goals.y, ax=ax, s=100, c='none', edgecolors='#E63946', hatch='///', label='Shot')
-    pitch.scatter(goals.x, goals.y, ax=ax, s=200, c='#E63946', edgecolors='white', marker='football', label='Goal')
+        pitch.scatter(no_goals.x, no_goals.y, ax=ax, s=100, c='none', edgecolors='#E63946', hatch='///', label='Shot')
+        pitch.scatter(goals.x, goals.y, ax=ax, s=200, c='#E63946', edgecolors='white', marker='football', label='Goal')
 
-    # 3. Dribbles (Hexagons)
-    dribbles = p_df[(p_df['type'] == 'Dribble') & (p_df['dribble_outcome'] == 'Complete')]
-    pitch.scatter(dribbles.x, dribbles.y, ax=ax, s=150, marker='h', c='#ffba08', edgecolors='black', label='Dribble')
+        # 3. Dribbles (Hexagons)
+        dribbles = p_df[(p_df['type'] == 'Dribble') & (p_df['dribble_outcome'] == 'Complete')]
+        pitch.scatter(dribbles.x, dribbles.y, ax=ax, s=150, marker='h', c='#ffba08', edgecolors='black', label='Dribble')
 
-    # Legend
-    ax.legend(facecolor='#1a1a1a', edgecolor='none', labelcolor='white', loc='lower center', fontsize=9)
-    st.pyplot(fig)
+        # Legend
+        ax.legend(facecolor='#1a1a1a', edgecolor='none', labelcolor='white', loc='lower center', fontsize=9)
+        st.pyplot(fig)
 
 # ================= FIELD 2: DEFENSIVE ACTIONS =================
 with col2:
     st.markdown("<h4 style='text-align: center; color: #E63946;'>Defensive Actions</h4>", unsafe_allow_html=True)
     pitch = VerticalPitch(pitch_type='statsbomb', line_color='#444444', pitch_color='#1a1a1a')
-    fig, ax = pitch.draw(figsize=(10, 14))
+    with render.chart('scouting_defense', figsize=(10, 14)) as (fig, ax):
+        pitch_cache.draw(pitch, ax=ax)
 
-    # 1. Tackles
-    tackles = p_df[p_df['type'] == 'Duel'] # Statsbomb generic
-    # Это упрощение, в реальном SB надо смотреть duel_type
-    pitch.scatter(tackles.x, tackles.y, ax=ax, s=150, marker='x', c='#ef233c', linewidth=3, label='Duel/Tackle')
+        # 1. Tackles
+        tackles = p_df[p_df['type'] == 'Duel'] # Statsbomb generic
+        # Это упрощение, в реальном SB надо смотреть duel_type
+        pitch.scatter(tackles.x, tackles.y, ax=ax, s=150, marker='x', c='#ef233c', linewidth=3, label='Duel/Tackle')
 
-    # 2. Interceptions
-    interceptions = p_df[p_df['type'] == 'Interception']
-    pitch.scatter(interceptions.x, interceptions.y, ax=ax, s=150, marker='D', c='#3a86ff', edgecolors='white', label='Interception')
+        # 2. Interceptions
+        interceptions = p_df[p_df['type'] == 'Interception']
+        pitch.scatter(interceptions.x, interceptions.y, ax=ax, s=150, marker='D', c='#3a86ff', edgecolors='white', label='Interception')
 
-    # 3. Recoveries
-    recoveries = p_df[p_df['type'] == 'Ball Recovery']
-    pitch.scatter(recoveries.x, recoveries.y, ax=ax, s=120, marker='o', c='none', edgecolors='#ffbe0b', linewidth=2, label='Recovery')
+        # 3. Recoveries
+        recoveries = p_df[p_df['type'] == 'Ball Recovery']
+        pitch.scatter(recoveries.x, recoveries.y, ax=ax, s=120, marker='o', c='none', edgecolors='#ffbe0b', linewidth=2, label='Recovery')
     
-    # 4. Clearances
-    clearances = p_df[p_df['type'] == 'Clearance']
-    pitch.scatter(clearances.x, clearances.y, ax=ax, s=120, marker='^', c='#8338ec', label='Clearance')
+        # 4. Clearances
+        clearances = p_df[p_df['type'] == 'Clearance']
+        pitch.scatter(clearances.x, clearances.y, ax=ax, s=120, marker='^', c='#8338ec', label='Clearance')
 
-    ax.legend(facecolor='#1a1a1a', edgecolor='none', labelcolor='white', loc='lower center', fontsize=9)
-    st.pyplot(fig)
+        ax.legend(facecolor='#1a1a1a', edgecolor='none', labelcolor='white', loc='lower center', fontsize=9)
+        st.pyplot(fig)
 
 # ================= FIELD 3: TERRITORY & HULL =================
 with col3:
     st.markdown("<h4 style='text-align: center; color: #E63946;'>Touches & Territory</h4>", unsafe_allow_html=True)
     pitch = VerticalPitch(pitch_type='statsbomb', line_color='#444444', pitch_color='#1a1a1a')
-    fig, ax = pitch.draw(figsize=(10, 14))
+    with render.chart('scouting_territory', figsize=(10, 14)) as (fig, ax):
+        pitch_cache.draw(pitch, ax=ax)
 
-    # Все касания с координатами
-    touches = p_df[p_df['x'].notna()]
+        # Все касания с координатами
+        touches = p_df[p_df['x'].notna()]
     
-    # 1. Точки касаний (мелкие)
-    pitch.scatter(touches.x, touches.y, ax=ax, s=20, c='#E63946', alpha=0.3)
-
-    # 2. Convex Hull (Зона обитания)
-    if len(touches) > 4:
-        # Берем точки X и Y
-        points = touches[['x', 'y']].values
-        hull = ConvexHull(points)
-        # Рисуем полигон
-        path = ''
-        for vertex in hull.vertices:
-            path += f"{points[vertex, 0]},{points[vertex, 1]} "
+        # 1. Точки касаний (мелкие)
+        pitch.scatter(touches.x, touches.y, ax=ax, s=20, c='#E63946', alpha=0.3)
+
+        # 2. Convex Hull (Зона обитания)
+        if len(touches) > 4:
+            # Берем точки X и Y
+            points = touches[['x', 'y']].values
+            hull = ConvexHull(points)
+            # Рисуем полигон
+            path = ''
+            for vertex in hull.vertices:
+                path += f"{points[vertex, 0]},{points[vertex, 1]} "
         
-        # Используем mplsoccer polygon
-        pitch.polygon([points[hull.vertices]], ax=ax, facecolor='#E63946', alpha=0.2, edgecolor='#E63946', lw=2)
+            # Используем mplsoccer polygon
+            pitch.polygon([points[hull.vertices]], ax=ax, facecolor='#E63946', alpha=0.2, edgecolor='#E63946', lw=2)
 
-    # 3. Статистика внизу поля
-    ax.text(40, 125, f"Total Touches: {len(touches)}", color='white', ha='center', fontsize=12, fontweight='bold')
+        # 3. Статистика внизу поля
+        ax.text(40, 125, f"Total Touches: {len(touches)}", color='white', ha='center', fontsize=12, fontweight='bold')
     
-    # Final Third Touches
-    ft_touches = len(touches[touches['x'] > 80])
-    ax.text(40, 122, f"Final 3rd: {ft_touches}", color='#ffba08', ha='center', fontsize=10)
+        # Final Third Touches
+        ft_touches = len(touches[touches['x'] > 80])
+        ax.text(40, 122, f"Final 3rd: {ft_touches}", color='#ffba08', ha='center', fontsize=10)
 
-    # Box Touches
-    box_touches = len(touches[(touches['x'] > 102) & (touches['y'] > 18) & (touches['y'] < 62)])
-    ax.text(40, 119, f"Box: {box_touches}", color='#3a86ff', ha='center', fontsize=10)
+        # Box Touches
+        box_touches = len(touches[(touches['x'] > 102) & (touches['y'] > 18) & (touches['y'] < 62)])
+        ax.text(40, 119, f"Box: {box_touches}", color='#3a86ff', ha='center', fontsize=10)
 
-    st.pyplot(fig)
+        st.pyplot(fig)
 
 # --- FOOTER STATS ---
 st.markdown("---")
 col_s1, col_s2, col_s3, col_s4, col_s5 = st.columns(5)
-col_s1.metric("Minutes", "90'") # Хардкод для примера, можно вытащить из substitution
+# Реальные минуты: старт, замены, удаления
+match_minutes = player_minutes(events)
+p_minutes = match_minutes.xs(player_name, level='player').sum() if player_name in match_minutes.index.get_level_values('player') else 0
+col_s1.metric("Minutes", f"{int(round(p_minutes))}'")
 col_s2.metric("Passes", f"{len(succ_pass)}/{len(passes)}")
 col_s3.metric("Shots", len(shots))
 col_s4.metric("Key Passes", len(key_passes))
-col_s5.metric("xG", round(p_df['shot_statsbomb_xg'].sum(), 2) if 'shot_statsbomb_xg' in p_df.columns else 0)
\ No newline at end of file
+col_s5.metric("xG", round(p_df['shot_statsbomb_xg'].sum(), 2) if 'shot_statsbomb_xg' in p_df.columns else 0)
+
+# --- SEASON PER 90 ---
+# Матрица игрок x показатель по всей лиге считается один раз (кэш), дальше поиск игрока - .loc
+if st.toggle("Season per 90 (whole competition)"):
+    with st.spinner('Loading season profile...'):
+        season_p90 = load_season_per_90(comp_id, season_id, team_name=None)
+    if not season_p90.empty and player_name in season_p90.index.get_level_values('player'):
+        p_season = season_p90.loc[player_name].iloc[0]
+        cols = st.columns(len(PER_90_STATS) + 1)
+        cols[0].metric("Season Minutes", int(p_season['Minutes']))
+        for col, stat in zip(cols[1:], PER_90_STATS):
+            col.metric(f"{stat} p90", p_season[f"{stat} p90"])
+    else:
+        st.info("No season data for this player.")
+
+# --- SIMILAR PLAYERS ---
+# Индекс строится один раз на сезон; новые матчи сезона досворачиваются в него (utils/similarity.py)
+if st.toggle("Similar players (whole competition)"):
+    with st.spinner('Building season profiles...'):
+        sim_index = similarity.season_index(comp_id, season_id, matches['match_id'].tolist())
+    similar = similarity.similar_players(sim_index, player_name, k=10) if sim_index is not None else pd.DataFrame()
+    if similar.empty:
+        st.info(f"Not enough season minutes for this player (min {similarity.MIN_MINUTES}').")
+    else:
+        st.dataframe(similar.round(2), hide_index=True, use_container_width=True)
+
+# --- SEASON PERCENTILES (RADAR) ---
+if st.toggle("Season percentiles vs same position"):
+    min_minutes = st.select_slider("Minimum season minutes", options=percentiles.MINUTE_THRESHOLDS, value=450)
+    with st.spinner('Ranking the competition...'):
+        pct_tables = percentiles.load_percentile_tables(comp_id, season_id)
+    # Таблицы посчитаны заранее: смена игрока / фильтра - только поиск строки
+    p_row = percentiles.percentile_row(pct_tables, player_name, min_minutes)
+    if p_row is None:
+        st.info(f"{player_name} has fewer than {min_minutes} season minutes.")
+    else:
+        params = [s.replace(" p90", "") for s in percentiles.PERCENTILE_STATS]
+        values = [int(p_row[f"{s} pct"]) for s in percentiles.PERCENTILE_STATS]
+        baker = PyPizza(params=params, background_color="#121212", straight_line_color="#444444",
+                        last_circle_color="#444444", other_circle_color="#333333")
+        fig, ax = baker.make_pizza(
+            values, figsize=(7, 7), slice_colors=["#E63946"] * len(values), value_colors=["#ffffff"] * len(values),
+            value_bck_colors=["#E63946"] * len(values),
+            kwargs_params=dict(color="#ffffff", fontsize=11), kwargs_values=dict(color="#ffffff", fontsize=11),
+        )
+        fig.set_facecolor("#121212")
+        st.caption(f"Percentile among {p_row['Position'] or 'all'} players with {min_minutes}+ minutes")
+        st.pyplot(fig)
+        plt.close(fig) # PyPizza рисует через pyplot - в пул такую фигуру не взять
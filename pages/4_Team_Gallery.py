@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from mplsoccer import VerticalPitch, Pitch
-from matplotlib.colors import LinearSegmentedColormap
-from utils.data import get_competitions, get_matches, get_events
+from utils.data import get_competitions, get_matches, get_events, get_events_index
+from utils import heatmap, lazy, season_index
+
+# Графический стек - при первом графике, а не при открытии страницы (utils/lazy.py)
+VerticalPitch, Pitch = lazy.attrs('mplsoccer', 'VerticalPitch', 'Pitch')
+pitch_cache = lazy.module('utils.pitch_cache')
+render = lazy.module('utils.render')
 
 st.set_page_config(page_title="Team Gallery", layout="wide")
 
@@ -41,13 +44,14 @@ match_id = matches[match_list == selected_match]['match_id'].values[0]
 
 with st.spinner('Рисуем тактику...'):
     events = get_events(match_id)
+    events_idx = get_events_index(match_id)
 
 # Выбор команды
 teams = events['team'].unique()
 selected_team = st.sidebar.radio("Выберите команду для анализа", teams)
 
 # Фильтруем данные по команде
-team_events = events[events['team'] == selected_team]
+team_events = season_index.rows_by(events_idx, 'team', selected_team)
 
 # --- ТАБЫ (ВКЛАДКИ) ---
 tab1, tab2, tab3 = st.tabs(["⚽ xG Shot Map", "🕸️ Passing Network", "🛡️ Defense Map"])
@@ -69,23 +73,24 @@ with tab1:
 
         pitch = VerticalPitch(pitch_type='statsbomb', half=True, goal_type='box', 
                               line_color='white', pitch_color='#1a1a1a')
-        fig, ax = pitch.draw(figsize=(10, 8))
+        with render.chart('gallery_shot_map', figsize=(10, 8)) as (fig, ax):
+            pitch_cache.draw(pitch, ax=ax)
         
-        # 1. Рисуем ГОЛЫ (Зеленые)
-        goals = shots[shots['shot_outcome'] == 'Goal']
-        pitch.scatter(goals.x, goals.y, ax=ax, 
-                      s=goals['shot_statsbomb_xg'] * 900 + 100, # Размер зависит от xG
-                      edgecolors='#00e676', c='None', hatch='///', marker='o', label='Гол')
+            # 1. Рисуем ГОЛЫ (Зеленые)
+            goals = shots[shots['shot_outcome'] == 'Goal']
+            pitch.scatter(goals.x, goals.y, ax=ax, 
+                          s=goals['shot_statsbomb_xg'] * 900 + 100, # Размер зависит от xG
+                          edgecolors='#00e676', c='None', hatch='///', marker='o', label='Гол')
         
-        # 2. Рисуем ПРОМАХИ/СЕЙВЫ (Красные/Серые)
-        no_goals = shots[shots['shot_outcome'] != 'Goal']
-        pitch.scatter(no_goals.x, no_goals.y, ax=ax, 
-                      s=no_goals['shot_statsbomb_xg'] * 900 + 100, 
-                      c='#ff5252', alpha=0.5, edgecolors='white', label='Удар')
-
-        add_watermark(fig)
-        ax.legend(facecolor='#1a1a1a', edgecolor='white', labelcolor='white', loc='lower right')
-        st.pyplot(fig)
+            # 2. Рисуем ПРОМАХИ/СЕЙВЫ (Красные/Серые)
+            no_goals = shots[shots['shot_outcome'] != 'Goal']
+            pitch.scatter(no_goals.x, no_goals.y, ax=ax, 
+                          s=no_goals['shot_statsbomb_xg'] * 900 + 100, 
+                          c='#ff5252', alpha=0.5, edgecolors='white', label='Удар')
+
+            add_watermark(fig)
+            ax.legend(facecolor='#1a1a1a', edgecolor='white', labelcolor='white', loc='lower right')
+            st.pyplot(fig)
     
     with col2:
         st.write("#### Легенда")
@@ -114,27 +119,34 @@ with tab2:
     # Оставляем только тех, кто сделал больше 10 пасов (чтобы убрать замены)
     avg_loc = avg_loc[avg_loc['count'] > 10]
     
+    season_background = st.toggle("Фон за весь сезон", value=False)
+
     pitch = Pitch(pitch_type='statsbomb', pitch_color='#1a1a1a', line_color='#c7d5cc')
-    fig, ax = pitch.draw(figsize=(12, 8))
+    with render.chart('gallery_pass_density', figsize=(12, 8)) as (fig, ax):
+        pitch_cache.draw(pitch, ax=ax)
     
-    # Рисуем связи (Стрелки пасов) - упрощенно: просто плотность пасов
-    # kdeplot для красоты "потока" пасов
-    pitch.kdeplot(successful.x, successful.y, ax=ax, levels=50, shade=True, 
-                  cmap='magma', alpha=0.4, thresh=0.05)
+        # Рисуем связи (Стрелки пасов) - упрощенно: просто плотность пасов
+        # Плотность "потока" пасов: сглаженная сетка из кеша (см. utils/heatmap.py)
+        if season_background:
+            team_matches = matches[(matches['home_team'] == selected_team) | (matches['away_team'] == selected_team)]
+            density = heatmap.season_density(tuple(int(m) for m in team_matches['match_id']), selected_team)
+        else:
+            density = heatmap.match_density(int(match_id), selected_team)
+        heatmap.draw_density(ax, density, cmap='magma', alpha=0.4)
     
-    # Рисуем точки игроков
-    pitch.scatter(avg_loc.x, avg_loc.y, ax=ax, s=avg_loc['count']*10, 
-                  c='#00e676', edgecolors='black', linewidth=2, zorder=2)
+        # Рисуем точки игроков
+        pitch.scatter(avg_loc.x, avg_loc.y, ax=ax, s=avg_loc['count']*10, 
+                      c='#00e676', edgecolors='black', linewidth=2, zorder=2)
     
-    # Подписываем игроков
-    for name, row in avg_loc.iterrows():
-        # Берем только фамилию, чтобы не загромождать
-        short_name = name.split(" ")[-1]
-        pitch.annotate(short_name, xy=(row.x, row.y), ax=ax, 
-                       color='white', va='center', ha='center', size=10, weight='bold', zorder=3)
+        # Подписываем игроков
+        for name, row in avg_loc.iterrows():
+            # Берем только фамилию, чтобы не загромождать
+            short_name = name.split(" ")[-1]
+            pitch.annotate(short_name, xy=(row.x, row.y), ax=ax, 
+                           color='white', va='center', ha='center', size=10, weight='bold', zorder=3)
     
-    add_watermark(fig)
-    st.pyplot(fig)
+        add_watermark(fig)
+        st.pyplot(fig)
     st.caption("🔥 Фон (Heatmap) показывает зоны активного владения мячом. Точки — средние позиции игроков.")
 
 # ==========================================
@@ -150,23 +162,24 @@ with tab3:
     
     with col_d1:
         pitch = Pitch(pitch_type='statsbomb', pitch_color='#1a1a1a', line_color='white')
-        fig, ax = pitch.draw(figsize=(12, 8))
+        with render.chart('gallery_defense', figsize=(12, 8)) as (fig, ax):
+            pitch_cache.draw(pitch, ax=ax)
         
-        # Прессинг (желтый)
-        pressures = def_actions[def_actions['type'] == 'Pressure']
-        pitch.scatter(pressures.x, pressures.y, ax=ax, s=50, c='yellow', alpha=0.6, label='Прессинг')
+            # Прессинг (желтый)
+            pressures = def_actions[def_actions['type'] == 'Pressure']
+            pitch.scatter(pressures.x, pressures.y, ax=ax, s=50, c='yellow', alpha=0.6, label='Прессинг')
         
-        # Отборы/Дуэли (красный)
-        tackles = def_actions[def_actions['type'].isin(['Duel', 'Tackle'])]
-        pitch.scatter(tackles.x, tackles.y, ax=ax, s=100, marker='x', c='red', alpha=0.8, label='Отбор/Дуэль')
+            # Отборы/Дуэли (красный)
+            tackles = def_actions[def_actions['type'].isin(['Duel', 'Tackle'])]
+            pitch.scatter(tackles.x, tackles.y, ax=ax, s=100, marker='x', c='red', alpha=0.8, label='Отбор/Дуэль')
         
-        # Перехваты (синий)
-        interceptions = def_actions[def_actions['type'] == 'Interception']
-        pitch.scatter(interceptions.x, interceptions.y, ax=ax, s=80, marker='D', c='#29b6f6', edgecolors='white', label='Перехват')
+            # Перехваты (синий)
+            interceptions = def_actions[def_actions['type'] == 'Interception']
+            pitch.scatter(interceptions.x, interceptions.y, ax=ax, s=80, marker='D', c='#29b6f6', edgecolors='white', label='Перехват')
         
-        ax.legend(facecolor='#1a1a1a', edgecolor='white', labelcolor='white', loc='upper left')
-        add_watermark(fig)
-        st.pyplot(fig)
+            ax.legend(facecolor='#1a1a1a', edgecolor='white', labelcolor='white', loc='upper left')
+            add_watermark(fig)
+            st.pyplot(fig)
         
     with col_d2:
         st.write("#### Статистика обороны")
@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from mplsoccer import Pitch, VerticalPitch
-from statsbombpy import sb
-import os
+from utils.utils.season_engine import stream_season
+from utils import jobs, lazy, season_store, shared_cache
+
+# Тяжёлые модули - при первом обращении, а не при открытии страницы (utils/lazy.py)
+Pitch, VerticalPitch = lazy.attrs('mplsoccer', 'Pitch', 'VerticalPitch')
+sb = lazy.module('statsbombpy.sb')
+pitch_cache = lazy.module('utils.pitch_cache')
+render = lazy.module('utils.render')
 
 # --- НАСТРОЙКИ ---
 st.set_page_config(page_title="Season xT Analysis", layout="wide", page_icon="🧠")
@@ -42,88 +46,79 @@ xT_grid = np.array([
 ])
 
 def get_xt(x, y):
-    y_idx = int(np.clip(y / 80 * 8, 0, 7))
-    x_idx = int(np.clip(x / 120 * 12, 0, 11))
-    return xT_grid[y_idx][x_idx]
+    # Работает и с числами, и с целыми колонками (без apply по строкам)
+    y_idx = np.clip(np.asarray(y) / 80 * 8, 0, 7).astype(int)
+    x_idx = np.clip(np.asarray(x) / 120 * 12, 0, 11).astype(int)
+    return xT_grid[y_idx, x_idx]
 
 # --- 2. ТУРБО-ЛОАДЕР СЕЗОНА ---
 @st.cache_data
+@shared_cache.cached('sb.competitions', ttl=shared_cache.DAY)
 def get_competitions_cached():
     return sb.competitions()
 
+# Зоны для карт игрока: сетка 15x10 (как gridsize=15 у прежнего hexbin)
+ZONE_BINS = (15, 10)
+ZONE_COLS = [f"z{i}" for i in range(ZONE_BINS[0] * ZONE_BINS[1])]
+XT_COLUMNS = ['type', 'player', 'team', 'x', 'y', 'end_x', 'end_y']
+
+def xt_counts(ev):
+    # Reducer одного матча: суммы xT и зоны действий по (player, team).
+    # Считаем только положительный xT (не штрафуем за пасы назад)
+    ev = ev[ev['type'].isin(['Pass', 'Carry'])].dropna(subset=['x', 'y', 'end_x', 'end_y'])
+    ev = ev.assign(xT_added=get_xt(ev['end_x'], ev['end_y']) - get_xt(ev['x'], ev['y']))
+    ev = ev[ev['xT_added'] > 0]
+    if ev.empty:
+        return pd.DataFrame()
+
+    key = [ev['player'], ev['team']]
+    totals = pd.DataFrame({
+        'Total xT': ev.groupby(key)['xT_added'].sum(),
+        'Actions': ev.groupby(key).size(),
+        'Pass xT': ev['xT_added'].where(ev['type'] == 'Pass', 0).groupby(key).sum(),
+        'Carry xT': ev['xT_added'].where(ev['type'] == 'Carry', 0).groupby(key).sum(),
+    })
+
+    # Номер зоны = столбец * 10 + строка
+    zx = np.clip(ev['x'].to_numpy() / 120 * ZONE_BINS[0], 0, ZONE_BINS[0] - 1).astype(int)
+    zy = np.clip(ev['y'].to_numpy() / 80 * ZONE_BINS[1], 0, ZONE_BINS[1] - 1).astype(int)
+    zone = pd.Series(np.array(ZONE_COLS)[zx * ZONE_BINS[1] + zy], index=ev.index)
+    for action in ['Pass', 'Carry']:
+        mask = (ev['type'] == action).to_numpy()
+        zones = pd.crosstab([ev['player'][mask], ev['team'][mask]], zone[mask])
+        zones = zones.reindex(columns=ZONE_COLS, fill_value=0).add_prefix(f"{action} ")
+        totals = totals.join(zones, how='left')
+    totals.index.names = ['player', 'team']
+    return totals.fillna(0)
+
+def build_season_xt(competition_id, season_id, on_progress=None):
+    # Фоновая задача: потоком по матчам из хранилища (ДОЛГО, но один раз), результат - в хранилище сезона.
+    # Берем ВСЕ матчи лиги (а не только Барсы), чтобы рейтинг был честным
+    totals = stream_season(competition_id, season_id, xt_counts, XT_COLUMNS, on_progress=on_progress)
+    if not totals.empty:
+        season_store.write_table('xt_totals', competition_id, season_id, totals)
+    return totals
+
 def load_season_xt(competition_id, season_id):
-    # Уникальное имя файла для xT статистики
-    filename = f"xt_stats_comp_{competition_id}_season_{season_id}.csv"
-    
-    # 1. Если файл есть - грузим моментально
-    if os.path.exists(filename):
+    # Накопитель по (player, team): размер зависит от числа игроков, а не событий.
+    # None - таблицы сезона ещё нет, её нужно посчитать
+    totals = season_store.read_table('xt_totals', competition_id, season_id, index_col=['player', 'team'])
+    if totals is not None:
         st.toast("⚡ xT Данные загружены с диска!", icon="🚀")
-        return pd.read_csv(filename)
-    
-    # 2. Если нет - качаем и считаем (ДОЛГО, но один раз)
-    st.info("⚠️ Первый запуск: Скачиваем весь сезон и считаем xT для 100,000+ событий. Это займет 1-2 минуты.")
-    
-    matches = sb.matches(competition_id=competition_id, season_id=season_id)
-    # Берем ВСЕ матчи лиги (а не только Барсы), чтобы рейтинг был честным
-    match_ids = matches['match_id'].tolist()
-    
-    all_events = []
-    bar = st.progress(0, text="Анализ матчей...")
-    
-    for i, m_id in enumerate(match_ids):
-        try:
-            ev = sb.events(match_id=m_id)
-            # Оставляем только Пасы и Проходы (чтобы файл не был огромным)
-            ev = ev[ev['type'].isin(['Pass', 'Carry'])].copy()
-            
-            # Чистим координаты
-            if 'location' in ev.columns:
-                ev['x'] = ev['location'].apply(lambda x: x[0] if isinstance(x, list) else None)
-                ev['y'] = ev['location'].apply(lambda x: x[1] if isinstance(x, list) else None)
-            
-            # Координаты конца
-            ev['end_x'] = np.nan
-            ev['end_y'] = np.nan
-            
-            # Для пасов
-            if 'pass_end_location' in ev.columns:
-                mask_pass = ev['type'] == 'Pass'
-                ev.loc[mask_pass, 'end_x'] = ev.loc[mask_pass, 'pass_end_location'].apply(lambda x: x[0] if isinstance(x, list) else None)
-                ev.loc[mask_pass, 'end_y'] = ev.loc[mask_pass, 'pass_end_location'].apply(lambda x: x[1] if isinstance(x, list) else None)
-                
-            # Для проходов
-            if 'carry_end_location' in ev.columns:
-                mask_carry = ev['type'] == 'Carry'
-                ev.loc[mask_carry, 'end_x'] = ev.loc[mask_carry, 'carry_end_location'].apply(lambda x: x[0] if isinstance(x, list) else None)
-                ev.loc[mask_carry, 'end_y'] = ev.loc[mask_carry, 'carry_end_location'].apply(lambda x: x[1] if isinstance(x, list) else None)
-            
-            # Удаляем мусор без координат
-            ev = ev.dropna(subset=['x', 'y', 'end_x', 'end_y'])
-            
-            # --- СЧИТАЕМ xT ПРЯМО ЗДЕСЬ ---
-            # Это быстрее, чем потом
-            ev['xT_start'] = ev.apply(lambda r: get_xt(r['x'], r['y']), axis=1)
-            ev['xT_end'] = ev.apply(lambda r: get_xt(r['end_x'], r['end_y']), axis=1)
-            ev['xT_added'] = ev['xT_end'] - ev['xT_start']
-            
-            # Оставляем только нужные колонки
-            keep_cols = ['player', 'team', 'type', 'xT_added', 'x', 'y', 'end_x', 'end_y']
-            all_events.append(ev[keep_cols])
-            
-        except: pass
-        
-        bar.progress(int(((i+1)/len(match_ids))*100))
-        
-    bar.empty()
-    
-    if all_events:
-        full_df = pd.concat(all_events, ignore_index=True)
-        # Сохраняем результат
-        full_df.to_csv(filename, index=False)
-        st.success("✅ Анализ сезона завершен! Данные сохранены.")
-        return full_df
-        
-    return pd.DataFrame()
+        return totals
+    # Старый формат: все события сезона (xt_stats_*.csv) - сворачиваем тем же reducer'ом
+    events = season_store.read_table('xt_events', competition_id, season_id)
+    if events is not None:
+        st.toast("⚡ xT Данные загружены с диска!", icon="🚀")
+        return xt_counts(events)
+    return None
+
+def zone_heatmap(pitch, ax, zones, cmap):
+    # Карта зон из накопителя (вместо hexbin по сырым событиям)
+    stat = pitch.bin_statistic(np.array([0.0]), np.array([0.0]), statistic='count', bins=ZONE_BINS)
+    stat['statistic'] = zones.reshape(ZONE_BINS).T
+    stat['statistic'] = np.where(stat['statistic'] > 0, stat['statistic'], np.nan)
+    pitch.heatmap(stat, ax=ax, cmap=cmap, edgecolors='#000')
 
 # --- 3. ИНТЕРФЕЙС ---
 st.sidebar.header("Фильтры")
@@ -142,20 +137,24 @@ season_id = seasons[seasons['season_name'] == season_name]['season_id'].values[0
 
 # ЗАГРУЗКА
 df = load_season_xt(comp_id, season_id)
+if df is None:
+    # Сезон считается в фоне: можно уйти со страницы, результат сохранится в хранилище сезона
+    job = jobs.submit('season_xt', build_season_xt, int(comp_id), int(season_id))
+    if job.status == jobs.FAILED:
+        jobs.failed(job)
+        st.stop()
+    if job.running:
+        st.info("⚠️ Первый запуск: Скачиваем весь сезон и считаем xT для 100,000+ событий. Это займет 1-2 минуты. "
+                "Расчёт идёт в фоне - страницу можно закрыть.")
+        jobs.follow(job, "Анализ матчей...")
+        st.stop()
+    df = job.result
 
 if not df.empty:
     # --- 4. АНАЛИТИКА ---
     
-    # Группируем по игрокам
-    # Считаем сумму xT, но только положительную (не штрафуем за пасы назад)
-    df_pos = df[df['xT_added'] > 0]
-    
-    leaderboard = df_pos.groupby(['player', 'team']).agg({
-        'xT_added': 'sum',
-        'type': 'count' # кол-во действий
-    }).reset_index()
-    
-    leaderboard = leaderboard.rename(columns={'xT_added': 'Total xT', 'type': 'Actions'})
+    # Лидерборд сразу из накопителя по игрокам
+    leaderboard = df[['Total xT', 'Actions']].reset_index()
     leaderboard['Total xT'] = leaderboard['Total xT'].round(2)
     leaderboard = leaderboard.sort_values('Total xT', ascending=False).reset_index(drop=True)
     leaderboard.index = leaderboard.index + 1
@@ -167,7 +166,7 @@ if not df.empty:
         st.subheader(f"🏆 Top xT Generators: {season_name}")
         
         # Фильтр по команде (опционально)
-        teams = sorted(df['team'].unique())
+        teams = sorted(leaderboard['team'].unique())
         filter_team = st.multiselect("Фильтр по команде (пусто = все)", teams)
         
         if filter_team:
@@ -175,24 +174,24 @@ if not df.empty:
         else:
             plot_data = leaderboard.head(15)
             
-        fig, ax = plt.subplots(figsize=(10, 6))
-        fig.set_facecolor('#050505')
-        ax.set_facecolor('#050505')
+        with render.chart('xt_leaderboard', figsize=(10, 6)) as (fig, ax):
+            fig.set_facecolor('#050505')
+            ax.set_facecolor('#050505')
         
-        # Бар чарт
-        bars = ax.barh(plot_data['player'], plot_data['Total xT'], color='#00ff41')
-        ax.invert_yaxis() # Чтобы 1 место было сверху
+            # Бар чарт
+            bars = ax.barh(plot_data['player'], plot_data['Total xT'], color='#00ff41')
+            ax.invert_yaxis() # Чтобы 1 место было сверху
         
-        ax.tick_params(colors='white', labelsize=10)
-        ax.set_xlabel("Cumulative Expected Threat", color='white')
+            ax.tick_params(colors='white', labelsize=10)
+            ax.set_xlabel("Cumulative Expected Threat", color='white')
         
-        # Подписи значений
-        for bar in bars:
-            width = bar.get_width()
-            ax.text(width + 0.1, bar.get_y() + bar.get_height()/2, 
-                    f'{width}', ha='left', va='center', color='white', fontweight='bold')
+            # Подписи значений
+            for bar in bars:
+                width = bar.get_width()
+                ax.text(width + 0.1, bar.get_y() + bar.get_height()/2, 
+                        f'{width}', ha='left', va='center', color='white', fontweight='bold')
             
-        st.pyplot(fig)
+            st.pyplot(fig)
         
     with col2:
         st.subheader("📋 Leaderboard")
@@ -204,34 +203,34 @@ if not df.empty:
     
     selected_player = st.selectbox("Выберите игрока для анализа зон", sorted(leaderboard['player'].unique()))
     
-    p_events = df_pos[df_pos['player'] == selected_player]
+    p_totals = df.xs(selected_player, level='player').sum()
     
     c_map1, c_map2 = st.columns(2)
     
     with c_map1:
         st.markdown("**Pass Threat Map**")
         pitch = Pitch(pitch_type='statsbomb', line_zorder=2, pitch_color='#050505', line_color='#333')
-        fig, ax = pitch.draw(figsize=(8, 6))
+        with render.chart('xt_pass_zones', figsize=(8, 6)) as (fig, ax):
+            pitch_cache.draw(pitch, ax=ax)
         
-        pass_ev = p_events[p_events['type'] == 'Pass']
-        # Рисуем соты (hexbin), откуда игрок создает угрозу пасами
-        pitch.hexbin(pass_ev.x, pass_ev.y, gridsize=15, ax=ax, cmap='Greens', edgecolors='#000', mincnt=1)
-        st.pyplot(fig)
+            # Зоны, откуда игрок создает угрозу пасами
+            zone_heatmap(pitch, ax, p_totals[[f"Pass {z}" for z in ZONE_COLS]].to_numpy(float), 'Greens')
+            st.pyplot(fig)
         
     with c_map2:
         st.markdown("**Carry Threat Map**")
         pitch = Pitch(pitch_type='statsbomb', line_zorder=2, pitch_color='#050505', line_color='#333')
-        fig, ax = pitch.draw(figsize=(8, 6))
+        with render.chart('xt_carry_zones', figsize=(8, 6)) as (fig, ax):
+            pitch_cache.draw(pitch, ax=ax)
         
-        carry_ev = p_events[p_events['type'] == 'Carry']
-        # Рисуем соты для дриблинга
-        pitch.hexbin(carry_ev.x, carry_ev.y, gridsize=15, ax=ax, cmap='Blues', edgecolors='#000', mincnt=1)
-        st.pyplot(fig)
+            # Зоны для дриблинга
+            zone_heatmap(pitch, ax, p_totals[[f"Carry {z}" for z in ZONE_COLS]].to_numpy(float), 'Blues')
+            st.pyplot(fig)
         
     # Метрики игрока
-    total_xt = p_events['xT_added'].sum()
-    pass_xt = p_events[p_events['type'] == 'Pass']['xT_added'].sum()
-    carry_xt = p_events[p_events['type'] == 'Carry']['xT_added'].sum()
+    total_xt = p_totals['Total xT']
+    pass_xt = p_totals['Pass xT']
+    carry_xt = p_totals['Carry xT']
     
     m1, m2, m3 = st.columns(3)
     m1.markdown(f"<div class='metric-card'><div class='metric-val'>{total_xt:.2f}</div><div class='metric-lbl'>TOTAL xT</div></div>", unsafe_allow_html=True)
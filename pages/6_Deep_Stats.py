@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import os
+import time
 
 # --- ФИКС ПУТЕЙ (Чтобы работало всегда) ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -9,9 +10,15 @@ sys.path.append(parent_dir)
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from statsbombpy import sb
+import requests
+from utils.data import fetch_events_concurrently, get_matches
+from utils import event_store, jobs, lazy, season_store, shared_cache
+
+# Тяжёлые модули - при первом обращении, а не при открытии страницы (utils/lazy.py)
+sns = lazy.module('seaborn')
+sb = lazy.module('statsbombpy.sb')
+render = lazy.module('utils.render')
+from utils.utils.season_engine import calculate_xg_chain, season_xg_chain, season_dtypes, XG_CHAIN_COLUMNS
 
 # --- НАСТРОЙКИ ---
 st.set_page_config(page_title="Deep Stats Season", layout="wide", page_icon="🧬")
@@ -36,105 +43,99 @@ st.markdown("""
 st.title("🧬 SEASON DEEP DIVE: xG CHAIN & BUILDUP")
 st.caption("Moneyball Metrics: Поиск игроков, которые влияют на игру, но не всегда забивают.")
 
-# --- ДВИЖОК: xG CHAIN CALCULATOR ---
-def process_match_xg_chain(match_id):
-    """Считает xG Chain для одного матча"""
-    try:
-        events = sb.events(match_id=match_id)
-        # Нам нужны только события с владением
-        poss_actions = ['Pass', 'Carry', 'Dribble', 'Shot']
-        df = events[events['type'].isin(poss_actions)].copy()
-        
-        # 1. Находим удары с xG
-        shots = df[df['type'] == 'Shot'].dropna(subset=['shot_statsbomb_xg'])
-        poss_xg_map = shots.set_index('possession')['shot_statsbomb_xg'].to_dict()
-        
-        # 2. Присваиваем xG владению
-        df['possession_xg'] = df['possession'].map(poss_xg_map).fillna(0)
-        
-        # Оставляем только те владения, где был удар (xG > 0)
-        df_chain = df[df['possession_xg'] > 0].copy()
-        
-        if df_chain.empty: return pd.DataFrame()
-
-        # 3. Считаем Chain (Все участники)
-        # Группируем по игроку и владению, чтобы не считать одного игрока дважды за одну атаку
-        player_chain = df_chain.groupby(['player', 'team', 'possession'])['possession_xg'].max().reset_index()
-        # Суммируем по игрокам
-        xg_chain_sum = player_chain.groupby(['player', 'team'])['possession_xg'].sum().reset_index()
-        xg_chain_sum.rename(columns={'possession_xg': 'xG Chain'}, inplace=True)
-        
-        # 4. Считаем Buildup (Без бьющего и ассистента)
-        # Находим тех, кто бил или давал пас под удар
-        shooters = df_chain[df_chain['type'] == 'Shot']['player'].unique()
-        key_passers = df_chain[df_chain.get('pass_shot_assist', False) == True]['player'].unique()
-        exclude_players = np.union1d(shooters, key_passers)
-        
-        # Фильтруем
-        df_buildup = df_chain[~df_chain['player'].isin(exclude_players)]
-        
-        player_buildup = df_buildup.groupby(['player', 'team', 'possession'])['possession_xg'].max().reset_index()
-        xg_buildup_sum = player_buildup.groupby(['player', 'team'])['possession_xg'].sum().reset_index()
-        xg_buildup_sum.rename(columns={'possession_xg': 'xG Buildup'}, inplace=True)
-        
-        # Объединяем
-        final_df = pd.merge(xg_chain_sum, xg_buildup_sum, on=['player', 'team'], how='left').fillna(0)
-        return final_df
-        
-    except:
-        return pd.DataFrame()
-
 # --- ТУРБО ЗАГРУЗКА СЕЗОНА ---
+RETRY_FAILED_S = 24 * 3600 # не скачавшиеся матчи пробуем снова не чаще раза в сутки
+
+def stored_deep_stats(competition_id, season_id, match_ids):
+    # В хранилище сезона - разбивка по матчам: новые матчи сезона досчитываются, старые не трогаем.
+    # Обработанные матчи берём из отдельной таблицы: в разбивке нет матчей без цепочек (без ударов)
+    per_match = season_store.read_table('deep_stats', competition_id, season_id)
+    per_match = per_match if per_match is not None else pd.DataFrame()
+    done = season_store.read_table('deep_stats_done', competition_id, season_id)
+    if done is None:
+        # Хранилище из прошлых версий: обработанными считаем матчи из разбивки
+        done_ids = set(per_match['match_id']) if not per_match.empty else set()
+    else:
+        settled = (done['status'] == 'done') | (done['checked'] > time.time() - RETRY_FAILED_S)
+        done_ids = set(done.loc[settled, 'match_id'])
+
+    new_ids = [m_id for m_id in match_ids if m_id not in done_ids]
+    return per_match, new_ids
+
+def mark_done(competition_id, season_id, match_ids, loaded_ids):
+    done = season_store.read_table('deep_stats_done', competition_id, season_id)
+    if done is None:
+        # Первая запись: матчи, уже лежащие в разбивке, тоже обработаны
+        per_match = season_store.read_table('deep_stats', competition_id, season_id)
+        stored_ids = per_match['match_id'].unique() if per_match is not None and not per_match.empty else []
+        done = pd.DataFrame({'match_id': stored_ids, 'status': 'done', 'checked': time.time()})
+    marked = pd.DataFrame({
+        'match_id': match_ids,
+        'status': ['done' if m_id in loaded_ids else 'failed' for m_id in match_ids],
+        'checked': time.time(),
+    })
+    done = pd.concat([done[~done['match_id'].isin(match_ids)], marked], ignore_index=True)
+    season_store.write_table('deep_stats_done', competition_id, season_id, done, index=False)
+
+def build_deep_stats(competition_id, season_id, on_progress=None):
+    # Фоновая задача: скачиваем недостающие матчи и дописываем их в хранилище сезона.
+    # Список матчей берём свежий прямо здесь - сеть нужна только задаче, а не странице
+    match_ids = event_store.fetch_matches(competition_id, season_id)['match_id'].tolist()
+    per_match, new_ids = stored_deep_stats(competition_id, season_id, match_ids)
+    events_by_match = fetch_events_concurrently(
+        new_ids, on_progress=on_progress, columns=XG_CHAIN_COLUMNS, dtypes=season_dtypes(XG_CHAIN_COLUMNS),
+    )
+    if events_by_match:
+        # Один векторный проход по всем скачанным матчам сразу
+        events = event_store.concat_events(list(events_by_match.values()), season_dtypes(XG_CHAIN_COLUMNS))
+        new_stats = calculate_xg_chain(events)
+        per_match = pd.concat([per_match, new_stats], ignore_index=True) if not per_match.empty else new_stats
+        season_store.write_table('deep_stats', competition_id, season_id, per_match, index=False)
+    if new_ids:
+        mark_done(competition_id, season_id, new_ids, set(events_by_match))
+    return per_match
+
 def load_season_deep_stats(competition_id, season_id):
-    filename = f"deep_stats_comp_{competition_id}_season_{season_id}.csv"
-    
-    if os.path.exists(filename):
-        st.toast("⚡ Данные xG Chain загружены с диска!", icon="🚀")
-        return pd.read_csv(filename)
-    
-    st.info("⚠️ Первый запуск: Анализируем каждое владение мячом в сезоне. Это займет 1-3 минуты.")
-    
-    matches = sb.matches(competition_id=competition_id, season_id=season_id)
-    match_ids = matches['match_id'].tolist()
-    
-    all_stats = []
-    bar = st.progress(0, text="Вычисляем xG Chain...")
-    
-    for i, m_id in enumerate(match_ids):
-        match_stats = process_match_xg_chain(m_id)
-        if not match_stats.empty:
-            match_stats['match_id'] = m_id # Для отладки
-            all_stats.append(match_stats)
-        
-        bar.progress(int(((i+1)/len(match_ids))*100))
-    
-    bar.empty()
-    
-    if all_stats:
-        full_df = pd.concat(all_stats, ignore_index=True)
-        # Агрегируем по всему сезону (Сумма)
-        season_total = full_df.groupby(['player', 'team']).agg({
-            'xG Chain': 'sum',
-            'xG Buildup': 'sum',
-            'match_id': 'nunique' # Кол-во матчей
-        }).reset_index()
-        
-        season_total.rename(columns={'match_id': 'Matches'}, inplace=True)
-        
-        # Нормализуем Per 90 (упрощенно)
-        season_total['xG Chain p90'] = season_total['xG Chain'] / season_total['Matches']
-        season_total['xG Buildup p90'] = season_total['xG Buildup'] / season_total['Matches']
-        
-        season_total.to_csv(filename, index=False)
-        return season_total
-    
-    return pd.DataFrame()
+    # Список матчей - из кэша (utils/data.py). Без сети показываем то, что уже лежит в хранилище
+    try:
+        match_ids = get_matches(competition_id, season_id)['match_id'].tolist()
+    except requests.RequestException:
+        match_ids = []
+        st.caption("Нет связи со StatsBomb: показан сохранённый расчёт сезона.")
+    per_match, new_ids = stored_deep_stats(competition_id, season_id, match_ids)
+
+    if not new_ids:
+        if not per_match.empty:
+            st.toast("⚡ Данные xG Chain загружены с диска!", icon="🚀")
+    else:
+        # Досчёт идёт в фоне; пока он идёт, страница показывает то, что уже посчитано
+        job = jobs.submit('deep_stats', build_deep_stats, int(competition_id), int(season_id))
+        if job.status == jobs.FAILED:
+            # Досчёт не удался: показываем ошибку и то, что уже посчитано
+            jobs.failed(job)
+            if per_match.empty:
+                st.stop()
+        elif not job.running:
+            per_match = job.result
+        else:
+            if not per_match.empty:
+                st.info(f"Досчитываем новые матчи в фоне: {len(new_ids)}. Пока показан сезон без них.")
+            else:
+                st.info("⚠️ Первый запуск: Анализируем каждое владение мячом в сезоне. Расчёт идёт в фоне.")
+            jobs.follow(job, "Скачиваем матчи...")
+            if per_match.empty:
+                st.stop()
+
+    if per_match.empty:
+        return pd.DataFrame()
+    return season_xg_chain(per_match)
 
 # --- САЙДБАР ---
 st.sidebar.header("Фильтры")
 
 # Выбор Лиги (Кэшируем список)
 @st.cache_data
+@shared_cache.cached('sb.competitions', ttl=shared_cache.DAY)
 def get_comps(): return sb.competitions()
 
 comps = get_comps()
@@ -167,28 +168,28 @@ if not df.empty:
     st.subheader("🕵️ Finding Hidden Gems (Buildup vs Chain)")
     st.caption("Игроки справа внизу (Высокий Buildup, Низкий Chain) — это 'серые кардиналы' (Бускетс, Кроос). Игроки справа вверху — суперзвезды (Месси).")
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    fig.set_facecolor('#0e0e0e')
-    ax.set_facecolor('#0e0e0e')
+    with render.chart('xg_chain_scatter', figsize=(10, 6)) as (fig, ax):
+        fig.set_facecolor('#0e0e0e')
+        ax.set_facecolor('#0e0e0e')
     
-    # Рисуем точки
-    sns.scatterplot(data=df_filtered, x='xG Buildup', y='xG Chain', hue='team', s=100, palette='bright', legend=False, ax=ax)
+        # Рисуем точки
+        sns.scatterplot(data=df_filtered, x='xG Buildup', y='xG Chain', hue='team', s=100, palette='bright', legend=False, ax=ax)
     
-    # Подписываем топов
-    # Берем топ-10 по Chain и топ-5 по Buildup
-    top_chain = df_filtered.nlargest(10, 'xG Chain')
-    top_buildup = df_filtered.nlargest(5, 'xG Buildup')
-    to_label = pd.concat([top_chain, top_buildup]).drop_duplicates()
+        # Подписываем топов
+        # Берем топ-10 по Chain и топ-5 по Buildup
+        top_chain = df_filtered.nlargest(10, 'xG Chain')
+        top_buildup = df_filtered.nlargest(5, 'xG Buildup')
+        to_label = pd.concat([top_chain, top_buildup]).drop_duplicates()
     
-    for i, row in to_label.iterrows():
-        ax.text(row['xG Buildup']+0.02, row['xG Chain'], row['player'].split()[-1], color='white', fontsize=9)
+        for i, row in to_label.iterrows():
+            ax.text(row['xG Buildup']+0.02, row['xG Chain'], row['player'].split()[-1], color='white', fontsize=9)
         
-    ax.set_xlabel("xG Buildup (Вклад без ударов/ассистов)", color='white')
-    ax.set_ylabel("xG Chain (Общий вклад)", color='white')
-    ax.tick_params(colors='white')
-    ax.grid(color='#333', alpha=0.3)
+        ax.set_xlabel("xG Buildup (Вклад без ударов/ассистов)", color='white')
+        ax.set_ylabel("xG Chain (Общий вклад)", color='white')
+        ax.tick_params(colors='white')
+        ax.grid(color='#333', alpha=0.3)
     
-    st.pyplot(fig)
+        st.pyplot(fig)
     
     # 2. LEADERBOARD
     col1, col2 = st.columns(2)
@@ -0,0 +1,57 @@
+import streamlit as st
+from utils import cache_budget, lazy, opta_prefetch, shared_cache, singleflight
+
+st.set_page_config(page_title="Cache Admin", layout="wide")
+st.title("🗄️ Кэш в памяти")
+st.caption("Что сейчас лежит в кэше загрузчиков процесса и сколько это весит.")
+
+# --- БЮДЖЕТ ---
+info = cache_budget.usage()
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Занято, МБ", f"{info['bytes'] / 2**20:.1f}")
+c2.metric("Бюджет, МБ", f"{info['budget'] / 2**20:.0f}")
+c3.metric("Записей", info['entries'])
+c4.metric("Вытеснено", info['evicted'])
+st.progress(min(info['bytes'] / info['budget'], 1.0) if info['budget'] else 0.0,
+            text=f"Политика вытеснения: {info['policy'].upper()}")
+
+# --- ЗАГРУЗЧИКИ ---
+st.subheader("По загрузчикам")
+totals = cache_budget.loaders()
+st.dataframe(totals.round(2), hide_index=True, use_container_width=True)
+
+# --- ЗАПИСИ ---
+st.subheader("Записи")
+resident = cache_budget.entries()
+if resident.empty:
+    st.info("Кэш пуст.")
+else:
+    st.dataframe(resident.round(2), hide_index=True, use_container_width=True)
+
+# --- ОЧИСТКА ---
+st.subheader("Очистка")
+col_loader, col_all = st.columns([3, 1])
+with col_loader:
+    loader = st.selectbox("Загрузчик", totals['loader'].tolist())
+    if st.button("Очистить загрузчик") and loader:
+        cache_budget.clear(loader)
+        st.rerun()
+with col_all:
+    if st.button("Очистить всё", type="primary"):
+        cache_budget.clear()
+        st.rerun()
+
+# --- ПРОЦЕСС ---
+st.subheader("Процесс")
+# Общий кэш на диске (utils/shared_cache.py) переживает очистку памяти
+shared_cache.report(st.expander("Общий кэш на диске"))
+# Сколько загрузок данных разделили между сессиями
+singleflight.report(st.expander("Общие загрузки"))
+# Фоновая предзагрузка последних матчей Opta (utils/opta_prefetch.py)
+opta_prefetch.report(st.expander("Предзагрузка матчей Opta"))
+# Живые фигуры и время отрисовки - только если графики уже рисовались: сама страница matplotlib не загружает
+if lazy.loaded('utils.render'):
+    from utils import render
+    render.report(st.expander("Рендер графиков"))
+# Отложенные импорты: что и когда загрузилось
+lazy.report(st.expander("Запуск"))
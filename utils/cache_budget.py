@@ -0,0 +1,171 @@
+import os
+import pickle
+import threading
+import time
+from functools import partial, wraps
+
+import pandas as pd
+import streamlit as st
+
+# --- БЮДЖЕТ ПАМЯТИ КЭША ---
+# st.cache_data без max_entries держит каждый открытый матч до конца жизни процесса.
+# Загрузчики, объявленные через cached() вместо @st.cache_data, остаются обычными
+# st.cache_data, но каждая их запись учитывается здесь: размер (st.cache_data хранит
+# значение в pickle, столько же считаем и мы), число обращений, время последнего.
+# Когда сумма по всем загрузчикам превышает CACHE_BUDGET_MB, вытесняются записи
+# по политике CACHE_POLICY (lru - дольше всех не читали, lfu - реже всех читали)
+# через clear(*args) соответствующего загрузчика.
+BUDGET_BYTES = int(float(os.environ.get("CACHE_BUDGET_MB", 512)) * 1024 * 1024)
+POLICY = os.environ.get("CACHE_POLICY", "lru")
+
+_lock = threading.Lock()
+_loaders = {} # имя -> функция st.cache_data
+_entries = {} # (имя, ключ аргументов) -> _Entry
+_evictions = {} # имя -> сколько записей вытеснено
+
+
+class _Entry:
+    def __init__(self, name, args, kwargs, size, ttl):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.size = size
+        self.hits = 0
+        self.created = self.used = time.time()
+        self.expires = self.created + ttl if ttl else None
+
+    @property
+    def expired(self):
+        return self.expires is not None and self.expires < time.time()
+
+
+def sizeof(value):
+    # Столько байт значение занимает в st.cache_data (он хранит pickle)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def _key(args, kwargs):
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        key = repr(key) # списки id матчей и т.п.
+    return key
+
+
+def _victim(keep):
+    # Запись на вытеснение: сначала истёкшие по ttl, потом по политике.
+    # Только что добавленную запись (keep) не трогаем
+    candidates = [(key, entry) for key, entry in _entries.items() if key != keep]
+    if not candidates:
+        return None
+    expired = [item for item in candidates if item[1].expired]
+    if expired:
+        return expired[0]
+    if POLICY == 'lfu':
+        return min(candidates, key=lambda item: (item[1].hits, item[1].used))
+    return min(candidates, key=lambda item: item[1].used)
+
+
+def _total():
+    return sum(entry.size for entry in _entries.values())
+
+
+def _evict(keep):
+    # Вызывается под _lock: снимает записи с учёта, пока сумма не уложится в бюджет
+    doomed = []
+    total = _total()
+    while total > BUDGET_BYTES:
+        victim = _victim(keep)
+        if victim is None:
+            break
+        key, entry = victim
+        del _entries[key]
+        total -= entry.size
+        doomed.append(entry)
+    return doomed
+
+
+def _touch(name, args, kwargs, value, ttl):
+    # Аргументы с '_' st.cache_data не хэширует - и мы их не храним (это может быть целый фид матча)
+    kwargs = {k: v for k, v in kwargs.items() if not k.startswith('_')}
+    key = (name, _key(args, kwargs))
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and not entry.expired:
+            entry.hits += 1
+            entry.used = time.time()
+            return
+    # Новая запись (или st.cache_data пересчитал истёкшую) - меряем вне блокировки
+    entry = _Entry(name, args, kwargs, sizeof(value), ttl)
+    with _lock:
+        _entries[key] = entry
+        doomed = _evict(key)
+        for victim in doomed:
+            _evictions[victim.name] = _evictions.get(victim.name, 0) + 1
+    for victim in doomed:
+        _loaders[victim.name].clear(*victim.args, **victim.kwargs)
+
+
+def cached(name, **cache_kwargs):
+    """Вместо @st.cache_data(**cache_kwargs): то же кэширование, но с учётом размера и вытеснением."""
+    def decorator(fn):
+        cached_fn = st.cache_data(**cache_kwargs)(fn)
+        _loaders[name] = cached_fn
+        ttl = cache_kwargs.get('ttl')
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            value = cached_fn(*args, **kwargs)
+            _touch(name, args, kwargs, value, ttl)
+            return value
+
+        wrapper.clear = partial(clear, name)
+        return wrapper
+    return decorator
+
+
+def clear(name=None, *args, **kwargs):
+    """Всё (name=None), один загрузчик или одна его запись (clear(name, *args))."""
+    with _lock:
+        names = [name] if name is not None else list(_loaders)
+        exact = _key(args, kwargs) if args or kwargs else None
+        for key in [k for k in _entries if k[0] in names and (exact is None or k[1] == exact)]:
+            del _entries[key]
+    for loader in names:
+        _loaders[loader].clear(*args, **kwargs)
+
+
+# --- ОТЧЁТ ---
+
+def entries():
+    """Записи в памяти: загрузчик, аргументы, размер, обращения, возраст и простой, с."""
+    now = time.time()
+    with _lock:
+        rows = [(e.name, ', '.join(map(repr, e.args)), e.size / 2**20, e.hits, now - e.created, now - e.used)
+                for e in _entries.values() if not e.expired]
+    frame = pd.DataFrame(rows, columns=['loader', 'args', 'size_mb', 'hits', 'age_s', 'idle_s'])
+    return frame.sort_values('size_mb', ascending=False, ignore_index=True)
+
+
+def loaders():
+    """Итог по загрузчикам: записей, МБ, обращений, вытеснено."""
+    frame = entries()
+    totals = frame.groupby('loader').agg(entries=('args', 'size'), size_mb=('size_mb', 'sum'), hits=('hits', 'sum'))
+    with _lock:
+        names = list(_loaders)
+        evictions = dict(_evictions)
+    totals = totals.reindex(names, fill_value=0)
+    totals['evicted'] = [evictions.get(name, 0) for name in totals.index]
+    return totals.rename_axis('loader').reset_index()
+
+
+def usage():
+    with _lock:
+        total = sum(e.size for e in _entries.values() if not e.expired)
+        count = len(_entries)
+        evicted = sum(_evictions.values())
+    return {'bytes': total, 'budget': BUDGET_BYTES, 'entries': count, 'evicted': evicted, 'policy': POLICY}
@@ -1,25 +1,34 @@
-import streamlit as st
-from statsbombpy import sb
 import pandas as pd
+from utils import cache_budget, event_store, lazy, season_index, shared_cache
 
-@st.cache_data
+sb = lazy.module('statsbombpy.sb') # ~1 с на импорт, а списки обычно приходят из общего кэша
+
+@cache_budget.cached('competitions')
+@shared_cache.cached('sb.competitions', ttl=shared_cache.DAY)
 def get_competitions():
     return sb.competitions()
 
-@st.cache_data
+@cache_budget.cached('matches')
+@shared_cache.cached('sb.matches', ttl=shared_cache.DAY)
 def get_matches(competition_id, season_id):
-    return sb.matches(competition_id=competition_id, season_id=season_id)
+    return event_store.fetch_matches(competition_id, season_id)
 
-@st.cache_data
+# Матчи в памяти учитываются в общем бюджете (utils/cache_budget.py): старые вытесняются
+@cache_budget.cached('events')
 def get_events(match_id):
-    events = sb.events(match_id=match_id)
-    
-    # --- ИСПРАВЛЕНИЕ ---
-    # Мы аккуратно проверяем: если это список [x, y], то берем координаты.
-    # Если нет - ставим пустоту (None).
-    if 'location' in events.columns:
-        events['x'] = events['location'].apply(lambda loc: loc[0] if isinstance(loc, list) else None)
-        events['y'] = events['location'].apply(lambda loc: loc[1] if isinstance(loc, list) else None)
-    # -------------------
-        
-    return events
\ No newline at end of file
+    # Матч читается из общего хранилища на диске (скачивается только при первом обращении),
+    # поэтому в общий кэш не кладётся - он уже общий для всех процессов;
+    # координаты x / y там уже распакованы
+    return event_store.load_events(match_id)
+
+@cache_budget.cached('events_index')
+def get_events_index(match_id):
+    # Индексы игрок / команда / тип события поверх событий матча (см. utils/season_index.py)
+    return season_index.build_index(get_events(match_id))
+
+def fetch_events_concurrently(match_ids, max_workers=8, on_progress=None, columns=None, dtypes=None):
+    # Скачивание матчей - это ожидание сети, поэтому потоки дают почти линейное ускорение.
+    # Матчи, которые уже есть в хранилище, читаются с диска (только колонки из columns).
+    # Возвращает {match_id: events}; битые матчи пропускаем, как и раньше в циклах.
+    return event_store.load_many(match_ids, max_workers=max_workers, on_progress=on_progress,
+                                 columns=columns, dtypes=dtypes)
@@ -0,0 +1,213 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import lazy, singleflight
+
+sb = lazy.module('statsbombpy.sb') # нужен только для скачивания новых матчей
+
+# --- ХРАНИЛИЩЕ СОБЫТИЙ STATSBOMB ---
+# Каждый матч скачивается один раз и лежит на диске в parquet (колоночный формат, сжатие).
+# Общий для всех страниц, процессов и перезапусков приложения.
+STORE_DIR = os.environ.get(
+    "EVENT_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "events"),
+)
+
+# Ключ в метаданных parquet: колонки, которые пришлось сохранить как JSON-строки
+JSON_COLUMNS_KEY = b"json_columns"
+
+
+def event_path(match_id):
+    return os.path.join(STORE_DIR, f"{match_id}.parquet")
+
+
+def has_events(match_id):
+    return os.path.exists(event_path(match_id))
+
+
+# Колонки-источники конечной точки действия (у одного события заполнена максимум одна)
+END_LOCATION_COLUMNS = ['pass_end_location', 'carry_end_location', 'shot_end_location', 'goalkeeper_end_location']
+
+
+def _location_arrays(column, width):
+    # Весь столбец списков -> непрерывные float-массивы за один проход (через arrow, без цикла по строкам)
+    arr = pa.array(column, type=pa.list_(pa.float64()), from_pandas=True)
+    offsets = arr.offsets.to_numpy()
+    values = arr.values.to_numpy(zero_copy_only=False)
+    starts, lengths = offsets[:-1], np.diff(offsets)
+
+    out = []
+    for i in range(width):
+        has = lengths > i
+        a = np.full(len(arr), np.nan)
+        a[has] = values[starts[has] + i]
+        out.append(a)
+    return out
+
+
+def unpack_locations(events):
+    # Координаты распаковываем один раз при записи: x, y, end_x, end_y (+ end_z у ударов)
+    if 'location' in events.columns:
+        events['x'], events['y'] = _location_arrays(events['location'], 2)
+
+    end_x = np.full(len(events), np.nan)
+    end_y = np.full(len(events), np.nan)
+    for col in END_LOCATION_COLUMNS:
+        if col not in events.columns:
+            continue
+        if col == 'shot_end_location':
+            col_x, col_y, events['end_z'] = _location_arrays(events[col], 3)
+        else:
+            col_x, col_y = _location_arrays(events[col], 2)
+        end_x = np.where(np.isnan(end_x), col_x, end_x)
+        end_y = np.where(np.isnan(end_y), col_y, end_y)
+    events['end_x'] = end_x
+    events['end_y'] = end_y
+    return events
+
+
+def _to_table(events):
+    # Списки координат parquet хранит нативно (list<double>).
+    # Словари и списки словарей (tactics, freeze frame) с разной схемой - как JSON.
+    events = events.reset_index(drop=True)
+    json_columns = []
+    for col in events.columns[events.dtypes == object]:
+        values = events[col].dropna()
+        nested = values.map(lambda v: isinstance(v, dict) or (isinstance(v, list) and any(isinstance(i, (dict, list)) for i in v)))
+        if not nested.any():
+            try:
+                pa.array(events[col], from_pandas=True)
+                continue
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                pass
+        events[col] = events[col].map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else None)
+        json_columns.append(col)
+
+    table = pa.Table.from_pandas(events, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[JSON_COLUMNS_KEY] = json.dumps(json_columns).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def _from_table(table):
+    events = table.to_pandas()
+    json_columns = json.loads((table.schema.metadata or {}).get(JSON_COLUMNS_KEY, b"[]"))
+    for col in json_columns:
+        if col in events.columns:
+            events[col] = events[col].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+    # Списки координат возвращаем обычными list, как их отдаёт statsbombpy
+    for col in events.columns[events.dtypes == object]:
+        first = events[col].dropna()
+        if not first.empty and hasattr(first.iloc[0], 'tolist') and not isinstance(first.iloc[0], str):
+            events[col] = events[col].map(lambda v: v.tolist() if hasattr(v, 'tolist') else v)
+    return events
+
+
+def save_events(match_id, events):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = event_path(match_id)
+    # Пишем во временный файл и подменяем атомарно: другие процессы не увидят половину файла
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(_to_table(events), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def project(events, columns=None, dtypes=None):
+    # Оставляем только объявленные колонки и приводим типы (категории, float32, bool)
+    if columns is not None:
+        events = events.reindex(columns=list(columns))
+    for col, dtype in (dtypes or {}).items():
+        if col not in events.columns:
+            continue
+        if dtype == 'bool':
+            events[col] = events[col].eq(True)
+        else:
+            events[col] = events[col].astype(dtype)
+    return events
+
+
+def load_events(match_id, columns=None, dtypes=None):
+    # С диска, если матч уже есть; иначе скачиваем и сохраняем.
+    # columns / dtypes - проекция: parquet читает с диска только нужные колонки
+    path = event_path(match_id)
+    if os.path.exists(path):
+        schema = pq.read_schema(path)
+        if columns is not None and 'end_x' in schema.names:
+            read_cols = [c for c in columns if c in schema.names]
+            events = _from_table(pq.read_table(path, columns=read_cols))
+        else:
+            events = _from_table(pq.read_table(path))
+            # Файлы, записанные до появления end_x / end_y, досчитываем при чтении
+            if 'end_x' not in events.columns:
+                events = unpack_locations(events)
+        return project(events, columns, dtypes)
+
+    # Один матч, запрошенный сразу несколькими сессиями / задачами, скачивается один раз.
+    # Таблица общая для всех ждавших, поэтому проекция идёт по копии
+    events = singleflight.do('sb.events', match_id, download_events, match_id)
+    return project(events.copy(), columns, dtypes)
+
+
+def download_events(match_id):
+    events = sb.events(match_id=match_id)
+    events = unpack_locations(events)
+    events['match_id'] = match_id
+    save_events(match_id, events)
+    return events
+
+
+@singleflight.shared('sb.matches')
+def fetch_matches(competition_id, season_id):
+    # Список матчей сезона: расчёты сезона вызывают его мимо st.cache_data
+    return sb.matches(competition_id=competition_id, season_id=season_id)
+
+
+def iter_many(match_ids, max_workers=8, on_progress=None, columns=None, dtypes=None):
+    # Генератор (match_id, events) по мере готовности матчей.
+    # В работе одновременно не больше 2 * max_workers матчей: память не растёт с размером сезона.
+    match_ids = list(match_ids)
+    pending_ids = iter(match_ids)
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for m_id in pending_ids:
+            futures[pool.submit(load_events, m_id, columns, dtypes)] = m_id
+            if len(futures) >= 2 * max_workers:
+                break
+
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                m_id = futures.pop(future)
+                next_id = next(pending_ids, None)
+                if next_id is not None:
+                    futures[pool.submit(load_events, next_id, columns, dtypes)] = next_id
+
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, len(match_ids))
+                try:
+                    events = future.result()
+                except Exception:
+                    continue # битые матчи пропускаем
+                yield m_id, events
+
+
+def load_many(match_ids, max_workers=8, on_progress=None, columns=None, dtypes=None):
+    # Недостающие матчи качаются параллельно (ожидание сети), остальные читаются с диска.
+    # Возвращает {match_id: events}; битые матчи пропускаем.
+    return dict(iter_many(match_ids, max_workers, on_progress, columns, dtypes))
+
+
+def concat_events(frames, dtypes=None):
+    # У категорий разных матчей разные словари, после concat они становятся object - приводим заново
+    if not frames:
+        return pd.DataFrame()
+    return project(pd.concat(frames, ignore_index=True), dtypes=dtypes)
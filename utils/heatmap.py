@@ -0,0 +1,78 @@
+import numpy as np
+import streamlit as st
+
+from utils import cache_budget, event_store, lazy, shared_cache
+
+plt = lazy.module('matplotlib.pyplot')
+gaussian_filter1d = lazy.attrs('scipy.ndimage', 'gaussian_filter1d')
+
+# --- ТЕПЛОВЫЕ КАРТЫ НА СЕТКЕ ---
+# Вместо gaussian KDE с 50 контурами: координаты раскладываются по сетке 1x1 м,
+# сетка сглаживается гауссом по каждой оси отдельно (две 1D-свёртки) и рисуется
+# одной картинкой imshow. Сетка зависит только от (матч / сезон, команда, фильтр),
+# поэтому кешируется; перерисовка - это один blit.
+PITCH_EXTENT = (0, 120, 0, 80) # statsbomb: длина x ширина
+GRID_BINS = (120, 80)
+SIGMA = 4.0 # в клетках, примерно как ширина окна KDE по правилу Скотта для матча
+HEATMAP_COLUMNS = ['team', 'type', 'x', 'y', 'pass_outcome']
+
+
+def successful_passes(events):
+    return events[(events['type'] == 'Pass') & events['pass_outcome'].isna()]
+
+
+# Фильтры событий, для которых строится карта (имя фильтра входит в ключ кеша)
+FILTERS = {
+    'successful_passes': successful_passes,
+}
+
+
+def bin_counts(x, y, bins=GRID_BINS, extent=PITCH_EXTENT):
+    # Счётчики по клеткам: аддитивны, поэтому сезон = сумма матчей
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    counts, _, _ = np.histogram2d(x[keep], y[keep], bins=bins,
+                                  range=[extent[:2], extent[2:]])
+    return counts
+
+
+def smooth(counts, sigma=SIGMA):
+    # Сепарабельное гауссово сглаживание и нормировка к [0, 1]
+    grid = gaussian_filter1d(counts, sigma, axis=0, mode='constant')
+    grid = gaussian_filter1d(grid, sigma, axis=1, mode='constant')
+    top = grid.max()
+    return grid / top if top > 0 else grid
+
+
+@cache_budget.cached('match_density')
+def match_density(match_id, team, filter_name='successful_passes', sigma=SIGMA):
+    events = event_store.load_events(match_id, columns=HEATMAP_COLUMNS)
+    chosen = FILTERS[filter_name](events[events['team'] == team])
+    return smooth(bin_counts(chosen['x'], chosen['y']), sigma)
+
+
+@st.cache_data(ttl=3600)
+@shared_cache.cached('season_density', ttl=3600)
+def season_density(match_ids, team, filter_name='successful_passes', sigma=SIGMA):
+    # Матчи читаются потоком (только нужные колонки), в памяти - одна сетка счётчиков
+    counts = np.zeros(GRID_BINS)
+    for _, events in event_store.iter_many(match_ids, columns=HEATMAP_COLUMNS):
+        chosen = FILTERS[filter_name](events[events['team'] == team])
+        counts += bin_counts(chosen['x'], chosen['y'])
+    return smooth(counts, sigma)
+
+
+def draw_density(ax, grid, cmap='magma', alpha=0.4, thresh=0.05, extent=PITCH_EXTENT, zorder=1):
+    # Всё ниже thresh прозрачно, как у kdeplot(thresh=...); прозрачность нарастает
+    # плавно, чтобы край пятна не был ступенчатым. Сетка хранится как [x, y] -
+    # для imshow нужна транспонированная
+    rgba = plt.get_cmap(cmap)(grid.T)
+    rgba[..., 3] = alpha * np.clip((grid.T - thresh) / thresh, 0, 1)
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    image = ax.imshow(rgba, extent=extent, origin='lower',
+                      interpolation='bilinear', aspect='auto', zorder=zorder)
+    # imshow подгоняет оси под картинку - возвращаем поля и ориентацию поля
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    return image
@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils import singleflight
+
+# --- ФОНОВЫЕ ЗАДАЧИ ---
+# Долгие расчёты сезона идут в общем пуле потоков процесса, а не в потоке скрипта страницы:
+# сессия не блокируется, расчёт не обрывается, если пользователь ушёл со страницы,
+# а два пользователя, запустившие один и тот же сезон, попадают в одну задачу
+# (id задачи строится из её вида и аргументов). Страница опрашивает прогресс
+# и забирает результат, когда задача закончилась.
+MAX_WORKERS = 2 # расчёты сезона тяжёлые: больше двух одновременно только мешают друг другу
+JOB_TTL = 15 * 60 # сколько секунд держим законченную задачу (и её результат)
+RETRY_DELAY = 60 # упавшую задачу запускаем заново не раньше чем через минуту: без сети не крутим повторы
+POLL_SECONDS = 1.0
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_lock = threading.Lock()
+_jobs = {}
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='season-job')
+
+
+class Job:
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def running(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def retry_in(self):
+        # Сколько секунд упавшая задача ещё отдаётся как есть (с ошибкой), прежде чем её можно перезапустить
+        if self.status != FAILED:
+            return 0.0
+        if self.finished is None:
+            return float(RETRY_DELAY)
+        return max(0.0, self.finished + RETRY_DELAY - time.time())
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    def progress(self, done, total):
+        # Передаётся в расчёт как on_progress(done, total)
+        self.done, self.total = done, total
+
+
+def job_id(kind, *args):
+    return ':'.join([kind, *(str(a) for a in args)])
+
+
+def _run(job, fn, args, kwargs):
+    job.status = RUNNING
+    try:
+        job.result = fn(*args, on_progress=job.progress, **kwargs)
+        job.status = DONE
+    except Exception as error:
+        job.error = error
+        job.status = FAILED
+    finally:
+        job.finished = time.time()
+
+
+def _prune():
+    # Законченные задачи старше JOB_TTL удаляем вместе с результатами
+    now = time.time()
+    for key in [k for k, job in _jobs.items() if job.finished is not None and now - job.finished > JOB_TTL]:
+        del _jobs[key]
+
+
+def submit(kind, fn, *args, **kwargs):
+    """Задача fn(*args, on_progress=..., **kwargs). Если такая уже идёт (или недавно закончилась) - возвращает её.
+
+    Упавшая задача возвращается с ошибкой ещё RETRY_DELAY секунд, потом запускается заново.
+    """
+    key = job_id(kind, *args)
+    with _lock:
+        _prune()
+        job = _jobs.get(key)
+        started = job is None or (job.status == FAILED and not job.retry_in)
+        if started:
+            job = _jobs[key] = Job(key, kind)
+            _pool.submit(_run, job, fn, args, kwargs)
+    singleflight.record(f'job.{kind}', shared=not started)
+    return job
+
+
+def get(key):
+    with _lock:
+        return _jobs.get(key)
+
+
+def active():
+    with _lock:
+        return [job for job in _jobs.values() if job.running]
+
+
+# --- STREAMLIT ---
+
+def follow(job, label):
+    """Прогресс задачи на странице без блокировки скрипта. Когда задача закончилась - перезапуск страницы."""
+    @st.fragment(run_every=POLL_SECONDS)
+    def progress_panel():
+        if job.running:
+            text = f"{label} {job.done}/{job.total}" if job.total else label
+            st.progress(job.fraction, text=text)
+        elif job.status == FAILED:
+            failed(job)
+        else:
+            st.rerun()
+    progress_panel()
+
+
+def failed(job):
+    # Ошибка упавшей задачи на странице вместо вечного «первого запуска»
+    st.error(f"Расчёт не удался: {job.error}. Повторим не раньше чем через {job.retry_in:.0f} с.")
+
+
+def wait(job, label):
+    """То же для кэшируемых загрузчиков: ждём в скрипте, но расчёт идёт в общей задаче."""
+    bar = st.progress(0.0, text=label)
+    while job.running:
+        bar.progress(job.fraction, text=f"{label} {job.done}/{job.total}" if job.total else label)
+        time.sleep(POLL_SECONDS / 4)
+    bar.empty()
+    if job.status == FAILED:
+        raise job.error
+    return job.result
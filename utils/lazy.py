@@ -0,0 +1,123 @@
+import functools
+import importlib
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+# --- ЛЕНИВЫЕ ИМПОРТЫ И ФАЙЛЫ ---
+# mplsoccer, seaborn, scipy, statsbombpy и matplotlib вместе импортируются несколько
+# секунд, а первая загрузка страницы показывает только селекторы. Страницы объявляют
+# тяжёлые модули через module() / attrs(): это заместители, настоящий импорт
+# происходит при первом обращении (вызов Pitch(...), plt.subplots и т.п.) - то есть
+# только на той ветке, где строится график. Время каждого такого импорта записывается
+# для отчёта о запуске. LAZY_IMPORTS=0 - импортировать всё сразу, как раньше.
+EAGER = os.environ.get("LAZY_IMPORTS", "1") == "0"
+PROCESS_START = time.time()
+
+_lock = threading.Lock()
+_loads = {} # модуль -> (секунд от старта процесса, мс на импорт)
+
+
+def _import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _loads.setdefault(name, (time.time() - PROCESS_START, (time.perf_counter() - started) * 1000))
+    return module
+
+
+class _Lazy:
+    # Заместитель модуля (attr=None) или объекта из модуля: атрибуты и вызов идут в настоящий объект
+    def __init__(self, module, attr=None):
+        self._module = module
+        self._attr = attr
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            target = _import(self._module)
+            self._target = getattr(target, self._attr) if self._attr else target
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attr}" if self._attr else self._module
+        return f"<lazy {name}{'' if self._target is None else ' (loaded)'}>"
+
+
+def module(name):
+    """import name - при первом обращении к атрибуту."""
+    return _import(name) if EAGER else _Lazy(name)
+
+
+def attrs(name, *names):
+    """from name import a, b - при первом вызове / обращении к каждому из них."""
+    if EAGER:
+        loaded = _import(name)
+        objects = tuple(getattr(loaded, n) for n in names)
+    else:
+        objects = tuple(_Lazy(name, n) for n in names)
+    return objects[0] if len(objects) == 1 else objects
+
+
+def loaded(name):
+    return name in sys.modules
+
+
+# --- ФАЙЛЫ ПРИЛОЖЕНИЯ ---
+# Картинки и справочники читаются один раз на процесс, а не при каждом перезапуске страницы
+
+@st.cache_resource(show_spinner=False)
+def image(path):
+    # None, если файла нет (как load_local_asset на странице сравнения)
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            return img.copy()
+    except FileNotFoundError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _read_table(path):
+    return pd.read_excel(path)
+
+
+def table(path):
+    # Кэш процесса без st.cache_data: справочники читает и фоновая предзагрузка матчей,
+    # у её потока нет контекста скрипта Streamlit. Копия - вызывающий код меняет таблицу
+    return _read_table(path).copy()
+
+
+# --- ОТЧЁТ ---
+
+def imports():
+    """Отложенные импорты: когда (с от старта процесса) и сколько стоили, мс."""
+    with _lock:
+        rows = [(name, at, ms) for name, (at, ms) in _loads.items()]
+    frame = pd.DataFrame(rows, columns=['module', 'at_s', 'import_ms'])
+    return frame.sort_values('at_s', ignore_index=True)
+
+
+def report(container=None):
+    # Панель в сайдбаре: что из тяжёлого уже загружено и во что обошлось
+    container = container or st.sidebar.expander("Запуск")
+    mode = "все импорты сразу" if EAGER else "ленивые импорты"
+    container.caption(f"Процесс работает {time.time() - PROCESS_START:.0f} с, {mode}")
+    frame = imports()
+    if frame.empty:
+        container.caption("Тяжёлые модули ещё не загружались")
+    else:
+        container.dataframe(frame.round(1), hide_index=True, use_container_width=True)
@@ -0,0 +1,575 @@
+"""Incremental ingestion of the Opta matchevent feed for live matches.
+
+Every poll downloads the feed, but only events that are new (or were edited /
+deleted since the last poll) are parsed and valued. Derived data (carries,
+playing positions, momentum, Player Impact, average positions) is kept as
+running totals in a ledger, so the cost of a poll follows the size of the
+new batch instead of the whole match.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import opta_feed
+
+# --- OPTA CODES ---
+PASS, TAKE_ON, TACKLE, INTERCEPTION, CLEARANCE = 1, 3, 7, 8, 12
+MISS, ATTEMPT_SAVED, GOAL, CARD = 13, 15, 16, 17
+PLAYER_OFF, PLAYER_ON = 18, 19
+TEAM_SET_UP, FORMATION_CHANGE, DELETED_EVENT = 34, 40, 43
+AERIAL, CHALLENGE, BALL_RECOVERY, DISPOSSESSED, BLOCKED_PASS = 44, 45, 49, 50, 74
+# Same exclusions as the full pipeline: 'Start', 'End', 'Collection End', 'Team set up'
+NON_PLAY_TYPES = {30, 32, 37, TEAM_SET_UP, FORMATION_CHANGE, DELETED_EVENT}
+
+Q_OWN_GOAL, Q_PLAYERS, Q_YELLOW, Q_SECOND_YELLOW, Q_RED = 28, 30, 31, 32, 33
+Q_BLOCKED, Q_FORMATION, Q_FORMATION_SLOTS = 82, 130, 131
+Q_END_X, Q_END_Y, Q_ERROR_SHOT, Q_ERROR_GOAL = 140, 141, 169, 170
+
+DEFENSIVE_TYPES = [TACKLE, AERIAL, CHALLENGE, INTERCEPTION, BLOCKED_PASS, CLEARANCE, BALL_RECOVERY]
+DEFENDER_CODES = ['LB', 'CB', 'RB', 'RWB', 'LWB']
+
+XT = np.array([
+    [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267, 0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312, 0.03485072, 0.0379259 ],
+    [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719, 0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272, 0.04066992, 0.04647721],
+    [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174, 0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202, 0.05491138, 0.06442595],
+    [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646, 0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326, 0.10805102, 0.25745362],
+    [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646, 0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326, 0.10805102, 0.25745362],
+    [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174, 0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202, 0.05491138, 0.06442595],
+    [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719, 0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272, 0.04066992, 0.04647721],
+    [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267, 0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312, 0.03485072, 0.0379259 ],
+])
+IPXT = np.array([
+    [0.01, 0.012, 0.013, 0.015, 0.017, 0.018, 0.02, 0.022, 0.025, 0.02756312, 0.03485072, 0.0379259 ],
+    [0.012, 0.01378589, 0.01442382, 0.0155949 , 0.01714719, 0.0188454 , 0.02111813, 0.02370347, 0.02701521, 0.02953272, 0.04066992, 0.04647721],
+    [0.01388799, 0.01477745, 0.01501304, 0.01610462, 0.01869174, 0.020, 0.02285596, 0.02535132, 0.031224 , 0.0455202, 0.05491138, 0.06442595],
+    [0.02941056, 0.03082722, 0.03216549, 0.03432376, 0.0462646, 0.04784598, 0.0589528, 0.0699707 , 0.07385149, 0.08511326, 0.10805102, 0.25745362],
+    [0.02941056, 0.03082722, 0.03216549, 0.03432376, 0.0462646, 0.04784598, 0.0589528, 0.0699707 , 0.07385149, 0.08511326, 0.10805102, 0.25745362],
+    [0.01388799, 0.01477745, 0.01501304, 0.01610462, 0.01869174, 0.020, 0.02285596, 0.02535132, 0.031224 , 0.0455202, 0.05491138, 0.06442595],
+    [0.012, 0.01378589, 0.01442382, 0.0155949 , 0.01714719, 0.0188454 , 0.02111813, 0.02370347, 0.02701521, 0.02953272, 0.04066992, 0.04647721],
+    [0.01, 0.012, 0.013, 0.015, 0.017, 0.018, 0.02, 0.022, 0.025, 0.02756312, 0.03485072, 0.0379259 ],
+])
+
+EVENT_COLUMNS = ['id', 'eventId', 'typeId', 'periodId', 'timeMin', 'timeSec', 'clock',
+                 'contestantId', 'playerId', 'playerName', 'outcome', 'x', 'y', 'end_x', 'end_y',
+                 'keyPass', 'assist', 'owngoal', 'shotblocked', 'yellowcard', 'yellowcard2',
+                 'redcard', 'errorshot', 'errorgoal']
+LEDGER_COLUMNS = ['clock', 'timeMin', 'playerId', 'contestantId', 'value', 'momentum', 'touch', 'x', 'y']
+ROSTER_COLUMNS = ['id', 'clock', 'timeMin', 'typeId', 'contestantId', 'playerId', 'player_ids', 'position_codes']
+
+
+# --- FEED ---
+def formation_lookup(formation_dict):
+    """(formation_code, formation_position) -> position, built once from formation_dict.xlsx."""
+    if formation_dict is None or formation_dict.empty:
+        return {}
+    melted = formation_dict.melt(id_vars='formation_code', var_name='formation_position', value_name='position')
+    melted = melted.dropna(subset=['position'])
+    codes = melted['formation_code'].astype(str).str.strip()
+    slots = melted['formation_position'].astype(str).str.strip()
+    return dict(zip(zip(codes, slots), melted['position']))
+
+
+# --- STATE ---
+def new_live_state(matchinfo, formation_dict=None):
+    contestants = matchinfo.get('contestant', [])
+    return {
+        'teams': {c.get('id'): c.get('name') for c in contestants},
+        'team_order': [c.get('id') for c in contestants],
+        'formations': formation_lookup(formation_dict),
+        'seen': {},                     # event id -> lastModified of the processed version
+        'watermark': '',                # max lastModified already processed
+        'events': pd.DataFrame(columns=EVENT_COLUMNS),
+        'roster': pd.DataFrame(columns=ROSTER_COLUMNS),
+        'ledger': pd.DataFrame(columns=LEDGER_COLUMNS),
+        'names': {},
+        'player_team': {},
+        'impact': pd.Series(dtype=float),
+        'momentum': pd.Series(dtype=float),
+        'touches': pd.DataFrame(columns=['sx', 'sy', 'n'], dtype=float),
+        'stats': {'polls': 0, 'parsed_total': 0, 'last_parsed': 0, 'last_retracted': 0,
+                  'last_window': 0, 'last_seconds': 0.0},
+    }
+
+
+def _append(*frames):
+    """pd.concat that skips empty frames (the initial state is all empty frames)."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return frames[0].reset_index(drop=True) if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def _modified(event):
+    return event.get('lastModified') or event.get('timeStamp') or ''
+
+
+def select_changed(event_list, state):
+    """New events plus events edited since the last poll; plain dicts, no DataFrame yet."""
+    seen = state['seen']
+    watermark = state['watermark']
+    changed = []
+    for event in event_list:
+        stamp = _modified(event)
+        event_id = event.get('id')
+        if event_id in seen and (stamp <= watermark or seen[event_id] == stamp):
+            continue
+        changed.append(event)
+    return changed
+
+
+def _qualifier_values(event):
+    values = {}
+    for q in event.get('qualifier', []) or []:
+        values[q.get('qualifierId')] = q.get('value', 1)
+    return values
+
+
+def parse_events(changed):
+    """Flat table for the changed events only (end location and flags from qualifiers)."""
+    rows = []
+    for event in changed:
+        q = _qualifier_values(event)
+        rows.append({
+            'id': event.get('id'),
+            'eventId': event.get('eventId'),
+            'typeId': event.get('typeId'),
+            'periodId': event.get('periodId'),
+            'timeMin': event.get('timeMin'),
+            'timeSec': event.get('timeSec'),
+            'contestantId': event.get('contestantId'),
+            'playerId': event.get('playerId'),
+            'playerName': event.get('playerName'),
+            'outcome': event.get('outcome'),
+            'x': event.get('x'),
+            'y': event.get('y'),
+            'end_x': q.get(Q_END_X),
+            'end_y': q.get(Q_END_Y),
+            'keyPass': event.get('keyPass', 0),
+            'assist': event.get('assist', 0),
+            'owngoal': int(Q_OWN_GOAL in q),
+            'shotblocked': int(Q_BLOCKED in q),
+            'yellowcard': int(Q_YELLOW in q),
+            'yellowcard2': int(Q_SECOND_YELLOW in q),
+            'redcard': int(Q_RED in q),
+            'errorshot': int(Q_ERROR_SHOT in q),
+            'errorgoal': int(Q_ERROR_GOAL in q),
+            'player_ids': q.get(Q_PLAYERS),
+            'formation_code': q.get(Q_FORMATION),
+            'formation_slots': q.get(Q_FORMATION_SLOTS),
+            'lastModified': _modified(event),
+        })
+    batch = pd.DataFrame(rows)
+    if batch.empty:
+        return batch
+    for col in ['typeId', 'periodId', 'timeMin', 'timeSec', 'outcome', 'keyPass', 'assist']:
+        batch[col] = pd.to_numeric(batch[col], errors='coerce').fillna(0).astype(int)
+    for col in ['x', 'y', 'end_x', 'end_y']:
+        batch[col] = pd.to_numeric(batch[col], errors='coerce').fillna(0.0)
+    # Ordering key: period first, so first-half stoppage time sorts before the second half
+    batch['clock'] = batch['periodId'] * 10000 + batch['timeMin'] * 60 + batch['timeSec']
+    return batch
+
+
+# --- ROSTER: line-ups, subs, red cards, formation changes ---
+def _roster_rows(batch, formations):
+    rows = []
+    roster_types = batch['typeId'].isin([TEAM_SET_UP, FORMATION_CHANGE, PLAYER_OFF, PLAYER_ON, CARD])
+    for r in batch[roster_types].itertuples(index=False):
+        if r.typeId == CARD and not (r.yellowcard2 or r.redcard):
+            continue
+        player_ids, position_codes = None, None
+        if r.typeId in (TEAM_SET_UP, FORMATION_CHANGE) and r.player_ids:
+            player_ids = [p.strip() for p in str(r.player_ids).split(',')]
+            slots = [s.strip() for s in str(r.formation_slots).split(',')] if r.formation_slots else []
+            code = str(r.formation_code).strip()
+            position_codes = [
+                formations.get((code, slots[i] if i < len(slots) else str(i + 1)))
+                for i in range(len(player_ids))
+            ]
+        rows.append({
+            'id': r.id, 'clock': r.clock, 'timeMin': r.timeMin, 'typeId': r.typeId,
+            'contestantId': r.contestantId, 'playerId': r.playerId,
+            'player_ids': player_ids, 'position_codes': position_codes,
+        })
+    return pd.DataFrame(rows, columns=ROSTER_COLUMNS)
+
+
+def position_log(roster):
+    """(clock, playerId, position) log; positions are resolved as-of an event's clock."""
+    log = []
+    last_position = {}
+    last_off = {}
+    for r in roster.sort_values(['clock', 'id']).itertuples(index=False):
+        if r.typeId in (TEAM_SET_UP, FORMATION_CHANGE) and r.player_ids:
+            for pid, pos in zip(r.player_ids, r.position_codes):
+                if pos is None or pd.isna(pos):
+                    continue
+                if last_position.get(pid) != pos:
+                    log.append((r.clock, pid, pos))
+                    last_position[pid] = pos
+        elif r.typeId == PLAYER_OFF:
+            last_off[r.contestantId] = last_position.get(r.playerId)
+        elif r.typeId == PLAYER_ON:
+            inherited = last_off.get(r.contestantId)
+            if inherited and r.playerId not in last_position:
+                log.append((r.clock, r.playerId, inherited))
+                last_position[r.playerId] = inherited
+    return pd.DataFrame(log, columns=['clock', 'playerId', 'playing_position'])
+
+
+def appearances(roster):
+    """On-pitch intervals per player: starters from 'Team set up', then subs and red cards."""
+    spells = {}
+    for r in roster.sort_values(['clock', 'id']).itertuples(index=False):
+        if r.typeId == TEAM_SET_UP and r.player_ids:
+            for pid in r.player_ids[:11]:
+                spells[pid] = {'playerId': pid, 'contestantId': r.contestantId,
+                               'on_min': 0, 'on_clock': 0, 'off_min': np.nan, 'off_clock': np.inf}
+        elif r.typeId == PLAYER_ON:
+            spells[r.playerId] = {'playerId': r.playerId, 'contestantId': r.contestantId,
+                                  'on_min': r.timeMin, 'on_clock': r.clock,
+                                  'off_min': np.nan, 'off_clock': np.inf}
+        elif r.typeId in (PLAYER_OFF, CARD) and r.playerId in spells:
+            if np.isinf(spells[r.playerId]['off_clock']):
+                spells[r.playerId]['off_min'] = r.timeMin
+                spells[r.playerId]['off_clock'] = r.clock
+    return pd.DataFrame(list(spells.values()),
+                        columns=['playerId', 'contestantId', 'on_min', 'on_clock', 'off_min', 'off_clock'])
+
+
+def _attach_positions(frame, positions):
+    if frame.empty or positions.empty:
+        frame['playing_position'] = None
+        return frame
+    frame = frame.assign(clock=frame['clock'].astype('int64')).sort_values('clock')
+    positions = positions.assign(clock=positions['clock'].astype('int64')).sort_values('clock')
+    merged = pd.merge_asof(frame, positions, on='clock', by='playerId', direction='backward')
+    return merged
+
+
+# --- VALUATION ---
+def _grid_bin(values, n_bins, upper=100.0):
+    values = np.asarray(values, dtype=float)
+    idx = np.ceil(values / upper * n_bins) - 1
+    valid = (values > 0) & (values <= upper)
+    return np.where(valid, idx, 0).astype(int), valid
+
+
+def _grid_value(grid, x, y):
+    rows, cols = grid.shape
+    xi, x_ok = _grid_bin(x, cols)
+    yi, y_ok = _grid_bin(y, rows)
+    return np.where(x_ok & y_ok, grid[yi, xi], np.nan)
+
+
+def _event_values(w):
+    """Value of every single event in the window (same rules as the full Player Impact)."""
+    t, ok = w['typeId'].to_numpy(), w['outcome'].to_numpy() == 1
+    x, y = w['x'].to_numpy(float), w['y'].to_numpy(float)
+    flipped = np.clip(100 - x, 0.01, 100)
+    value = np.zeros(len(w))
+
+    succ_pass = (t == PASS) & ok & (x < 99.49)
+    pass_xt = _grid_value(XT, w['end_x'], w['end_y']) - _grid_value(XT, x, y)
+    value += np.where(succ_pass, np.nan_to_num(pass_xt), 0)
+    value += np.where((t == PASS) & ~ok, -np.nan_to_num(_grid_value(IPXT, flipped, y)), 0)
+
+    defensive = np.isin(t, DEFENSIVE_TYPES)
+    def_xt = np.nan_to_num(_grid_value(XT, flipped, y))
+    value += np.where(defensive, np.where(ok, def_xt, -def_xt), 0)
+
+    own_goal = w['owngoal'].to_numpy() == 1
+    shot = np.select(
+        [(t == GOAL) & ~own_goal, (t == ATTEMPT_SAVED) & (w['shotblocked'].to_numpy() == 1),
+         t == ATTEMPT_SAVED, t == MISS],
+        [0.95, 0.05, 0.2, 0.05], 0)
+    value += shot
+
+    take_on = np.select([x < 33.33, x < 66.66], [np.where(ok, 0.05, -0.15), np.where(ok, 0.1, -0.1)],
+                        np.where(ok, 0.15, -0.05))
+    value += np.where(t == TAKE_ON, take_on, 0)
+    value += np.where(t == DISPOSSESSED, np.select([x < 33.3, x < 66.6], [-0.15, -0.01], -0.05), 0)
+    value += np.select([w['errorgoal'].to_numpy() == 1, w['errorshot'].to_numpy() == 1], [-0.5, -0.1], 0)
+    value += np.select([w['assist'].to_numpy() == 1, w['keyPass'].to_numpy() == 1], [0.6, 0.1], 0)
+
+    cards = np.select([w['redcard'].to_numpy() == 1, w['yellowcard2'].to_numpy() == 1,
+                       w['yellowcard'].to_numpy() == 1], [-0.8, -0.525, -0.275], 0)
+    events = w[['clock', 'timeMin', 'playerId', 'contestantId', 'x', 'y']].copy()
+    events['value'] = value
+    events['momentum'] = True
+    events['touch'] = 1
+    card_rows = events[cards != 0].copy()
+    card_rows['value'] = cards[cards != 0]
+    card_rows['momentum'] = False
+    card_rows['touch'] = 0
+    return pd.concat([events, card_rows], ignore_index=True)
+
+
+def _pair_values(w, seed):
+    """Received-pass credit and carries: need the previous event (overall / same team)."""
+    frame = _append(seed, w)
+    in_window = np.r_[np.zeros(len(seed), bool), np.ones(len(w), bool)]
+    prev = frame.shift(1)
+    out = []
+
+    # Received passes: a completed pass credits whoever touched the ball next for the same team
+    received = (in_window & (prev['typeId'] == PASS) & (prev['outcome'] == 1)
+                & (prev['contestantId'] == frame['contestantId']) & (prev['end_x'] > 50))
+    if received.any():
+        rec = frame.loc[received, ['clock', 'timeMin', 'playerId', 'contestantId']].copy()
+        rec['value'] = np.nan_to_num(_grid_value(XT, prev.loc[received, 'end_x'], prev.loc[received, 'end_y']))
+        rec['momentum'] = False
+        out.append(rec)
+
+    # Carries: from where the previous same-team action ended to where this one starts
+    prev_team = frame.groupby('contestantId', sort=False).shift(1)
+    pt, pok = prev_team['typeId'], prev_team['outcome'] == 1
+    starts = ((pt == PASS) & pok) | ((pt == BALL_RECOVERY) & pok) | (pt == INTERCEPTION) | ((pt == TAKE_ON) & pok)
+    same_player_needed = starts & (pt != PASS)
+    carry = (in_window & starts
+             & ~((prev_team['end_x'] == frame['x']) & (prev_team['end_y'] == frame['y']))
+             & (frame['typeId'] != AERIAL)
+             & ~(same_player_needed & (prev_team['playerId'] != frame['playerId'])))
+    sx = prev_team['end_x'].where(pt != BALL_RECOVERY, prev_team['x'])
+    sy = prev_team['end_y'].where(pt != BALL_RECOVERY, prev_team['y'])
+    carry &= ~((sx == 0) & (sy == 0)) & ~((frame['x'] == 0) & (frame['y'] == 0))
+    carry &= ~(((sx - frame['x']).abs() < 1.5) & ((sy - frame['y']).abs() < 2.5))
+    if carry.any():
+        car = frame.loc[carry, ['clock', 'timeMin', 'playerId', 'contestantId']].copy()
+        car['value'] = np.nan_to_num(_grid_value(XT, frame.loc[carry, 'x'], frame.loc[carry, 'y'])
+                                     - _grid_value(XT, sx[carry], sy[carry]))
+        car['momentum'] = True
+        out.append(car)
+
+    if not out:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    pairs = pd.concat(out, ignore_index=True)
+    pairs['touch'] = 0
+    pairs['x'] = np.nan
+    pairs['y'] = np.nan
+    return pairs
+
+
+def _conceded_values(w, spells, positions):
+    """Goals conceded for every player of the conceding team on the pitch at the goal."""
+    goals = w[w['typeId'] == GOAL]
+    if goals.empty or spells.empty:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    goals = goals[['clock', 'timeMin', 'contestantId', 'owngoal']].copy()
+    teams = spells['contestantId'].dropna().unique()
+    other = {a: b for a, b in zip(teams, teams[::-1])} if len(teams) == 2 else {}
+    goals['conceding'] = np.where(goals['owngoal'] == 1, goals['contestantId'],
+                                  goals['contestantId'].map(other))
+    hits = goals.merge(spells, left_on='conceding', right_on='contestantId', suffixes=('_goal', ''))
+    hits = hits[(hits['on_clock'] <= hits['clock']) & (hits['clock'] <= hits['off_clock'])]
+    if hits.empty:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    hits = _attach_positions(hits[['clock', 'timeMin', 'playerId', 'contestantId']].copy(), positions)
+    pos = hits['playing_position'].fillna('').astype(str)
+    defender = pos.str.contains('|'.join(DEFENDER_CODES))
+    hits['value'] = np.select([defender, pos.str.contains('M')], [-0.2, -0.05], 0)
+    hits['momentum'] = True
+    hits['touch'] = 0
+    hits['x'] = np.nan
+    hits['y'] = np.nan
+    return hits[LEDGER_COLUMNS]
+
+
+def _aggregate(ledger):
+    impact = ledger.groupby('playerId')['value'].sum()
+    momentum = ledger[ledger['momentum'].astype(bool)].groupby(['timeMin', 'contestantId'])['value'].sum()
+    touched = ledger[ledger['touch'] == 1]
+    touches = pd.DataFrame({
+        'sx': touched.groupby('playerId')['x'].sum(),
+        'sy': touched.groupby('playerId')['y'].sum(),
+        'n': touched.groupby('playerId').size(),
+    })
+    return impact, momentum, touches
+
+
+def _fold(state, rows, sign):
+    """Adds (sign=1) or removes (sign=-1) ledger rows from the running totals."""
+    for key, part in zip(('impact', 'momentum', 'touches'), _aggregate(rows)):
+        current = state[key]
+        state[key] = part * sign if current.empty else current.add(part * sign, fill_value=0)
+
+
+def _rebuild_tail(state, rewind):
+    """Takes everything from the rewind clock onwards out of the running totals."""
+    events, ledger = state['events'], state['ledger']
+    head = events[events['clock'] < rewind]
+    window = events[events['clock'] >= rewind]
+    removed = ledger[ledger['clock'] >= rewind]
+    ledger = ledger[ledger['clock'] < rewind]
+    if not removed.empty:
+        _fold(state, removed, sign=-1)
+    return head, window, ledger
+
+
+def apply_batch(state, batch):
+    """Applies a batch of new / corrected events to the live match state."""
+    if batch.empty:
+        return 0
+    stats = state['stats']
+    events = state['events']
+
+    # 1. Retractions: edited or deleted events drop their previous version
+    revised = batch['id'].isin(state['seen'].keys())
+    retracted_ids = set(batch.loc[revised, 'id'])
+    rewind = batch['clock'].min()
+    if retracted_ids:
+        old = events[events['id'].isin(retracted_ids)]
+        if not old.empty:
+            rewind = min(rewind, old['clock'].min())
+        events = events[~events['id'].isin(retracted_ids)]
+        state['roster'] = state['roster'][~state['roster']['id'].isin(retracted_ids)]
+    state['events'] = events
+
+    for r in batch.itertuples(index=False):
+        state['seen'][r.id] = r.lastModified
+        state['watermark'] = max(state['watermark'], r.lastModified)
+    live = batch[batch['typeId'] != DELETED_EVENT]
+
+    # 2. Roster events (line-ups, subs, cards) are few: keep the log and rebuild from it
+    roster_new = _roster_rows(live, state['formations'])
+    if not roster_new.empty:
+        state['roster'] = _append(state['roster'], roster_new)
+    positions = position_log(state['roster'])
+    spells = appearances(state['roster'])
+    for r in live.dropna(subset=['playerId']).itertuples(index=False):
+        state['names'][r.playerId] = r.playerName
+        state['player_team'][r.playerId] = r.contestantId
+
+    # 3. Re-value only the tail from the rewind point
+    head, window, ledger = _rebuild_tail(state, rewind)
+    plays = live[~live['typeId'].isin(NON_PLAY_TYPES) & (live['periodId'] != 5)][EVENT_COLUMNS]
+    window = _append(window, plays).reindex(columns=EVENT_COLUMNS)
+    window = window.sort_values(['clock', 'id'], kind='mergesort').reset_index(drop=True)
+    for col in ['typeId', 'outcome', 'keyPass', 'assist', 'owngoal', 'shotblocked', 'yellowcard',
+                'yellowcard2', 'redcard', 'errorshot', 'errorgoal']:
+        window[col] = window[col].astype(int)
+
+    # Seeds: the last event of each team before the window (the latest of them is the last overall)
+    seed = head.groupby('contestantId', sort=False).tail(1).sort_values(['clock', 'id'])
+
+    added = [_event_values(window), _pair_values(window, seed.reset_index(drop=True)),
+             _conceded_values(window, spells, positions)]
+    added = _append(*added)
+    if not added.empty:
+        _fold(state, added, sign=1)
+        ledger = _append(ledger, added[LEDGER_COLUMNS]).sort_values('clock', kind='mergesort')
+    state['ledger'] = ledger.reset_index(drop=True)
+    state['events'] = _append(head, window).reindex(columns=EVENT_COLUMNS)
+    state['positions'] = positions
+    state['spells'] = spells
+
+    stats['parsed_total'] += len(batch)
+    stats['last_parsed'] = len(batch)
+    stats['last_retracted'] = len(retracted_ids)
+    stats['last_window'] = len(window)
+    return len(batch)
+
+
+def poll(state, data=None, matchlink=None):
+    """One poll: download the feed, parse only what changed, update the running totals."""
+    started = time.perf_counter()
+    if data is None:
+        data = opta_feed.fetch_matchevent(matchlink)
+    event_list = data.get('liveData', {}).get('event', []) or []
+    changed = select_changed(event_list, state)
+    applied = apply_batch(state, parse_events(changed)) if changed else 0
+    state['stats']['polls'] += 1
+    if not changed:
+        state['stats']['last_parsed'] = 0
+        state['stats']['last_retracted'] = 0
+        state['stats']['last_window'] = 0
+    state['stats']['last_seconds'] = time.perf_counter() - started
+    return applied
+
+
+# --- VIEWS (O(players) / O(minutes)) ---
+def current_minute(state):
+    events = state['events']
+    return int(events['timeMin'].max()) if not events.empty else 0
+
+
+def _current_positions(state):
+    positions = state.get('positions')
+    if positions is None or positions.empty:
+        return pd.Series(dtype=object)
+    return positions.sort_values('clock').groupby('playerId')['playing_position'].last()
+
+
+def player_impact_table(state):
+    """Player Impact as in the full report: total minus the trimmed mean, outfield players only."""
+    impact = state['impact'].copy()
+    if impact.empty:
+        return pd.DataFrame(columns=['playerName', 'team_name', 'Threat Value', 'Player Impact', 'Match Rank'])
+    positions = _current_positions(state)
+
+    # Clean sheets are provisional until full time: >60' played and the team has not conceded
+    spells = state.get('spells')
+    if spells is not None and not spells.empty:
+        now = current_minute(state)
+        conceded = _conceded_teams(state)
+        played = spells['off_min'].fillna(now) - spells['on_min']
+        eligible = spells[(played > 60) & ~spells['contestantId'].isin(conceded)]
+        pos = eligible['playerId'].map(positions).fillna('').astype(str)
+        bonus = pd.Series(np.select([pos.str.contains('|'.join(DEFENDER_CODES)), pos.str.contains('M')],
+                                    [0.4, 0.1], 0), index=eligible['playerId'].values)
+        impact = impact.add(bonus[bonus != 0], fill_value=0)
+
+    table = impact.rename('Threat Value').reset_index().rename(columns={'index': 'playerId'})
+    table['playerName'] = table['playerId'].map(state['names'])
+    table['team_name'] = table['playerId'].map(state['player_team']).map(state['teams'])
+    table = table[table['playerId'].map(positions) != 'GK']
+    table = table.sort_values('Threat Value', ascending=False).reset_index(drop=True)
+    mean_xt = table['Threat Value'].iloc[1:-1].mean()
+    impact_value = (table['Threat Value'] - mean_xt).round(2)
+    table['Player Impact'] = impact_value.apply(lambda v: f"+{v:.2f}" if v > 0 else f"-{abs(v):.2f}")
+    table['Match Rank'] = table['Threat Value'].rank(method='max', ascending=False).astype(int)
+    table['Threat Value'] = table['Threat Value'].round(3)
+    return table[['playerName', 'team_name', 'Threat Value', 'Player Impact', 'Match Rank']]
+
+
+def _conceded_teams(state):
+    events = state['events']
+    goals = events[events['typeId'] == GOAL]
+    if goals.empty:
+        return set()
+    teams = list(state['teams'].keys())
+    other = {a: b for a, b in zip(teams, teams[::-1])} if len(teams) == 2 else {}
+    conceding = np.where(goals['owngoal'] == 1, goals['contestantId'], goals['contestantId'].map(other))
+    return set(conceding)
+
+
+def momentum_table(state, window=5):
+    """Home minus away per minute, smoothed the same way as the Match Momentum tab."""
+    momentum = state['momentum']
+    if momentum.empty or len(state['team_order']) < 2:
+        return pd.DataFrame(columns=['timeMin', 'score_difference', 'rolling_avg_score_difference'])
+    home, away = state['team_order'][:2]
+    pivot = momentum.unstack('contestantId').reindex(columns=[home, away]).fillna(0)
+    pivot = pivot.reindex(range(int(pivot.index.min()), int(pivot.index.max()) + 1), fill_value=0)
+    out = pd.DataFrame({'timeMin': pivot.index, 'score_difference': (pivot[home] - pivot[away]).values})
+    out['rolling_avg_score_difference'] = out['score_difference'].rolling(window=window, min_periods=1).mean()
+    return out
+
+
+def average_positions(state):
+    touches = state['touches']
+    if touches.empty:
+        return pd.DataFrame(columns=['playerName', 'team_name', 'playing_position', 'x', 'y', 'touches'])
+    touches = touches[touches['n'] > 0]
+    positions = _current_positions(state)
+    out = pd.DataFrame({
+        'playerName': touches.index.map(state['names']),
+        'team_name': touches.index.map(state['player_team']).map(state['teams']),
+        'playing_position': touches.index.map(positions),
+        'x': (touches['sx'] / touches['n']).values,
+        'y': (touches['sy'] / touches['n']).values,
+        'touches': touches['n'].astype(int).values,
+    }, index=touches.index)
+    return out.reset_index(drop=True)
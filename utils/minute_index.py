@@ -0,0 +1,98 @@
+"""Per-minute prefix sums for minute-window queries on one match.
+
+Built once per match: cumulative x / y sums and event counts per player key
+(utils/opta_keys.py, so same-named players stay apart) and cumulative xT per
+team, one row per minute. Any minute window is then the
+difference of two rows, so the Average Positions slider and the momentum
+curve never go back to the event table.
+"""
+
+import numpy as np
+import pandas as pd
+
+SUB_TYPES = ['player on', 'player off']
+
+
+def _prefix(minute_pos, col_pos, values, n_minutes, n_cols):
+    # Per-minute totals scattered into a grid, then cumulated; row 0 is all zeros
+    grid = np.zeros((n_minutes + 1, n_cols))
+    np.add.at(grid, (minute_pos + 1, col_pos), values)
+    return grid.cumsum(axis=0)
+
+
+def build_minute_index(df, minute_col='timeMin', value_col='xT_value'):
+    minutes = pd.to_numeric(df[minute_col], errors='coerce')
+    valid = minutes.notna().to_numpy()
+    if not valid.any():
+        return None
+    first = int(minutes.min())
+    last = int(minutes.max())
+    n_minutes = last - first + 1
+    minute_pos = minutes.fillna(first).astype(int).to_numpy() - first
+
+    # ---- positions: starters' averages exclude sub on/off markers and rows without x/y ----
+    x = pd.to_numeric(df['x'], errors='coerce').to_numpy(float)
+    y = pd.to_numeric(df['y'], errors='coerce').to_numpy(float)
+    not_sub = ~df['typeId'].astype(str).str.lower().isin(SUB_TYPES).to_numpy()
+    keys = pd.to_numeric(df['player_key'], errors='coerce')
+    has_pos = valid & not_sub & (keys >= 0).to_numpy() & ~np.isnan(x) & ~np.isnan(y)
+    player_codes, players = pd.factorize(keys.where(has_pos))
+    rows = np.flatnonzero(has_pos)
+    n_players = len(players)
+    pos_args = (minute_pos[rows], player_codes[rows])
+
+    # ---- momentum: xT per team, over the minutes that have team events ----
+    values = pd.to_numeric(df[value_col], errors='coerce') if value_col in df.columns else pd.Series(0.0, index=df.index)
+    values = values.fillna(0)
+    has_value = valid & df['team_name'].notna().to_numpy()
+    team_codes, teams = pd.factorize(df['team_name'].where(has_value))
+    vrows = np.flatnonzero(has_value)
+
+    return {
+        'first': first,
+        'last': last,
+        'players': np.asarray(players, dtype=np.int64), # player_key of each column
+        'sum_x': _prefix(*pos_args, x[rows], n_minutes, n_players),
+        'sum_y': _prefix(*pos_args, y[rows], n_minutes, n_players),
+        'count': _prefix(*pos_args, np.ones(len(rows)), n_minutes, n_players),
+        'teams': list(teams),
+        'xt': _prefix(minute_pos[vrows], team_codes[vrows], values.to_numpy(float)[vrows], n_minutes, len(teams)),
+        'xt_minutes': np.unique(minute_pos[vrows]) + first,
+    }
+
+
+def _window(index, key, start, stop):
+    lo = min(max(int(start), index['first']), index['last'] + 1) - index['first']
+    hi = min(max(int(stop), index['first'] - 1), index['last']) - index['first'] + 1
+    return index[key][max(hi, lo)] - index[key][lo]
+
+
+def average_positions(index, start, stop):
+    """Mean x/y per player_key over minutes start..stop (inclusive); names come from the lineup / key table."""
+    count = _window(index, 'count', start, stop)
+    seen = count > 0
+    return pd.DataFrame({
+        'player_key': index['players'][seen],
+        'x': _window(index, 'sum_x', start, stop)[seen] / count[seen],
+        'y': _window(index, 'sum_y', start, stop)[seen] / count[seen],
+    })
+
+
+def momentum(index, team, opponent, window=5):
+    """Per-minute xT of both teams, their difference and its rolling mean over `window` minutes with events."""
+    minutes = index['xt_minutes']
+    pos = minutes - index['first']
+    per_minute = index['xt'][pos + 1] - index['xt'][pos]
+    table = pd.DataFrame(per_minute, columns=index['teams'])
+    for name in (team, opponent):
+        if name not in table.columns:
+            table[name] = 0.0
+    table.insert(0, 'timeMin', minutes)
+    table['score_difference'] = table[team] - table[opponent]
+
+    # Rolling mean as a difference of cumulative sums over the rows
+    cum = np.r_[0.0, table['score_difference'].cumsum().to_numpy()]
+    idx = np.arange(len(table))
+    lo = np.maximum(idx + 1 - window, 0)
+    table['rolling_avg_score_difference'] = (cum[idx + 1] - cum[lo]) / (idx + 1 - lo)
+    return table
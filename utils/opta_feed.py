@@ -0,0 +1,55 @@
+"""Downloads from the Opta performfeeds endpoints (schedule pages and matchevent).
+
+Every call goes through the single-flight layer: when several sessions ask for
+the same feed at the same moment (a popular match, the live poll of one match
+in many browsers) one HTTP request is made and its parsed JSON is shared. The
+result is not cached afterwards, so live data stays fresh. Callers get the
+shared dict and must treat it as read-only.
+"""
+
+import json
+import re
+
+import requests
+
+from utils import singleflight
+
+FEED_ROOT = "https://api.performfeeds.com/soccerdata"
+OUTLET_KEY = "ft1tiv1inq7v1sk3y9tv12yh5"
+MATCHEVENT_URL = (
+    f"{FEED_ROOT}/matchevent/{OUTLET_KEY}/{{matchlink}}"
+    "?_rt=c&_lcl=en&_fmt=jsonp&sps=widgets&_clbk=W351bc3acc0d0c4e5b871ac99dfbfeb44bb58ba1dc"
+)
+SCHEDULE_URL = (
+    f"{FEED_ROOT}/match/{OUTLET_KEY}/"
+    "?_rt=c&tmcl={tmcl}&live=yes&_pgSz={page_size}&_pgNm={page}"
+    "&_lcl=en&_fmt=jsonp&sps=widgets&_clbk=W385e5c699195bebaec15e4789d8caa477937fcb98"
+)
+HEADERS = {
+    'Referer': 'https://www.scoresway.com/',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36',
+}
+TIMEOUT = 15
+SCHEDULE_PAGE_SIZE = 400
+
+
+def _jsonp(response):
+    """Unwraps the JSONP callback; requests.HTTPError on a non-200 answer, ValueError on a malformed body."""
+    response.raise_for_status()
+    match = re.search(r'\((.*)\)', response.text, re.S)
+    if match is None:
+        raise ValueError("response is not a JSONP callback")
+    return json.loads(match.group(1))
+
+
+@singleflight.shared('performfeeds.matchevent')
+def fetch_matchevent(matchlink):
+    """Full matchevent feed of one match (matchInfo + liveData)."""
+    return _jsonp(requests.get(MATCHEVENT_URL.format(matchlink=matchlink), headers=HEADERS, timeout=TIMEOUT))
+
+
+@singleflight.shared('performfeeds.schedule')
+def fetch_schedule_page(tmcl, page, page_size=SCHEDULE_PAGE_SIZE):
+    """One page of the competition schedule; an empty 'match' list marks the end."""
+    url = SCHEDULE_URL.format(tmcl=tmcl, page=page, page_size=page_size)
+    return _jsonp(requests.get(url, headers=HEADERS, timeout=TIMEOUT))
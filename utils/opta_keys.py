@@ -0,0 +1,54 @@
+"""Integer keys for Opta players and teams.
+
+Every playerId / contestantId in the feed gets a small integer code once per
+match. The pipeline joins and groups on those codes; display names are looked
+up from the key table only when a result is shown. Two players with the same
+name stay apart, and no stage has to strip and compare strings again.
+"""
+
+import numpy as np
+import pandas as pd
+
+MISSING = -1
+
+
+def _clean(ids):
+    ids = pd.Series(ids)
+    return ids.where(ids.isna(), ids.astype(str).str.strip())
+
+
+def build_keys(events):
+    """Key table from the raw feed: player / team id indexes plus the display name of each player."""
+    players = events[['playerId', 'playerName']].assign(playerId=_clean(events['playerId'])).dropna(subset=['playerId'])
+    # first non-empty name of each player wins
+    players = players.sort_values('playerName', key=lambda n: n.isna(), kind='mergesort').drop_duplicates('playerId')
+    teams = _clean(events['contestantId']).dropna().unique()
+    return {
+        'player': pd.Index(players['playerId']),
+        'team': pd.Index(teams),
+        'player_names': players['playerName'].astype(str).str.strip().to_numpy(dtype=object),
+    }
+
+
+def player_key(keys, ids):
+    return keys['player'].get_indexer(_clean(ids).fillna('')).astype(np.int64)
+
+
+def team_key(keys, ids):
+    return keys['team'].get_indexer(_clean(ids).fillna('')).astype(np.int64)
+
+
+def player_names(keys, codes):
+    codes = pd.to_numeric(pd.Series(codes), errors='coerce').fillna(MISSING).astype(np.int64).to_numpy()
+    names = keys['player_names']
+    if not len(names):
+        return np.full(len(codes), np.nan, dtype=object)
+    return np.where(codes >= 0, names[np.clip(codes, 0, len(names) - 1)], np.nan)
+
+
+def totals(frame, value_col='xT_value', key='player_key'):
+    """Sum of `value_col` per player key (rows without a known player are dropped)."""
+    codes = pd.to_numeric(frame[key], errors='coerce')
+    known = codes.notna() & (codes >= 0)
+    summed = frame.loc[known, value_col].groupby(codes[known].astype(np.int64)).sum()
+    return summed.rename_axis('player_key').reset_index()
@@ -0,0 +1,196 @@
+"""Lineup-level bookkeeping for Opta matches: substitutions, positions over time and goal attribution.
+
+Substitutes are paired with the player they replaced by an as-of join per team;
+positions are kept as a timeline table (player_id, clock, position) and looked
+up the same way; goals are attributed to players with one interval join of the
+lineup (time_on .. time_off) against the goal events.
+"""
+
+import numpy as np
+import pandas as pd
+
+PLAYER_OFF, PLAYER_ON = 18, 19
+SENT_OFF_QUALIFIERS = [32, 33] # second yellow, red card
+SUB_LOOKBACK = 5 # the player-off event sits at most this many rows before the player-on
+DEFENDER_POSITIONS = ['LB', 'CB', 'RB', 'RWB', 'LWB']
+# xT credit per goal conceded and for a clean sheet (> 60 minutes, nothing conceded)
+CONCEDED_VALUE = {'DEF': -0.2, 'MID': -0.05}
+CLEAN_SHEET_VALUE = {'DEF': 0.4, 'MID': 0.1}
+
+
+# --- SUBSTITUTIONS ---
+
+def pair_substitutions(events, lookback=SUB_LOOKBACK):
+    """Sub-on -> sub-off pairs: the nearest earlier player-off of the same team within `lookback` rows."""
+    rows = events.assign(_row=np.arange(len(events)))
+    subs_on = rows[(rows['typeId'] == PLAYER_ON) & (rows['player_key'] >= 0) & (rows['team_key'] >= 0)]
+    subs_off = rows[(rows['typeId'] == PLAYER_OFF) & (rows['team_key'] >= 0)]
+    pairs = pd.merge_asof(
+        subs_on[['_row', 'team_key', 'player_key']].rename(columns={'player_key': 'sub_on'}),
+        subs_off[['_row', 'team_key', 'player_key']].rename(columns={'player_key': 'sub_off'}),
+        on='_row', by='team_key', direction='backward',
+        allow_exact_matches=False, tolerance=lookback
+    )
+    pairs = pairs.dropna(subset=['sub_off'])
+    pairs['sub_off'] = pairs['sub_off'].astype(np.int64)
+    return pairs[['sub_on', 'sub_off', 'team_key']].reset_index(drop=True)
+
+
+def inherit_positions(lineups, pairs):
+    """Substitutes without a position take the position of the player they replaced.
+
+    Substitutes of substitutes need their predecessor filled first, so the fill is
+    repeated (one vectorized pass per link of the longest chain) until nothing changes.
+    """
+    lineups = lineups.copy()
+    is_sub = lineups['subbed_on'] == 'yes'
+    for _ in range(len(pairs) + 1):
+        known = lineups[lineups['position'].notna()].drop_duplicates('player_key').set_index('player_key')['position']
+        inherited = pairs.drop_duplicates('sub_on').set_index('sub_on')['sub_off'].map(known).dropna()
+        fill = is_sub & lineups['position'].isna() & lineups['player_key'].isin(inherited.index)
+        if not fill.any():
+            break
+        lineups.loc[fill, 'position'] = lineups.loc[fill, 'player_key'].map(inherited)
+    return lineups
+
+
+def sent_off(events, columns):
+    """Rows whose qualifiers mark a second yellow or a straight red."""
+    return events[columns].isin(SENT_OFF_QUALIFIERS).any(axis=1)
+
+
+def on_off_times(lineups, max_match_time, red_card_times):
+    """minutes_played / time_on / time_off for the whole lineup, with sendings off overriding both."""
+    lineups = lineups.copy()
+    red_card = lineups['player_key'].map(red_card_times)
+    lineups['minutes_played'] = red_card.where(red_card.notna(), lineups['minutes_played'])
+    minutes = lineups['minutes_played']
+
+    came_on = (lineups['subbed_on'] == 'yes') & minutes.notna()
+    went_off = (lineups['is_starter'] == 'yes') & minutes.notna() & (minutes != max_match_time)
+    lineups['time_on'] = (max_match_time - minutes).where(came_on, 0)
+    lineups['time_off'] = minutes.where(went_off, max_match_time)
+    lineups['time_off'] = red_card.where(red_card.notna(), lineups['time_off'])
+
+    started_and_off = (lineups['time_on'] == 0) & (lineups['subbed_off'] == 'yes')
+    lineups.loc[started_and_off, 'time_off'] = lineups.loc[started_and_off, 'minutes_played']
+    return lineups
+
+
+# --- POSITIONS ---
+
+def clock(period, minute, second):
+    # Same ordering as comparing (periodId, timeMin, timeSec) tuples
+    period = pd.to_numeric(period, errors='coerce')
+    minute = pd.to_numeric(minute, errors='coerce')
+    second = pd.to_numeric(second, errors='coerce')
+    return period * 10000 + minute * 60 + second
+
+
+def position_timeline(initial_positions, change_times):
+    """initial_positions: {player_id: position}; change_times: {player_id: {position: {periodId, timeMin, timeSec}}}."""
+    rows = [(str(pid).strip(), -1.0, pos) for pid, pos in initial_positions.items()]
+    for pid, changes in change_times.items():
+        pid = str(pid).strip()
+        if pid not in initial_positions:
+            continue
+        for pos, t in changes.items():
+            rows.append((pid, clock(t['periodId'], t['timeMin'], t['timeSec']), pos))
+    timeline = pd.DataFrame(rows, columns=['player_id', 'clock', 'position'])
+    timeline['clock'] = pd.to_numeric(timeline['clock'], errors='coerce')
+    return timeline.dropna(subset=['clock']).sort_values('clock', kind='mergesort').reset_index(drop=True)
+
+
+def positions_at(timeline, player_ids, period, minute, second):
+    """Position of each player at the given times: latest change at or before that moment, else the starting one."""
+    query = pd.DataFrame({
+        'player_id': pd.Series(player_ids).astype(str).str.strip().to_numpy(),
+        # rows without a time can only see the starting position
+        'clock': clock(pd.Series(period), pd.Series(minute), pd.Series(second)).fillna(-1).to_numpy(float),
+        '_row': np.arange(len(player_ids)),
+    }).sort_values('clock', kind='mergesort')
+    found = pd.merge_asof(query, timeline, on='clock', by='player_id', direction='backward')
+    return found.sort_values('_row')['position'].to_numpy()
+
+
+def position_group(positions):
+    positions = pd.Series(positions).fillna('').astype(str)
+    is_def = positions.str.contains('|'.join(DEFENDER_POSITIONS))
+    is_mid = positions.str.contains('M')
+    return pd.Series(np.select([is_def, is_mid], ['DEF', 'MID'], ''), index=positions.index)
+
+
+# --- GOALS ---
+
+def goal_sides(goal_events, team_names):
+    """Adds team_goal (who gets the goal) and conceding_team; own goals count for the other side."""
+    goal_events = goal_events.copy()
+    teams = list(team_names)
+    other = {team: next((t for t in teams if t != team), None) for team in teams}
+    opponent = goal_events['team_name'].map(other)
+    is_own = goal_events['typeId'] == 'Own Goal'
+    goal_events['team_goal'] = np.where(is_own, opponent, goal_events['team_name'])
+    goal_events['conceding_team'] = np.where(is_own, goal_events['team_name'], opponent)
+    return goal_events
+
+
+def on_pitch(lineups, goal_events):
+    """Interval join: one row per (lineup row, goal) where the goal minute is inside time_on .. time_off."""
+    pairs = lineups[['player_id', 'player_key', 'player_name', 'team_name', 'time_on', 'time_off']].reset_index(names='_lineup').merge(
+        goal_events[['team_goal', 'conceding_team', 'minute', 'timeMin', 'timeSec', 'periodId']
+                    + [c for c in ['penaltyshot'] if c in goal_events.columns]],
+        how='cross'
+    )
+    inside = (pairs['minute'] >= pairs['time_on']) & (pairs['minute'] <= pairs['time_off'])
+    return pairs[inside]
+
+
+def goals_for_against(lineups, goal_events):
+    """goals_scored / goals_conceded / penalties_conceded per lineup row while the player was on the pitch."""
+    pairs = on_pitch(lineups, goal_events)
+    scored = pairs['team_goal'] == pairs['team_name']
+    penalty = pairs['penaltyshot'].fillna(0).eq(1) if 'penaltyshot' in pairs.columns else False
+    counts = pd.DataFrame({
+        'goals_scored': scored,
+        'goals_conceded': ~scored,
+        'penalties_conceded': ~scored & penalty,
+    }).groupby(pairs['_lineup']).sum()
+    return counts.reindex(lineups.index, fill_value=0).astype(int)
+
+
+def goal_conceded_events(lineups, goal_events, timeline):
+    """One 'goal_conceded' row per goal and player of the conceding side on the pitch, valued by position at that moment."""
+    pairs = on_pitch(lineups, goal_events)
+    pairs = pairs[pairs['team_name'] == pairs['conceding_team']]
+    positions = positions_at(timeline, pairs['player_id'], pairs['periodId'], pairs['timeMin'], pairs['timeSec'])
+    rows = pd.DataFrame({
+        'playerName': pairs['player_name'].to_numpy(),
+        'player_key': pairs['player_key'].to_numpy(),
+        'team_name': pairs['team_name'].to_numpy(),
+        'timeMin': pairs['timeMin'].to_numpy(),
+        'timeSec': pairs['timeSec'].to_numpy(),
+        'periodId': pairs['periodId'].to_numpy(),
+        'playing_position': positions,
+        'typeId': 'goal_conceded',
+    })
+    rows['xT_value'] = position_group(rows['playing_position']).map(CONCEDED_VALUE).fillna(0).to_numpy()
+    return rows.drop_duplicates(subset=['periodId', 'timeMin', 'timeSec', 'player_key', 'team_name'])
+
+
+def clean_sheet_events(lineups, conceding_teams):
+    """'clean_sheet' rows for players with a known position, > 60 minutes and a team that did not concede."""
+    eligible = lineups[
+        (lineups['minutes_played'] > 60) &
+        (lineups['goals_conceded'] == 0) &
+        (~lineups['team_name'].isin(conceding_teams)) &
+        lineups['position'].notna()
+    ]
+    rows = pd.DataFrame({
+        'playerName': eligible['player_name'].to_numpy(),
+        'player_key': eligible['player_key'].to_numpy(),
+        'team_name': eligible['team_name'].to_numpy(),
+        'typeId': 'clean_sheet',
+        'playing_position': eligible['position'].to_numpy(),
+    })
+    rows['xT_value'] = position_group(rows['playing_position']).map(CLEAN_SHEET_VALUE).to_numpy()
+    return rows
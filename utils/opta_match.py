@@ -0,0 +1,1356 @@
+"""Turns one Opta matchevent feed into the tables the Match Analysis page draws from.
+
+process() is the data half of pages/1_Match_Analysis.py: events with names,
+qualifiers, formations, possessions, xT and the starting lineups. It has no
+Streamlit calls, so the same code runs for a page request and for the
+background prefetcher (utils/opta_prefetch.py).
+
+load() is what the page calls. Its result is cached per (match, feed version):
+the version changes whenever Opta adds or edits an event, so a live match is
+reprocessed on the next request and a finished match is processed once. Matches
+already seen with matchStatus 'Played' are served from the cache without
+downloading the feed again.
+
+There are two cache layers: stored_match() in the shared on-disk cache
+(utils/shared_cache.py, plain Python) and processed_match() on top of it in
+the process memory budget (st.cache_data). warm() fills only the on-disk layer
+and makes no Streamlit calls, so it is safe from a thread without a
+ScriptRunContext; the prefetcher uses it, the page then reads the entry from
+disk on the first click.
+"""
+
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import cache_budget, lazy, opta_feed, opta_keys, opta_lineups, opta_possession, shared_cache
+
+FINAL_STATUS = 'Played'
+
+_lock = threading.Lock()
+_final = {} # matchlink -> version of the finished match
+
+
+# --- PROCESSING ---
+
+def process(data, matchlink):
+    """All match tables from one matchevent feed (read-only). Returns a dict of the tables the page uses plus 'errors'."""
+    if 'liveData' not in data or 'matchInfo' not in data:
+        raise ValueError("matchevent feed has no liveData / matchInfo")
+    matchevents = data['liveData']
+    matchinfo = data['matchInfo']
+    errors = []
+    matchinfo_df = pd.json_normalize(matchinfo)
+    teamdata = pd.json_normalize(matchinfo_df['contestant'].explode())
+    # Select only the 'id' and 'name' columns
+    teamdata = teamdata[['id', 'name']]
+
+    # Display the resulting DataFrame
+
+    hometeamid = teamdata.iloc[0, 0]
+    awayteamid = teamdata.iloc[1, 0]
+    matchevents_df = pd.json_normalize(matchevents)
+    events_expanded = pd.json_normalize(matchevents_df['event'].explode())
+    def expand_qualifiers(row):
+        # Each qualifier in the list will be expanded with index-based column names
+        if isinstance(row, list):
+            qualifiers_dict = {}
+            for idx, qualifier in enumerate(row):
+                for key, value in qualifier.items():
+                    qualifiers_dict[f'qualifier/{idx}/{key}'] = value
+            return pd.Series(qualifiers_dict)
+        return pd.Series()  # Return an empty series if there are no qualifiers
+    qualifiers_expanded = events_expanded['qualifier'].apply(expand_qualifiers)
+    events_expanded = events_expanded.drop(columns=['qualifier']).join(qualifiers_expanded)
+    df = events_expanded
+    # Integer codes for players and teams; names are only looked up for display
+    opta_key_table = opta_keys.build_keys(df)
+    df['player_key'] = opta_keys.player_key(opta_key_table, df['playerId'])
+    df['team_key'] = opta_keys.team_key(opta_key_table, df['contestantId'])
+    formation_dict = lazy.table("formation_dict.xlsx")
+
+    formation_rows = df[df['typeId'] == 34]
+    formation_dfs = []
+    for _, row in formation_rows.iterrows():
+        row_data = row.to_dict()
+        contestant_id = row_data.get('contestantId', None)
+        qualifier_cols = [col for col in row.index if 'qualifierId' in col]
+        formation_code = None
+        player_ids = []
+        squad_numbers = []
+        formation_positions = []
+        for col in qualifier_cols:
+            try:
+                qualifier_id = row[col]
+                value_col = df.columns[df.columns.get_loc(col) + 1]
+                value = row[value_col]
+                if qualifier_id == 130:
+                    formation_code = value
+                elif qualifier_id == 30:
+                    player_ids = str(value).split(',')
+                elif qualifier_id == 59:
+                    squad_numbers = str(value).split(',')
+                elif qualifier_id == 131:
+                    formation_positions = str(value).split(',')
+            except:
+                continue
+        num_players = len(player_ids)
+        data = {
+            'formation_code': [formation_code] * num_players,
+            'player_id': player_ids,
+            'squad_number': squad_numbers,
+            'formation_position': formation_positions,
+            'is_starter': ['yes' if i < 11 else 'no' for i in range(num_players)],
+            'contestant_id': [contestant_id] * num_players
+        }
+        formation_df = pd.DataFrame(data)
+        formation_dfs.append(formation_df)
+    formation_dfs = pd.concat(formation_dfs, ignore_index=True)
+    formation_dfs['player_key'] = opta_keys.player_key(opta_key_table, formation_dfs['player_id'])
+    formation_dfs['team_key'] = opta_keys.team_key(opta_key_table, formation_dfs['contestant_id'])
+    formation_dfs['player_id'] = formation_dfs['player_id'].astype(str).str.strip()
+    formation_dfs['playerName'] = opta_keys.player_names(opta_key_table, formation_dfs['player_key'])
+    formation_dict['formation_code'] = formation_dict['formation_code'].astype(str).str.strip()
+    formation_dict_melted = formation_dict.melt(
+        id_vars='formation_code',
+        var_name='formation_position',
+        value_name='position'
+    )
+    formation_dfs = formation_dfs[formation_dfs['formation_position'].notna()].copy()
+    formation_dfs['formation_position'] = formation_dfs['formation_position'].astype(float).astype(int).astype(str)
+    formation_dict_melted['formation_position'] = formation_dict_melted['formation_position'].astype(str)
+    formation_dfs = formation_dfs.merge(
+        formation_dict_melted,
+        on=['formation_code', 'formation_position'],
+        how='left'
+    )
+    formation_dfs['match_id'] = matchlink
+    formation_dfs.rename(columns={'playerName': 'player_name'}, inplace=True)
+    starting_lineups = formation_dfs[
+        [
+            'match_id',
+            'contestant_id',
+            'player_name',
+            'squad_number',
+            'position',
+            'is_starter',
+            'formation_position',
+            'player_id',
+            'player_key',
+            'team_key'
+        ]
+    ]
+    ## STEP 5 - subs off
+    subs_off = df[df['typeId'] == 18][['player_key', 'timeMin']].dropna()
+    starting_lineups['player_name'] = starting_lineups['player_name'].astype(str).str.strip()
+    starting_lineups = starting_lineups.merge(subs_off, on='player_key', how='left')
+    starting_lineups.rename(columns={'timeMin': 'minutes_played'}, inplace=True)
+    starting_lineups['subbed_off'] = starting_lineups['minutes_played'].apply(
+        lambda x: 'yes' if pd.notna(x) else 'no'
+    )
+
+    ## STEP 6 - subs on
+    subs_on = df[df['typeId'] == 19][['player_key', 'timeMin']].dropna()
+    max_time = df['timeMin'].max()
+    subs_on['minutes_played'] = max_time - subs_on['timeMin']
+    subs_on['subbed_on'] = 'yes'
+    starting_lineups = starting_lineups.merge(subs_on, on='player_key', how='left')
+    starting_lineups['subbed_on'] = starting_lineups['subbed_on'].fillna('no')
+    starting_lineups['minutes_played'] = starting_lineups['minutes_played_x'].combine_first(starting_lineups['minutes_played_y'])
+    starting_lineups.drop(columns=['minutes_played_x', 'minutes_played_y'], inplace=True)
+
+    ################### NEW STEP
+    formation_changes = df[df['typeId'] == 40].copy()
+    formation_updates = []
+
+    if not formation_changes.empty:
+        for _, row in formation_changes.iterrows():
+            row_data = row.to_dict()
+            contestant_id = row_data.get('contestantId', None)
+            qualifier_cols = [col for col in row.index if 'qualifierId' in col]
+            formation_code = None
+            player_ids = []
+            formation_positions = []
+
+            for col in qualifier_cols:
+                try:
+                    qualifier_id = row[col]
+                    value_col = df.columns[df.columns.get_loc(col) + 1]
+                    value = row[value_col]
+                    if qualifier_id == 130:
+                        formation_code = str(value).strip()
+                    elif qualifier_id == 30:
+                        player_ids = str(value).split(',')
+                    elif qualifier_id == 131:
+                        formation_positions = str(value).split(',')
+                except:
+                    continue
+
+            if formation_code and player_ids and formation_positions:
+                for i, pid in enumerate(player_ids):
+                    pid = pid.strip()
+                    formation_position = str(i + 1)
+                    formation_updates.append({
+                        'player_id': pid,
+                        'formation_code': formation_code,
+                        'formation_position': formation_position
+                    })
+
+        if formation_updates:
+            sub_positions_df = pd.DataFrame(formation_updates)
+            sub_positions_df = sub_positions_df.merge(
+                formation_dict_melted,
+                on=['formation_code', 'formation_position'],
+                how='left'
+            )
+        else:
+            print("⚠ Formation changes found but no valid updates extracted.")
+            sub_positions_df = pd.DataFrame(columns=['player_id', 'formation_code', 'formation_position', 'position'])
+    else:
+        print("⚠ No formation changes (typeId == 40) found. Skipping formation update handling.")
+        sub_positions_df = pd.DataFrame(columns=['player_id', 'formation_code', 'formation_position', 'position'])
+
+
+    # Update starting_lineups with new positions (but only where position is missing)
+    starting_lineups = starting_lineups.merge(
+        sub_positions_df[['player_id', 'position']],
+        on='player_id',
+        how='left',
+        suffixes=('', '_new')
+    )
+    starting_lineups['position'] = starting_lineups['position'].combine_first(starting_lineups['position_new'])
+    starting_lineups.drop(columns=['position_new'], inplace=True)
+    # Substitutes without a formation slot inherit the position of the player they replaced
+    sub_pairs = opta_lineups.pair_substitutions(df)
+    starting_lineups = opta_lineups.inherit_positions(starting_lineups, sub_pairs)
+    ## STEP 7 - minute calc
+    max_time = df['timeMin'].max()
+    starting_lineups.loc[
+        (starting_lineups['is_starter'] == 'yes') & (starting_lineups['subbed_off'] == 'no'),
+        'minutes_played'
+    ] = max_time
+    starting_lineups = starting_lineups.loc[starting_lineups['player_name'] != 'nan']
+
+    ## STEP 8 - sendings off
+    cards = df[df['typeId'] == 17].copy()
+    qualifier_cols = [col for col in cards.columns if 'qualifierId' in col]
+
+    if not cards.empty:
+        cards['is_sent_off'] = opta_lineups.sent_off(cards, qualifier_cols)
+
+        sent_off = cards[cards['is_sent_off']][['player_key', 'timeMin']].dropna().copy()
+        sent_off.rename(columns={'timeMin': 'sent_off_min'}, inplace=True)
+    else:
+        sent_off = pd.DataFrame({'player_key': pd.Series(dtype='int64'), 'sent_off_min': pd.Series(dtype=float)})
+    starting_lineups = starting_lineups.merge(sent_off, on='player_key', how='left')
+    starting_lineups.loc[
+        (starting_lineups['sent_off_min'].notna()) & (starting_lineups['is_starter'] == 'yes'),
+        'minutes_played'
+    ] = starting_lineups['sent_off_min']
+    starting_lineups.loc[
+        (starting_lineups['sent_off_min'].notna()) & (starting_lineups['is_starter'] == 'no'),
+        'minutes_played'
+    ] = starting_lineups['sent_off_min'] - starting_lineups['minutes_played']
+    starting_lineups.drop(columns=['sent_off_min'], inplace=True)
+
+    ## STEP 9 - player position changes
+    from collections import defaultdict
+    player_position_changes = defaultdict(set)
+    formation_changes = df[df['typeId'] == 40].copy()
+    for _, row in formation_changes.iterrows():
+        row_data = row.to_dict()
+        contestant_id = row_data.get('contestantId', None)
+        qualifier_cols = [col for col in row.index if 'qualifierId' in col]
+        formation_code = None
+        player_ids = []
+        formation_positions = []
+        for col in qualifier_cols:
+            try:
+                qualifier_id = row[col]
+                value_col = df.columns[df.columns.get_loc(col) + 1]
+                value = row[value_col]
+                if qualifier_id == 130:
+                    formation_code = str(value).strip()
+                elif qualifier_id == 30:
+                    player_ids = str(value).split(',')
+                elif qualifier_id == 131:
+                    formation_positions = str(value).split(',')
+            except:
+                continue
+        if not (formation_code and player_ids and formation_positions):
+            continue
+        formation_snapshot = pd.DataFrame({
+            'formation_code': [formation_code] * len(player_ids),
+            'player_id': [pid.strip() for pid in player_ids],
+            'formation_position': [str(i + 1) for i in range(len(player_ids))],
+            'contestant_id': [contestant_id] * len(player_ids)
+        })
+        formation_snapshot = formation_snapshot.merge(
+            formation_dict_melted,
+            on=['formation_code', 'formation_position'],
+            how='left'
+        )
+        for _, player_row in formation_snapshot.iterrows():
+            pid = player_row['player_id']
+            new_pos = player_row['position']
+            if pd.isna(new_pos):
+                continue
+            match = starting_lineups[
+                (starting_lineups['player_id'] == pid) &
+                (starting_lineups['contestant_id'] == contestant_id)
+            ]
+            if match.empty:
+                continue
+            current_pos = match.iloc[0]['position']
+            if pd.isna(current_pos):
+                continue
+            if new_pos != current_pos:
+                player_position_changes[pid].add(new_pos)
+    starting_lineups['other_positions'] = starting_lineups['player_id'].apply(
+        lambda pid: ', '.join(sorted(player_position_changes[pid])) if pid in player_position_changes else None
+    )
+    player_position_change_times = defaultdict(dict)
+    for _, row in formation_changes.iterrows():
+        row_data = row.to_dict()
+        contestant_id = row_data.get('contestantId', None)
+        time_min = row_data.get('timeMin', None)
+        time_sec = row_data.get('timeSec', None)
+        period_id = row_data.get('periodId', None)
+        qualifier_cols = [col for col in row.index if 'qualifierId' in col]
+        formation_code = None
+        player_ids = []
+        formation_positions = []
+        for col in qualifier_cols:
+            try:
+                qualifier_id = row[col]
+                value_col = df.columns[df.columns.get_loc(col) + 1]
+                value = row[value_col]
+                if qualifier_id == 130:
+                    formation_code = str(value).strip()
+                elif qualifier_id == 30:
+                    player_ids = str(value).split(',')
+                elif qualifier_id == 131:
+                    formation_positions = str(value).split(',')
+            except:
+                continue
+        if not (formation_code and player_ids and formation_positions):
+            continue
+        formation_snapshot = pd.DataFrame({
+            'formation_code': [formation_code] * len(player_ids),
+            'player_id': [pid.strip() for pid in player_ids],
+            'formation_position': [str(i + 1) for i in range(len(player_ids))],
+            'contestant_id': [contestant_id] * len(player_ids)
+        })
+        formation_snapshot = formation_snapshot.merge(
+            formation_dict_melted,
+            on=['formation_code', 'formation_position'],
+            how='left'
+        )
+        for _, player_row in formation_snapshot.iterrows():
+            pid = player_row['player_id']
+            new_pos = player_row['position']
+
+            if pd.isna(new_pos):
+                continue
+            match = starting_lineups[
+                (starting_lineups['player_id'] == pid) &
+                (starting_lineups['contestant_id'] == contestant_id)
+            ]
+            if match.empty or pd.isna(match.iloc[0]['position']):
+                continue
+            current_pos = match.iloc[0]['position']
+            if new_pos != current_pos:
+                if new_pos not in player_position_change_times[pid]:
+                    player_position_change_times[pid][new_pos] = {
+                        'periodId': period_id,
+                        'timeMin': time_min,
+                        'timeSec': time_sec
+                    }
+    initial_position_lookup = starting_lineups.set_index('player_id')['position'].dropna().to_dict()
+    # Position timeline (starting position + each change) for as-of lookups
+    positions_table = opta_lineups.position_timeline(initial_position_lookup, player_position_change_times)
+    df['playing_position'] = opta_lineups.positions_at(
+        positions_table, df['playerId'], df['periodId'], df['timeMin'], df['timeSec'])
+    max_match_time = starting_lineups['minutes_played'].max()
+
+    position_change_rows = []
+    player_name_map = starting_lineups.set_index('player_id')['player_name'].to_dict()
+    team_name_map = starting_lineups.set_index('player_id')['contestant_id'].to_dict()
+
+    # Loop through position changes and create new rows
+    for pid, changes in player_position_change_times.items():
+        player_name = player_name_map.get(pid, None)
+        team_name = team_name_map.get(pid, None)
+        for pos, time_info in changes.items():
+            position_change_rows.append({
+                'timeMin': time_info['timeMin'],
+                'timeSec': time_info['timeSec'],
+                'playerId': pid,
+                'playerName': player_name,
+                #'team_name': team_name,
+                'typeId': 'position_change',
+                'playing_position': pos,
+                'periodId': time_info['periodId']
+            })
+
+    # Convert to DataFrame and append to df
+    position_change_df = pd.DataFrame(position_change_rows)
+
+
+
+    # Red card events: qualifier 32 / 33 on a card event
+    is_red_card = opta_lineups.sent_off(df, [col for col in df.columns if 'qualifierId' in col])
+    red_card_df = df[is_red_card & (df['typeId'] == 'Card')]
+    red_card_times = red_card_df.groupby('player_key')['timeMin'].min().to_dict()
+
+    # Minutes played, time on / time off for the whole lineup at once
+    starting_lineups = opta_lineups.on_off_times(starting_lineups, max_match_time, red_card_times)
+    # New Step: Track duration in each position per player
+    from collections import defaultdict
+
+    # Collect all changes including the initial position
+    position_timeline = defaultdict(list)
+
+    for player_id, changes in player_position_change_times.items():
+        # Add initial position and time 0
+        initial_pos = initial_position_lookup.get(player_id)
+        if initial_pos:
+            position_timeline[player_id].append((0, initial_pos))  # Assume minute 0
+
+        # Add sorted change times
+        for pos, time_data in sorted(
+            changes.items(),
+            key=lambda x: (x[1]['periodId'], x[1]['timeMin'], x[1]['timeSec'])
+        ):
+            if time_data['timeMin'] is not None:
+                position_timeline[player_id].append((time_data['timeMin'], pos))
+
+    # Add end of match to each player's timeline
+    for player_id, timeline in position_timeline.items():
+        # Sort timeline just to be safe
+        timeline = sorted(timeline, key=lambda x: x[0])
+        updated = []
+        for i in range(len(timeline)):
+            start_time, pos = timeline[i]
+            end_time = (
+                timeline[i+1][0] if i+1 < len(timeline)
+                else starting_lineups[starting_lineups['player_id'] == player_id]['minutes_played'].max()
+            )
+            duration = end_time - start_time
+            updated.append((pos, duration))
+        position_timeline[player_id] = updated[:5]  # Limit to 5 entries
+
+    # Add to starting_lineups
+    for i in range(5):
+        pos_col = f'position{i+1}'
+        min_col = f'position{i+1}mins'
+        starting_lineups[pos_col] = None
+        starting_lineups[min_col] = None
+
+    for idx, row in starting_lineups.iterrows():
+        player_id = row['player_id']
+        match_id = row['match_id']
+        player_changes = [r for r in position_change_rows if r['playerId'] == player_id]
+
+        # Add initial position if not explicitly in change list
+        if row['position'] and not any((r['timeMin'] == 0 and r['timeSec'] == 0) for r in player_changes):
+            player_changes.insert(0, {
+                'playerId': player_id,
+                'playerName': row['player_name'],
+                'typeId': 'position_change',
+                'playing_position': row['position'],
+                'timeMin': row['time_on'],  # use actual time on
+                'timeSec': 0,
+                'periodId': 1
+            })
+
+        # Sort chronologically
+        player_changes.sort(key=lambda r: (r['periodId'], r['timeMin'], r['timeSec']))
+
+        # Build list of minute marks
+        change_times = [r['timeMin'] + r['timeSec'] / 60 for r in player_changes]
+        end_min = row['time_off']
+        change_times.append(end_min)
+
+        # Assign positions and durations
+        for i in range(min(5, len(change_times) - 1)):
+            pos_col = f'position{i+1}'
+            mins_col = f'position{i+1}mins'
+            starting_lineups.at[idx, pos_col] = player_changes[i]['playing_position']
+            starting_lineups.at[idx, mins_col] = round(change_times[i+1] - change_times[i], 1)
+
+    ## EXTRA POSITION CODE
+
+    df = df.sort_values(by=['periodId', 'timeMin', 'timeSec']).reset_index(drop=True)
+
+    # Group changes per player
+    from collections import defaultdict
+    from datetime import timedelta
+
+    player_changes = defaultdict(list)
+    for row in position_change_rows:
+        pid = row['playerId']
+        player_changes[pid].append({
+            'timeMin': row['timeMin'],
+            'timeSec': row['timeSec'],
+            'periodId': row['periodId'],
+            'position': row['playing_position']
+        })
+
+    # Sort each player's changes by time
+    for pid in player_changes:
+        player_changes[pid].sort(key=lambda x: (x['periodId'], x['timeMin'], x['timeSec']))
+
+    # Assign positions to df rows
+    for pid, changes in player_changes.items():
+        player_mask = df['playerId'] == pid
+        player_df = df[player_mask]
+
+        # Get the initial position from starting_lineups
+        initial_pos = starting_lineups[starting_lineups['player_id'] == pid]['position']
+        if initial_pos.empty or pd.isna(initial_pos.iloc[0]):
+            continue
+        initial_pos = initial_pos.iloc[0]
+
+        # First period: from time_on or period start up to first change
+        first_change = changes[0]
+        condition = (
+            player_mask &
+            (
+                (df['periodId'] < first_change['periodId']) |
+                ((df['periodId'] == first_change['periodId']) & (
+                    (df['timeMin'] < first_change['timeMin']) |
+                    ((df['timeMin'] == first_change['timeMin']) & (df['timeSec'] < first_change['timeSec']))
+                ))
+            )
+        )
+        df.loc[condition, 'playing_position'] = initial_pos
+
+        # Fill between changes
+        for i in range(1, len(changes)):
+            prev = changes[i-1]
+            curr = changes[i]
+            condition = (
+                player_mask &
+                (
+                    (df['periodId'] > prev['periodId']) |
+                    ((df['periodId'] == prev['periodId']) & (
+                        (df['timeMin'] > prev['timeMin']) |
+                        ((df['timeMin'] == prev['timeMin']) & (df['timeSec'] >= prev['timeSec']))
+                    ))
+                ) &
+                (
+                    (df['periodId'] < curr['periodId']) |
+                    ((df['periodId'] == curr['periodId']) & (
+                        (df['timeMin'] < curr['timeMin']) |
+                        ((df['timeMin'] == curr['timeMin']) & (df['timeSec'] < curr['timeSec']))
+                    ))
+                )
+            )
+            df.loc[condition, 'playing_position'] = prev['position']
+
+        # Fill from last change to end of match
+        last = changes[-1]
+        condition = (
+            player_mask &
+            (
+                (df['periodId'] > last['periodId']) |
+                ((df['periodId'] == last['periodId']) & (
+                    (df['timeMin'] > last['timeMin']) |
+                    ((df['timeMin'] == last['timeMin']) & (df['timeSec'] >= last['timeSec']))
+                ))
+            )
+        )
+        df.loc[condition, 'playing_position'] = last['position']
+
+
+    #DF WORK
+    # Show current directory contents for debugging
+    
+    # Safe load for 'Opta Events.xlsx'
+    try:
+        events = lazy.table("Opta Events.xlsx")
+        #st.success("✅ Loaded 'Opta Events.xlsx'")
+        event_map = dict(zip(events["Code"], events["Event"]))
+    except FileNotFoundError:
+        errors.append("❌ File 'Opta Events.xlsx' not found. Please upload or check your repo.")
+        events = pd.DataFrame()
+        event_map = {}
+    except Exception as e:
+        errors.append(f"⚠️ Error loading 'Opta Events.xlsx': {e}")
+        events = pd.DataFrame()
+        event_map = {}
+    qualifiers = lazy.table("Opta Qualifiers.xlsx")
+    #teamdata = pd.read_csv(r"C:\Users\will-\OneDrive\Documents\WT Analysis\Scoresway\Team Log\teamlog.csv")
+    event_map = dict(zip(events["Code"], events["Event"]))
+    qualifier_map = dict(zip(qualifiers["Code"], qualifiers["Qualifier"]))
+    df = df.iloc[:, :100]
+    if 'assist' not in df.columns:
+        df['assist'] = 0  # or np.nan if you prefer missing values
+    df["typeId"] = df["typeId"].map(event_map).fillna(df["typeId"])
+    
+    # Build the requested qualifier column names (0..15), then keep only those present
+    qualifier_columns_requested = [f"qualifier/{i}/qualifierId" for i in range(16)]
+    qualifier_cols = [c for c in qualifier_columns_requested if c in df.columns]
+    
+    # Map qualifier ids -> names only on existing columns
+    if qualifier_cols:
+        df[qualifier_cols] = df[qualifier_cols].applymap(lambda x: qualifier_map.get(x, x))
+    
+    # The rest of your transformations
+    df["outcome"] = df["outcome"].replace({0: "Unsuccessful", 1: "Successful"})
+    df.rename(columns={"contestantId": "team_name"}, inplace=True)
+    df = df.merge(teamdata[["id", "name"]], how="left", left_on="team_name", right_on="id")
+    df.drop(columns=["team_name", "id_y"], inplace=True)
+    df.rename(columns={"name": "team_name", "id_x": "id"}, inplace=True)
+    
+    # -------- Pass End X / Y extraction (robust to missing qualifier slots) --------
+    # Ensure end_x/end_y exist
+    if "end_x" not in df.columns:
+        df["end_x"] = pd.NA
+    if "end_y" not in df.columns:
+        df["end_y"] = pd.NA
+    
+    # Dynamically determine max qualifier index from existing columns
+    qualifier_indices = [
+        int(m.group(1)) for col in df.columns
+        if (m := re.match(r"qualifier/(\d+)/", col))
+    ]
+    max_index = max(qualifier_indices, default=-1)  # -1 so the loop is skipped if none
+    
+    # Loop over present qualifier slots
+    for i in range(max_index + 1):
+        value_col = f"qualifier/{i}/value"
+        id_col = f"qualifier/{i}/qualifierId"
+        if value_col not in df.columns or id_col not in df.columns:
+            continue
+    
+        end_x_mask = df[id_col] == "Pass End X"
+        end_y_mask = df[id_col] == "Pass End Y"
+    
+        df.loc[end_x_mask, "end_x"] = pd.to_numeric(df.loc[end_x_mask, value_col], errors="coerce")
+        df.loc[end_y_mask, "end_y"] = pd.to_numeric(df.loc[end_y_mask, value_col], errors="coerce")
+    
+    # Final clean up for end coords
+    df["end_x"] = df["end_x"].fillna(0)
+    df["end_y"] = df["end_y"].fillna(0)
+    
+    # -------- Qualifier-driven flags (safe even if no qualifier columns exist) --------
+    def has_qual(label: str) -> pd.Series:
+        if qualifier_cols:
+            # vectorized: check if any qualifier col equals the label on each row
+            return df[qualifier_cols].eq(label).any(axis=1).astype(int)
+        else:
+            return pd.Series(0, index=df.index, dtype=int)
+    
+    df["throwin"]       = has_qual("Throw-in")
+    df["corner"]        = has_qual("Corner taken")
+    df["freekick"]      = has_qual("Free-kick taken")
+    df["goalkick"]      = has_qual("Goal Kick")
+    df["cross"]         = has_qual("Cross")
+    df["longball"]      = has_qual("Long ball")
+    df["switch"]        = has_qual("Switch of play")
+    df["launch"]        = has_qual("Launch")
+    df["secondassist"]  = has_qual("2nd assist")
+    df["head"]          = has_qual("Head")
+    df["leftfoot"]      = has_qual("Left footed")
+    df["rightfoot"]     = has_qual("Right footed")
+    df["otherbody"]     = has_qual("Other body part")
+    df["fastbreakshot"] = has_qual("Fast break")
+    df["setpieceshot"]  = has_qual("Set piece")
+    df["freekickshot"]  = has_qual("Free kick")
+    df["cornershot"]    = has_qual("From corner")
+    df["throwinshot"]   = has_qual("Throw-in set piece")
+    df["dfreekickshot"] = has_qual("Direct free")
+    df["penaltyshot"]   = has_qual("Penalty")
+    df["bigchance"]     = has_qual("Big chance")
+    df["hitwoodwork"]   = has_qual("Hit woodwork")
+    df["lastman"]       = has_qual("Last line")
+    df["errorshot"]     = has_qual("Leading to attempt")
+    df["errorgoal"]     = has_qual("Leading to goal")
+    df["yellowcard"]    = has_qual("Yellow Card")
+    df["yellowcard2"]   = has_qual("Second yellow")
+    df["redcard"]       = has_qual("Red Card")
+    df["shotblocked"]   = has_qual("Blocked")
+    
+    # Own goal detection (same logic as before, but scoped to qualifier cols)
+    if qualifier_cols:
+        df["owngoal"] = df[qualifier_cols].apply(
+            lambda row: any(
+                isinstance(v, str) and v.strip().lower() in {"own goal", "own_goal"}
+                for v in row.values
+            ),
+            axis=1
+        ).astype(int)
+    else:
+        df["owngoal"] = 0
+    
+    df.loc[df["owngoal"] == 1, "typeId"] = "Own Goal"
+    df = df.loc[df['typeId'] !=40]
+    df = df.loc[df['typeId'] !="Deleted event"]
+
+    values_to_remove = ['Collection End', 'End', 'Team set up', 'Start']
+    df = df[~df['typeId'].isin(values_to_remove)]
+    columns_to_keep = ['id', 'eventId', 'typeId', 'periodId', 'timeMin', 'timeSec',
+                       'team_name', 'outcome', 'x', 'y', 'end_x', 'end_y', 
+                       'playerName','player_key','team_key','playing_position', 'keyPass', 'secondassist','assist',
+                      'throwin','corner','freekick','goalkick','cross','longball','switch','launch',
+                      'head','leftfoot','rightfoot','otherbody',
+                      'fastbreakshot','setpieceshot','freekickshot','cornershot','throwinshot','dfreekickshot','penaltyshot','owngoal',
+                       'bigchance','hitwoodwork','lastman','errorshot','errorgoal', 'yellowcard','yellowcard2','redcard','shotblocked']
+    df = df[columns_to_keep]
+    df['end_x'] = ((df['end_x'] - df['end_x'].min()) / (df['end_x'].max() - df['end_x'].min())) * 100
+    df['end_y'] = ((df['end_y'] - df['end_y'].min()) / (df['end_y'].max() - df['end_y'].min())) * 100
+    df.loc[df['owngoal'] == 1, 'typeId'] = 'Own Goal'
+    # Possessions: run-length segments over team changes, set pieces and stoppages
+    df = opta_possession.segment_possessions(df)
+    # Recipient = next on-ball event of the same team in the same possession
+    # (skips opponent duels / fouls that sit between the pass and the reception)
+    following = opta_possession.next_in_possession(df, ['playerName', 'player_key', 'playing_position'])
+    df['next_player'] = following['playerName']
+    df['next_position'] = following['playing_position']
+    successful_pass = (df['typeId'] == 'Pass') & (df['outcome'] == 'Successful')
+    df['pass_recipient'] = df['next_player'].where(successful_pass)
+    df['pass_recipient_key'] = following['player_key'].where(successful_pass)
+    df['pass_recipient_position'] = df['next_position'].where(successful_pass)
+    df = df[df['typeId'].notna()].reset_index(drop=True)
+    mask = df['typeId'] == 'Ball recovery'
+    df.loc[mask, 'end_x'] = df.loc[mask, 'x']
+    df.loc[mask, 'end_y'] = df.loc[mask, 'y']
+    ##CARRY
+    df['event_time'] = df['timeMin'] * 60 + df['timeSec']
+    df = df.sort_values(by=['event_time', 'id']).reset_index(drop=True)
+    df = df.loc[df['periodId'] != 5]
+    carry_rows = []
+    for i in range(len(df) - 1):
+        current = df.iloc[i]
+        current_team = current['team_name']
+        current_player = current['playerName']
+        end_x = current['end_x']
+        end_y = current['end_y']
+        current_type = current['typeId']
+        current_outcome = current['outcome']
+        is_pass = (current_type == 'Pass' and current_outcome == 'Successful')
+        is_recovery = (current_type == 'Ball recovery' and current_outcome == 'Successful')
+        is_interception = (current_type == 'Interception')
+        is_take_on = (current_type == 'Take on' and current_outcome == 'Successful')
+        if not (is_pass or is_recovery or is_interception or is_take_on):
+            continue
+        for j in range(i + 1, len(df)):
+            next_row = df.iloc[j]
+            if next_row['team_name'] != current_team:
+                continue
+            if (end_x == next_row['x']) and (end_y == next_row['y']):
+                break
+            if next_row['typeId'] == 'Aerial':
+                break
+            if (is_recovery or is_interception or is_take_on) and current_player != next_row['playerName']:
+                break
+            carry_row = current.copy()
+            carry_row['id'] = current['id'] + 0.5
+            carry_row['eventId'] = current['eventId'] + 0.5
+            carry_row['typeId'] = 'Carry'
+            carry_row['x'] = end_x
+            carry_row['y'] = end_y
+            carry_row['end_x'] = next_row['x']
+            carry_row['end_y'] = next_row['y']
+            carry_row['playerName'] = next_row['playerName']
+            carry_row['player_key'] = next_row['player_key']
+            carry_row['playing_position'] = next_row['playing_position']
+            carry_row['outcome'] = 'Successful'
+            carry_rows.append(carry_row)
+            break
+    df = pd.concat([df, pd.DataFrame(carry_rows)], ignore_index=True)
+    df = df.sort_values(by=['timeMin', 'timeSec', 'periodId']).reset_index(drop=True)
+    df = df[~((df['typeId'] == 'Carry') & (df['x'] == 0) & (df['y'] == 0))].reset_index(drop=True)
+    df = df[~((df['typeId'] == 'Carry') & (df['end_x'] == 0) & (df['end_y'] == 0))].reset_index(drop=True)
+    #to_delete = []
+    #for i in range(len(df) - 1):
+    #    if df.iloc[i]['typeId'] == 'Carry' and df.iloc[i + 1]['typeId'] == 'Ball recovery':
+    #        to_delete.append(i)  # Add the index of the 'Carry' row to delete
+    #df = df.drop(index=to_delete).reset_index(drop=True)
+    df.loc[df['typeId'] == 'Carry', 'pass_recipient'] = np.nan
+    carry_filter = ~(
+        (df['typeId'] == 'Carry') &
+        ((df['x'] - df['end_x']).abs() < 1.5) &
+        ((df['y'] - df['end_y']).abs() < 2.5)
+    )
+    df = df[carry_filter]
+    df.loc[df['typeId'] == 'Carry', ['keyPass', 'assist']] = np.nan
+    #XTHREAT
+    xT = np.array([[0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ]])
+    xT_rows, xT_cols = xT.shape
+    x_bins = np.linspace(0, 100, xT_cols + 1)  # 12 bins for x-axis
+    y_bins = np.linspace(0, 100, xT_rows + 1)  # 8 bins for y-axis
+    df['x1_bin'] = pd.cut(df['x'], bins=x_bins, labels=False)
+    df['y1_bin'] = pd.cut(df['y'], bins=y_bins, labels=False)
+    df['x2_bin'] = pd.cut(df['end_x'], bins=x_bins, labels=False)
+    df['y2_bin'] = pd.cut(df['end_y'], bins=y_bins, labels=False)
+    passingthreat = df.loc[(df['typeId'] == 'Pass') & (df['outcome'] == 'Successful')]
+    passingthreat = passingthreat.loc[passingthreat['x'] < 99.49]
+    passingthreat = passingthreat.dropna(subset=['x1_bin', 'y1_bin', 'x2_bin', 'y2_bin'])
+    passingthreat['x1_bin'] = passingthreat['x1_bin'].astype(int)
+    passingthreat['y1_bin'] = passingthreat['y1_bin'].astype(int)
+    passingthreat['x2_bin'] = passingthreat['x2_bin'].astype(int)
+    passingthreat['y2_bin'] = passingthreat['y2_bin'].astype(int)
+    passingthreat['xT_value'] = passingthreat.apply(
+        lambda row: xT[row['y2_bin']][row['x2_bin']] - xT[row['y1_bin']][row['x1_bin']], 
+        axis=1
+    )
+    passthreattotal = opta_keys.totals(passingthreat)
+    carrythreat = df.loc[df['typeId'] == 'Carry']
+    carrythreat['y_diff'] = carrythreat['y'] - carrythreat['end_y']
+    carrythreat['x_diff'] = carrythreat['x'] - carrythreat['end_x']
+
+    carrythreat = carrythreat.dropna(subset=['x1_bin', 'y1_bin', 'x2_bin', 'y2_bin'])
+    carrythreat['x1_bin'] = carrythreat['x1_bin'].astype(int)
+    carrythreat['y1_bin'] = carrythreat['y1_bin'].astype(int)
+    carrythreat['x2_bin'] = carrythreat['x2_bin'].astype(int)
+    carrythreat['y2_bin'] = carrythreat['y2_bin'].astype(int)
+    carrythreat['xT_value'] = carrythreat.apply(
+        lambda row: xT[row['y2_bin']][row['x2_bin']] - xT[row['y1_bin']][row['x1_bin']], 
+        axis=1
+    )
+    carrythreattotal = opta_keys.totals(carrythreat)
+    df['id'] = df['id'].astype(str)
+    passingthreat['id'] = passingthreat['id'].astype(str)
+    df = df.merge(
+        passingthreat[['id', 'xT_value']],
+        on='id',
+        how='left'
+    )
+    carrythreat['id'] = carrythreat['id'].astype(str)
+    carrythreat['eventId'] = carrythreat['eventId'].astype(str)
+    df['id'] = df['id'].astype(str)
+    df['eventId'] = df['eventId'].astype(str)
+    df = df.merge(
+        carrythreat[['id', 'eventId', 'xT_value']],
+        on=['id', 'eventId'],
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    df['assist_xt'] = 0
+    df.loc[df['keyPass'] == 1, 'assist_xt'] = 0.1
+    df.loc[df['assist'] == 1, 'assist_xt'] = 0.6
+    shotassisttotal = opta_keys.totals(df, 'assist_xt')
+    shotassisttotal.rename(columns={'assist_xt': 'xT_value'}, inplace=True)
+    shotassisttotal = shotassisttotal.loc[shotassisttotal['xT_value']>0]
+    teamname = teamdata.iloc[0, 1]
+    opponentname = teamdata.iloc[1,1]
+    RPxT = np.array([[0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ]])
+    RPxT_rows, RPxT_cols = RPxT.shape
+    distinct_teams = df['team_name'].dropna().unique()
+    teamsinmatch = teamdata[teamdata['name'].isin(distinct_teams)].copy()
+    teamsinmatch.rename(columns={'name': 'team'}, inplace=True)
+    teamsinmatch = teamsinmatch[['id', 'team']]
+    teamname = teamsinmatch.iloc[0, 1]
+    recthreattest = df.loc[df['team_name']==teamname]
+    recthreattest = recthreattest.loc[recthreattest['end_x']>50]
+    receivedpasshome = recthreattest[(recthreattest['typeId'] == 'Pass') & (recthreattest['outcome'] == 'Successful')]
+    receivedpasshome['recipient'] = recthreattest['playerName'].shift(-1)
+    receivedpasshome['x2_bin'] = pd.cut(receivedpasshome['end_x'], bins=RPxT_cols, labels=False)
+    receivedpasshome['y2_bin'] = pd.cut(receivedpasshome['end_y'], bins=RPxT_rows, labels=False)
+    receivedpasshome['xT_value'] = receivedpasshome[['x2_bin', 'y2_bin']].apply(lambda x: RPxT[x[1]][x[0]], axis=1)
+    recpassh = receivedpasshome.groupby('recipient')['xT_value'].sum().reset_index()
+    recpassh.rename(columns={'recipient': 'playerName'}, inplace=True)
+    recthreattest = df.loc[df['team_name']!=teamname]
+    recthreattest = recthreattest.loc[recthreattest['end_x']>50]
+    receivedpassaway = recthreattest[(recthreattest['typeId'] == 'Pass') & (recthreattest['outcome'] == 'Successful')]
+    receivedpassaway['recipient'] = recthreattest['playerName'].shift(-1)
+    receivedpassaway['x2_bin'] = pd.cut(receivedpassaway['end_x'], bins=RPxT_cols, labels=False)
+    receivedpassaway['y2_bin'] = pd.cut(receivedpassaway['end_y'], bins=RPxT_rows, labels=False)
+    receivedpassaway['xT_value'] = receivedpassaway[['x2_bin', 'y2_bin']].apply(lambda x: RPxT[x[1]][x[0]], axis=1)
+    recpassa = receivedpassaway.groupby('recipient')['xT_value'].sum().reset_index()
+    recpassa.rename(columns={'recipient': 'playerName'}, inplace=True)
+    receivedpasses = pd.concat([recpassh, recpassa], ignore_index=True)
+    receivedpassestotal = receivedpasses.groupby('playerName')['xT_value'].sum().reset_index()
+    RPxT = np.array([[0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ]])
+    RPxT_rows, RPxT_cols = RPxT.shape
+    recthreattest = df.loc[df['team_name']==teamname]
+    recthreattest = recthreattest.loc[recthreattest['end_x']>50]
+    receivedpasshome = recthreattest[(recthreattest['typeId'] == 'Pass') & (recthreattest['outcome'] == 'Successful')]
+    receivedpasshome['x2_bin'] = pd.cut(receivedpasshome['end_x'], bins=RPxT_cols, labels=False)
+    receivedpasshome['y2_bin'] = pd.cut(receivedpasshome['end_y'], bins=RPxT_rows, labels=False)
+    receivedpasshome['xT_value'] = receivedpasshome[['x2_bin', 'y2_bin']].apply(lambda x: RPxT[x[1]][x[0]], axis=1)
+    recpassh = opta_keys.totals(receivedpasshome, key='pass_recipient_key')
+    recthreattest = df.loc[df['team_name']!=teamname]
+    recthreattest = recthreattest.loc[recthreattest['end_x']>50]
+    receivedpassaway = recthreattest[(recthreattest['typeId'] == 'Pass') & (recthreattest['outcome'] == 'Successful')]
+    receivedpassaway['x2_bin'] = pd.cut(receivedpassaway['end_x'], bins=RPxT_cols, labels=False)
+    receivedpassaway['y2_bin'] = pd.cut(receivedpassaway['end_y'], bins=RPxT_rows, labels=False)
+    receivedpassaway['xT_value'] = receivedpassaway[['x2_bin', 'y2_bin']].apply(lambda x: RPxT[x[1]][x[0]], axis=1)
+    recpassa = opta_keys.totals(receivedpassaway, key='pass_recipient_key')
+    receivedpasses = pd.concat([recpassh, recpassa], ignore_index=True)
+    receivedpassestotal = opta_keys.totals(receivedpasses)
+    eventstoinclude = ['Tackle',
+                       'Aerial',
+                       'Challenge',
+                       'Interception',
+                       'Blocked Pass',
+                       'Clearance',
+                       'Ball recovery'
+                      ]
+    df_events_def = df[df['typeId'].isin(eventstoinclude)]
+    xT = np.array([[0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.00941056, 0.01082722, 0.01016549, 0.01132376, 0.01262646,
+                            0.01484598, 0.01689528, 0.0199707 , 0.02385149, 0.03511326,
+                            0.10805102, 0.25745362],
+                           [0.0088799 , 0.00977745, 0.01001304, 0.01110462, 0.01269174,
+                            0.01429128, 0.01685596, 0.01935132, 0.0241224 , 0.02855202,
+                            0.05491138, 0.06442595],
+                           [0.00750072, 0.00878589, 0.00942382, 0.0105949 , 0.01214719,
+                            0.0138454 , 0.01611813, 0.01870347, 0.02401521, 0.02953272,
+                            0.04066992, 0.04647721],
+                           [0.00638303, 0.00779616, 0.00844854, 0.00977659, 0.01126267,
+                            0.01248344, 0.01473596, 0.0174506 , 0.02122129, 0.02756312,
+                            0.03485072, 0.0379259 ]])
+    xT_rows, xT_cols = xT.shape
+    df_events_def['x'] = 105 - df_events_def['x']
+    df_events_def['end_x'] = 105 - df_events_def['end_x']
+    df_events_def['x1_bin'] = pd.cut(df_events_def['x'], bins=xT_cols, labels=False)
+    df_events_def['y1_bin'] = pd.cut(df_events_def['y'], bins=xT_rows, labels=False)
+    df_events_def['xT_value'] = df_events_def[['x1_bin', 'y1_bin']].apply(lambda x: xT[x[1]][x[0]], axis=1)
+    df_events_def['xT_value'] = df_events_def.apply(lambda row: row['xT_value'] * -1 if row['outcome'] == 'Unsuccessful' else row['xT_value'], axis=1)
+    defthreattotal = opta_keys.totals(df_events_def)
+    df = df.merge(
+        df_events_def[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    IPxT = np.array([[0.01, 0.012, 0.013, 0.015, 0.017,
+                    0.018, 0.02, 0.022 , 0.025, 0.02756312,
+                    0.03485072, 0.0379259 ],
+                   [0.012, 0.01378589, 0.01442382, 0.0155949 , 0.01714719,
+                    0.0188454 , 0.02111813, 0.02370347, 0.02701521, 0.02953272,
+                    0.04066992, 0.04647721],
+                   [0.01388799 , 0.01477745, 0.01501304, 0.01610462, 0.01869174,
+                    0.020, 0.02285596, 0.02535132, 0.031224 , 0.0455202,
+                    0.05491138, 0.06442595],
+                   [0.02941056, 0.03082722, 0.03216549, 0.03432376, 0.0462646,
+                    0.04784598, 0.0589528, 0.0699707 , 0.07385149, 0.08511326,
+                    0.10805102, 0.25745362],
+                   [0.02941056, 0.03082722, 0.03216549, 0.03432376, 0.0462646,
+                    0.04784598, 0.0589528, 0.0699707 , 0.07385149, 0.08511326,
+                    0.10805102, 0.25745362],
+                   [0.01388799 , 0.01477745, 0.01501304, 0.01610462, 0.01869174,
+                    0.020, 0.02285596, 0.02535132, 0.031224 , 0.0455202,
+                    0.05491138, 0.06442595],
+                   [0.012, 0.01378589, 0.01442382, 0.0155949 , 0.01714719,
+                    0.0188454 , 0.02111813, 0.02370347, 0.02701521, 0.02953272,
+                    0.04066992, 0.04647721],
+                   [0.01, 0.012, 0.013, 0.015, 0.017,
+                    0.018, 0.02, 0.022 , 0.025, 0.02756312,
+                    0.03485072, 0.0379259 ]])
+    IPxT_rows, IPxT_cols = IPxT.shape
+    incompletepasses = df.loc[(df['typeId'] == 'Pass') & (df['outcome'] == 'Unsuccessful')]
+    incompletepasses['x'] = 105 - incompletepasses['x']
+    incompletepasses['end_x'] = 105 - incompletepasses['end_x']
+    incompletepasses['x1_bin'] = pd.cut(incompletepasses['x'], bins=IPxT_cols, labels=False)
+    incompletepasses['y1_bin'] = pd.cut(incompletepasses['y'], bins=IPxT_rows, labels=False)
+    incompletepasses['xT_value'] = incompletepasses[['x1_bin', 'y1_bin']].apply(lambda x: IPxT[x[1]][x[0]], axis=1)
+    incompletepasses['xT_value'] = incompletepasses['xT_value']*-1
+    incomppasstotal = opta_keys.totals(incompletepasses)
+    df = df.merge(
+        incompletepasses[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    df['card_value'] = 0
+    df.loc[df['yellowcard'] == 1, 'card_value'] = -0.275
+    df.loc[df['yellowcard2'] == 1, 'card_value'] = -0.525
+    df.loc[df['redcard'] == 1, 'card_value'] = -0.8
+    cards_df = opta_keys.totals(df, 'card_value')
+    cards_df = cards_df.rename(columns={'card_value': 'xT_value'})
+
+    #### SHOTS
+
+    shotstaken = df[df['typeId'].isin(['Miss', 'Goal', 'Attempt Saved'])]
+
+    # Optionally reset the index
+    shotstaken = shotstaken.reset_index(drop=True)
+    # Make sure shotstaken DataFrame already exists as per your previous step
+
+    # Add a new column 'xT_value' with default NaN (optional)
+    # Make sure shotstaken DataFrame already exists as per your previous step
+
+    # Add a new column 'xT_value' with default NaN (optional)
+    shotstaken['xT_value'] = None
+
+    # Assign values based on typeId
+    shotstaken.loc[shotstaken['typeId'] == 'Goal', 'xT_value'] = 0.95
+    shotstaken.loc[shotstaken['typeId'] == 'Attempt Saved', 'xT_value'] = 0.2
+    shotstaken.loc[shotstaken['typeId'] == 'Miss', 'xT_value'] = 0.05
+    shotstaken.loc[shotstaken['shotblocked'] == 1, 'xT_value'] = 0.05
+
+    # Optionally convert xT_value to float type
+    shotstaken['xT_value'] = shotstaken['xT_value'].astype(float)
+
+    shotstakentotal = opta_keys.totals(shotstaken)
+    df = df.merge(
+        shotstaken[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+
+    ##GOALS CONCEDED
+    starting_lineups = starting_lineups.merge(teamdata, left_on='contestant_id', right_on='id', how='left')
+    starting_lineups.rename(columns={'name': 'team_name'}, inplace=True)
+
+    # Ensure numeric columns for time comparisons
+    starting_lineups['time_on'] = pd.to_numeric(starting_lineups['time_on'])
+    starting_lineups['time_off'] = pd.to_numeric(starting_lineups['time_off'])
+
+    # Step 1: Add goal event info from df
+    goal_events = df[df['typeId'].isin(['Goal', 'Own Goal'])].copy()
+    goal_events['minute'] = pd.to_numeric(goal_events['timeMin'], errors='coerce')
+
+    # Step 2: who scored / who conceded (own goals count for the other side)
+    team_names = df['team_name'].dropna().unique()
+    goal_events = opta_lineups.goal_sides(goal_events, team_names)
+
+    # Step 3: one interval join of time on pitch against the goals
+    starting_lineups[['goals_scored', 'goals_conceded', 'penalties_conceded']] = \
+        opta_lineups.goals_for_against(starting_lineups, goal_events)
+
+    # Goal conceded rows for every player of the conceding side on the pitch
+    goal_conceded_df = opta_lineups.goal_conceded_events(starting_lineups, goal_events, positions_table)
+
+    # Ensure all columns match df
+    for col in df.columns:
+        if col not in goal_conceded_df.columns:
+            goal_conceded_df[col] = None
+
+    # Append to main df
+    df = pd.concat([df, goal_conceded_df], ignore_index=True)
+    df = df.sort_values(by=['periodId', 'timeMin', 'timeSec']).reset_index(drop=True)
+
+    # =========================
+    # CLEAN SHEET LOGIC BELOW
+    # =========================
+
+    # Only allow clean sheets for players on teams that did NOT concede
+    clean_sheet_df = opta_lineups.clean_sheet_events(starting_lineups, goal_events['conceding_team'].unique())
+
+    # Ensure all columns match df
+    for col in df.columns:
+        if col not in clean_sheet_df.columns:
+            clean_sheet_df[col] = None
+
+    # Append and sort
+    df = pd.concat([df, clean_sheet_df], ignore_index=True)
+    df = df.sort_values(by=['periodId', 'timeMin', 'timeSec'], na_position='last').reset_index(drop=True)
+
+
+    clean_sheet_mask = df['typeId'] == 'clean_sheet'
+    df = pd.concat([
+        df[~clean_sheet_mask],
+        df[clean_sheet_mask].drop_duplicates(subset=['playerName', 'playing_position'])
+    ]).reset_index(drop=True)
+
+    starting_lineups = starting_lineups[starting_lineups['minutes_played'].notna()]
+
+    # Lineup value: clean sheet bonus over 60 minutes, otherwise a penalty per goal conceded
+    lineup_group = opta_lineups.position_group(starting_lineups['position'])
+    kept_clean = (starting_lineups['minutes_played'] > 60) & (starting_lineups['goals_conceded'] == 0)
+    starting_lineups['xT_value'] = np.where(
+        kept_clean,
+        lineup_group.map(opta_lineups.CLEAN_SHEET_VALUE).fillna(0),
+        starting_lineups['goals_conceded'] * lineup_group.map(opta_lineups.CONCEDED_VALUE).fillna(0)
+    )
+    goalsconcededtotal = opta_keys.totals(df[df['typeId'].isin(['goal_conceded', 'clean_sheet'])])
+    ##TAKE ON
+    takeondf = df[df['typeId'] == 'Take On'].copy()
+    takeondf['x'] = pd.to_numeric(takeondf['x'], errors='coerce')
+    def assign_xt(row):
+        if row['x'] < 33.33:
+            return -0.15 if row['outcome'] == 'Unsuccessful' else 0.05
+        elif row['x'] < 66.66:
+            return -0.1 if row['outcome'] == 'Unsuccessful' else 0.1
+        else:
+            return -0.05 if row['outcome'] == 'Unsuccessful' else 0.15
+    takeondf['xT_value'] = takeondf.apply(assign_xt, axis=1)
+    takeontotal = opta_keys.totals(takeondf)
+    df = df.merge(
+        takeondf[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    #ERRORS
+    errorsdf = df[(df['errorshot'] == 1) | (df['errorgoal'] == 1)].copy()
+    def assign_error_xt(row):
+        if row.get('errorgoal') == 1:
+            return -0.5
+        elif row.get('errorshot') == 1:
+            return -0.1
+        return 0  # fallback (shouldn't occur with current filter)
+    errorsdf['xT_value'] = errorsdf.apply(assign_error_xt, axis=1)
+    errorstotal = opta_keys.totals(errorsdf)
+    df = df.merge(
+        errorsdf[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    #DISPOSSESSED
+    dispossdf = df[df['typeId'] == 'Dispossessed'].copy()
+    def assign_disposs_xt(x):
+        if x < 33.3:
+            return -0.15
+        elif 33.3 <= x < 66.6:
+            return -0.01
+        else:  # x >= 66.6
+            return -0.05
+    dispossdf['xT_value'] = dispossdf['x'].apply(assign_disposs_xt)
+    disposstotal = opta_keys.totals(dispossdf)
+    df = df.merge(
+        errorsdf[['id', 'xT_value']],
+        on='id',
+        how='left',
+        suffixes=('', '_carry')
+    )
+    df['xT_value'] = df['xT_value'].combine_first(df['xT_value_carry'])
+    df.drop(columns=['xT_value_carry'], inplace=True)
+    dataframes = [
+        shotstakentotal,
+        defthreattotal,
+        incomppasstotal,
+        passthreattotal,
+        carrythreattotal,
+        cards_df,
+        shotassisttotal,
+        receivedpassestotal,
+        goalsconcededtotal,
+        takeontotal,
+        errorstotal,
+        disposstotal
+    #    keepertotals
+    ]
+    valid_dataframes = [df for df in dataframes if isinstance(df, pd.DataFrame) and not df.empty]
+
+
+    totalxt = opta_keys.totals(pd.concat(dataframes))
+    totalxt = totalxt.sort_values(by='xT_value', ascending=False)
+    goalkeepers = starting_lineups[starting_lineups['position'] == 'GK']['player_key'].unique()
+    totalxt = totalxt[~totalxt['player_key'].isin(goalkeepers)].reset_index(drop=True)
+    # names are attached only here, for display
+    totalxt.insert(0, 'playerName', opta_keys.player_names(opta_key_table, totalxt['player_key']))
+    trimmed_xt = totalxt.iloc[1:-1]
+    mean_xt = trimmed_xt['xT_value'].mean()
+    totalxt['Player Impact'] = totalxt['xT_value'] - mean_xt
+    totalxt['Player Impact'] = totalxt['Player Impact'].round(2)
+    totalxt['Player Impact'] = totalxt['Player Impact'].apply(
+        lambda x: f"+{x:.2f}" if x > 0 else f"-{abs(x):.2f}"
+    )
+    totalxt['Match Rank'] = totalxt['xT_value'].rank(method='max', ascending=False)
+    totalxt['Match Rank'] = totalxt['Match Rank'].astype(int)
+    totalxt.rename(columns={'xT_value': 'Threat Value'}, inplace=True)
+    starting_lineups = starting_lineups.merge(totalxt, how='left', on='player_key')
+    starting_lineups = starting_lineups.drop_duplicates(subset=['player_id', 'match_id'], keep='first')
+    for col in df.columns:
+        if col not in position_change_df.columns:
+            position_change_df[col] = None
+    df = pd.concat([df, position_change_df], ignore_index=True)
+            # Calculate distance to goal for all rows
+    df['start_distance'] = ((df['x'] - 100) ** 2 + (df['y'] - 50) ** 2) ** 0.5
+    df['end_distance'] = ((df['end_x'] - 100) ** 2 + (df['end_y'] - 50) ** 2) ** 0.5
+
+            # -------- Progressive Carry Logic --------
+            # Progressive if Carry and at least 20% closer to goal
+    df['progressive_carry'] = 'No'
+    carry_mask = (df['typeId'] == 'Carry') & (df['end_distance'] < 0.8 * df['start_distance'])
+    df.loc[carry_mask, 'progressive_carry'] = 'Yes'
+
+            # -------- Progressive Pass Logic --------
+            # Define pass zones and thresholds
+    pass_conditions = [
+        (df['x'] <= 50) & (df['end_x'] <= 50),      # Defensive third
+        (df['x'] <= 50) & (df['end_x'] >= 50),      # From defensive to middle
+        (df['x'] > 50) & (df['x'] <= 75),           # Middle third
+        (df['x'] > 75)                                        # Final third
+        ]
+    pass_percentages = [0.65, 0.80, 0.85, 1.00]
+
+            # Initialize column
+    df['progressive_pass'] = 'No'
+
+            # Apply conditions only to Successful Passes
+    is_pass = (df['typeId'] == 'Pass') & (df['outcome'] == 'Successful')
+    for cond, threshold in zip(pass_conditions, pass_percentages):
+        pass_mask = is_pass & cond & (df['end_distance'] < threshold * df['start_distance'])
+        df.loc[pass_mask, 'progressive_pass'] = 'Yes'
+    df['xT_value'] = df.apply(lambda row: 0.6 if row['assist'] == 1 else row['xT_value'] + 0.1 if row['keyPass'] == 1 else row['xT_value'], axis=1)
+
+
+    starting_lineups = starting_lineups.drop_duplicates(subset=['player_id', 'match_id'], keep='first')
+
+    return {
+        'df': df,
+        'formation_dict': formation_dict,
+        'matchevents': matchevents,
+        'matchinfo': matchinfo,
+        'starting_lineups': starting_lineups,
+        'teamdata': teamdata,
+        'teamname': teamname,
+        'opponentname': opponentname,
+        'totalxt': totalxt,
+        'errors': errors,
+    }
+
+
+# --- CACHE ---
+
+def feed_version(data):
+    """Changes whenever the feed does: status, number of events and the latest lastModified."""
+    live = data.get('liveData', {})
+    status = live.get('matchDetails', {}).get('matchStatus', '')
+    events = live.get('event', [])
+    modified = max((e.get('lastModified') or e.get('timeStamp') or '' for e in events), default='')
+    return f"{status}:{len(events)}:{modified}"
+
+
+@shared_cache.cached('opta.match', ttl=shared_cache.DAY)
+def stored_match(matchlink, version, _data=None):
+    # _data is not part of the key; without it (finished match, evicted entry) the feed is downloaded here
+    data = _data if _data is not None else opta_feed.fetch_matchevent(matchlink)
+    return process(data, matchlink)
+
+
+@cache_budget.cached('opta.match', show_spinner=False)
+def processed_match(matchlink, version, _data=None):
+    # Process memory on top of the shared on-disk entry
+    return stored_match(matchlink, version, _data=_data)
+
+
+def is_final(matchlink):
+    with _lock:
+        return matchlink in _final
+
+
+def _current(matchlink):
+    # (version, feed): finished matches need no download, their version is remembered
+    with _lock:
+        version = _final.get(matchlink)
+    if version is not None:
+        return version, None
+    data = opta_feed.fetch_matchevent(matchlink)
+    return feed_version(data), data
+
+
+def _remember(matchlink, version):
+    if version.startswith(f"{FINAL_STATUS}:"):
+        with _lock:
+            _final[matchlink] = version
+
+
+def load(matchlink):
+    """Processed match for the page; requests / ValueError errors propagate."""
+    version, data = _current(matchlink)
+    result = processed_match(matchlink, version, _data=data)
+    _remember(matchlink, version)
+    return result
+
+
+def warm(matchlink):
+    """Processes the match into the shared on-disk cache only (no Streamlit calls); returns its feed version."""
+    version, data = _current(matchlink)
+    stored_match(matchlink, version, _data=data)
+    _remember(matchlink, version)
+    return version
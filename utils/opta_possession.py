@@ -0,0 +1,112 @@
+"""Possession segmentation for Opta match events.
+
+Works on the event table built in Match Analysis: event names in `typeId`,
+`team_name`, `outcome` as 'Successful'/'Unsuccessful', and the set-piece
+flags (`corner`, `freekick`, `throwin`, `goalkick`). Everything is done
+with run-length logic over whole columns; there are no row loops.
+"""
+
+import pandas as pd
+
+# Events that mean the team is on the ball; other rows (duels, fouls, defensive
+# actions of the opponent) inherit the possession that is already running.
+POSSESSION_TYPES = {
+    'Pass', 'Carry', 'Take on', 'Ball recovery', 'Interception', 'Ball touch', 'Good skill',
+    'Goal', 'Own Goal', 'Miss', 'Post', 'Attempt Saved', 'Chance missed',
+    'Keeper pick-up', 'Claim', 'Dispossessed', 'Offside Pass', 'Shield ball opp',
+}
+SHOT_TYPES = {'Goal', 'Miss', 'Post', 'Attempt Saved'}
+# Dead-ball events: the next sequence starts fresh even if the same team keeps the ball
+STOPPAGE_TYPES = {'Out', 'Foul', 'Card', 'Player Off', 'Player off', 'Player on', 'Offside provoked',
+                  'Start delay', 'End delay', 'Corner Awarded'}
+SET_PIECE_FLAGS = ['corner', 'freekick', 'throwin', 'goalkick']
+
+
+def segment_possessions(df, team_col='team_name', type_col='typeId'):
+    """Adds possession_id / possession_team / sequence_id and their start and end times."""
+    df = df.copy()
+    event_time = df['timeMin'] * 60 + df['timeSec']
+    on_ball = df[type_col].isin(POSSESSION_TYPES) & df[team_col].notna()
+
+    # Possession team: the team of the latest on-ball event, carried forward over the rest
+    team = df[team_col].where(on_ball).ffill().bfill()
+    period = df['periodId']
+    new_possession = (team != team.shift()) | (period != period.shift())
+    df['possession_id'] = new_possession.cumsum().astype(int)
+    df['possession_team'] = team
+
+    # Sequences: a possession is also cut by stoppages and by set pieces
+    set_piece = pd.Series(False, index=df.index)
+    for flag in SET_PIECE_FLAGS:
+        if flag in df.columns:
+            set_piece |= df[flag].fillna(0).astype(bool)
+    after_stoppage = df[type_col].isin(STOPPAGE_TYPES).shift(fill_value=False)
+    new_sequence = new_possession | set_piece | (after_stoppage & on_ball)
+    df['sequence_id'] = new_sequence.cumsum().astype(int)
+    df['sequence_set_piece'] = set_piece.groupby(df['sequence_id']).transform('first')
+
+    for key in ['possession', 'sequence']:
+        bounds = event_time.groupby(df[f'{key}_id']).agg(['min', 'max'])
+        df[f'{key}_start'] = df[f'{key}_id'].map(bounds['min'])
+        df[f'{key}_end'] = df[f'{key}_id'].map(bounds['max'])
+    return df
+
+
+def next_in_possession(df, columns, team_col='team_name'):
+    """Next on-ball event of the same team within the same possession (replaces a blind shift(-1))."""
+    own = df[df[team_col] == df['possession_team']]
+    following = own.groupby('possession_id')[columns].shift(-1)
+    return following.reindex(df.index)
+
+
+def possession_summary(df, team_col='team_name', type_col='typeId'):
+    """One row per possession: team, time span, size, how far it got and whether it ended in a shot."""
+    own = df[df[team_col] == df['possession_team']]
+    grouped = own.groupby('possession_id')
+    summary = pd.DataFrame({
+        'team': grouped['possession_team'].first(),
+        'start': grouped['possession_start'].first(),
+        'end': grouped['possession_end'].first(),
+        'events': grouped.size(),
+        'passes': (own[type_col] == 'Pass').groupby(own['possession_id']).sum(),
+        'start_x': grouped['x'].first(),
+        'max_x': grouped['x'].max(),
+        'shot': own[type_col].isin(SHOT_TYPES).groupby(own['possession_id']).any(),
+        'goal': (own[type_col] == 'Goal').groupby(own['possession_id']).any(),
+    })
+    return summary
+
+
+def possession_chains(df, shot_value=None, team_col='team_name', type_col='typeId', player_col='playerName'):
+    """xG-Chain-style credit per player.
+
+    Every player who touched the ball in a possession that ended in a shot gets the
+    possession's value (Chain); shooters and key passers of that possession are left out of
+    Buildup. `shot_value` is a per-event Series (e.g. the shot values used by Player Impact);
+    without it every shot counts 1.
+    """
+    own = df[(df[team_col] == df['possession_team']) & df[player_col].notna()]
+    is_shot = own[type_col].isin(SHOT_TYPES)
+    value = shot_value.reindex(own.index).fillna(0) if shot_value is not None else is_shot.astype(float)
+    poss_value = value.where(is_shot, 0).groupby(own['possession_id']).sum()
+
+    finisher = is_shot
+    if 'keyPass' in own.columns:
+        finisher = finisher | (own['keyPass'].fillna(0) == 1)
+    if 'assist' in own.columns:
+        finisher = finisher | (own['assist'].fillna(0) == 1)
+
+    per_poss = pd.DataFrame({
+        'possession_id': own['possession_id'],
+        'player': own[player_col],
+        'team': own[team_col],
+        'finisher': finisher,
+    }).groupby(['possession_id', 'player', 'team'], sort=False)['finisher'].any().reset_index()
+    per_poss['value'] = per_poss['possession_id'].map(poss_value).fillna(0)
+    per_poss = per_poss[per_poss['value'] > 0]
+    per_poss['buildup'] = per_poss['value'].where(~per_poss['finisher'], 0)
+
+    chains = per_poss.groupby(['player', 'team']).agg(
+        **{'Shot Chain': ('value', 'sum'), 'Shot Buildup': ('buildup', 'sum'), 'Possessions': ('possession_id', 'nunique')}
+    )
+    return chains.sort_values('Shot Chain', ascending=False).reset_index()
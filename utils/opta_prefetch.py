@@ -0,0 +1,217 @@
+"""Background prefetch of recent Opta matches into the processed-match cache.
+
+The Match Analysis schedule only lists the last 14 days, so those are the
+matches people open, and each first click used to pay for the download and the
+whole of opta_match.process(). A single daemon thread per process walks the
+schedule of the configured competitions and runs every recent match through
+opta_match.warm(), which stores the processed match in the shared on-disk
+cache; the page's first click reads it from there. It repeats every
+PREFETCH_INTERVAL_MIN minutes: live matches get reprocessed at their new feed
+version, finished ones are skipped.
+
+The worker thread has no Streamlit ScriptRunContext, so nothing it calls may
+go through st.cache_data / st.cache_resource or other st.* APIs (they log a
+"missing ScriptRunContext" warning on every call). It only uses plain code:
+opta_feed, opta_match.warm / process, shared_cache, lazy.table (a process
+cache) and jobs.active. The prefetcher therefore needs the shared cache and
+does not start with SHARED_CACHE=off.
+
+The worker is deliberately low priority: the thread is reniced (Linux), it
+works through matches one at a time with a pause in between, and it waits while
+season jobs (utils/jobs.py) are running.
+
+Configuration (environment):
+    PREFETCH_COMPETITIONS  comma-separated names from the 'Competition' column of
+                           league_dict.xlsx; the latest season of each is used.
+                           Empty (default) disables the prefetcher.
+    PREFETCH_DAYS          how far back to look, days (default 14, as the page)
+    PREFETCH_INTERVAL_MIN  minutes between refresh rounds (default 30)
+    PREFETCH_PAUSE_S       pause after each downloaded match, seconds (default 2)
+    PREFETCH_NICE          niceness added to the worker thread (default 10)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import requests
+import streamlit as st
+
+from utils import jobs, lazy, opta_feed, opta_match, shared_cache
+
+COMPETITIONS = [name.strip() for name in os.environ.get("PREFETCH_COMPETITIONS", "").split(",") if name.strip()]
+DAYS = int(os.environ.get("PREFETCH_DAYS", 14))
+INTERVAL = float(os.environ.get("PREFETCH_INTERVAL_MIN", 30)) * 60
+PAUSE = float(os.environ.get("PREFETCH_PAUSE_S", 2))
+NICE = int(os.environ.get("PREFETCH_NICE", 10))
+BUSY_WAIT = 5 # seconds between checks while season jobs are running
+
+_lock = threading.Lock()
+_thread = None
+_status = {
+    'state': 'off',
+    'rounds': 0,
+    'matches': 0,      # matches seen in the last round
+    'processed': 0,    # downloaded and stored (or restored at a new feed version)
+    'final': 0,        # finished matches already stored, skipped
+    'errors': 0,
+    'current': None,
+    'last_error': None,
+    'last_round': None,
+    'next_round': None,
+}
+
+
+def _set(**fields):
+    with _lock:
+        _status.update(fields)
+
+
+def _add(field, n=1):
+    with _lock:
+        _status[field] += n
+
+
+# --- SCHEDULE ---
+
+def competitions():
+    """(competition, season, seasonid) for every configured competition, latest season each."""
+    league_dict = lazy.table("league_dict.xlsx").copy()
+    league_dict['Season'] = league_dict['Season'].astype(str)
+    league_dict['Competition'] = league_dict['Competition'].astype(str)
+    selected = []
+    for name in COMPETITIONS:
+        rows = league_dict[league_dict['Competition'] == name].dropna(subset=['seasonid'])
+        if rows.empty:
+            continue
+        row = rows.sort_values('Season').iloc[-1]
+        selected.append((name, row['Season'], row['seasonid']))
+    return selected
+
+
+def recent_matches(tmcl, days=DAYS):
+    """Match ids of one competition played in the last `days` days, newest first."""
+    found = []
+    page = 1
+    while True:
+        matches = opta_feed.fetch_schedule_page(tmcl, page).get('match', [])
+        if not matches:
+            break
+        if not isinstance(matches, list):
+            matches = [matches]
+        for match in matches:
+            match_info = match.get('matchInfo', {})
+            if match_info.get('id'):
+                found.append({'id': match_info['id'], 'date': match_info.get('date')})
+        page += 1
+
+    schedule_df = pd.DataFrame(found, columns=['id', 'date'])
+    schedule_df['date'] = pd.to_datetime(schedule_df['date'].str.replace('Z', '', regex=False), errors='coerce')
+    today = pd.to_datetime(datetime.today().date())
+    schedule_df = schedule_df[(schedule_df['date'] >= today - pd.Timedelta(days=days)) & (schedule_df['date'] <= today)]
+    return schedule_df.sort_values('date', ascending=False)['id'].tolist()
+
+
+# --- WORKER ---
+
+def _lower_priority():
+    # Renice only this thread: on Linux PRIO_PROCESS with a thread id applies to that thread
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _wait_idle():
+    while jobs.active():
+        _set(state='waiting for season jobs')
+        time.sleep(BUSY_WAIT)
+
+
+def run_once():
+    """One refresh round over all configured competitions."""
+    seen = processed = final = 0
+    for name, season, tmcl in competitions():
+        try:
+            matchlinks = recent_matches(tmcl)
+        except (requests.RequestException, ValueError) as error:
+            _add('errors')
+            _set(last_error=f"{name} {season} schedule: {error}")
+            continue
+        for matchlink in matchlinks:
+            _wait_idle()
+            _set(state='running', current=f"{name} {season}: {matchlink}")
+            seen += 1
+            if opta_match.is_final(matchlink):
+                final += 1
+                continue
+            try:
+                opta_match.warm(matchlink)
+                processed += 1
+            except Exception as error:
+                # A feed that is not ready yet (match not started) must not stop the round
+                _add('errors')
+                _set(last_error=f"{matchlink}: {error}")
+            time.sleep(PAUSE)
+    with _lock:
+        _status.update(matches=seen, current=None, last_round=time.time())
+        _status['processed'] += processed
+        _status['final'] += final
+        _status['rounds'] += 1
+
+
+def _loop():
+    _lower_priority()
+    while True:
+        try:
+            run_once()
+        except Exception as error:
+            _add('errors')
+            _set(last_error=str(error), current=None)
+        _set(state='idle', next_round=time.time() + INTERVAL)
+        time.sleep(INTERVAL)
+
+
+def start():
+    """Starts the worker once per process; no-op without PREFETCH_COMPETITIONS or with SHARED_CACHE=off."""
+    global _thread
+    if not COMPETITIONS or shared_cache.BACKEND == 'off':
+        return False
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name='opta-prefetch', daemon=True)
+            _status['state'] = 'starting'
+            _thread.start()
+    return True
+
+
+def status():
+    with _lock:
+        return dict(_status, competitions=list(COMPETITIONS))
+
+
+# --- REPORT ---
+
+def report(container=None):
+    container = container or st.sidebar.expander("Match prefetch")
+    info = status()
+    if not info['competitions']:
+        container.caption("Prefetch is off (set PREFETCH_COMPETITIONS)")
+        return
+    if shared_cache.BACKEND == 'off':
+        container.caption("Prefetch is off: it stores matches in the shared cache (SHARED_CACHE=off)")
+        return
+    container.caption(f"{', '.join(info['competitions'])}: last {DAYS} days, every {INTERVAL / 60:.0f} min")
+    container.caption(f"State: {info['state']}" + (f" - {info['current']}" if info['current'] else ""))
+    c1, c2, c3, c4 = container.columns(4)
+    c1.metric("Rounds", info['rounds'])
+    c2.metric("Processed", info['processed'])
+    c3.metric("Finished, skipped", info['final'])
+    c4.metric("Errors", info['errors'])
+    if info['last_round']:
+        ago = time.time() - info['last_round']
+        container.caption(f"Last round {ago / 60:.0f} min ago, {info['matches']} matches")
+    if info['last_error']:
+        container.caption(f"Last error: {info['last_error']}")
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import shared_cache
+from utils.utils.season_engine import PER_90_STATS, POSITION_GROUPS, load_season_per_90
+
+# --- ПЕРЦЕНТИЛИ ПО ЛИГЕ ---
+# Для каждого порога минут заранее считается таблица: игрок -> перцентиль каждого показателя
+# среди игроков той же группы позиций. Смена игрока или фильтра - это поиск строки по индексу.
+MINUTE_THRESHOLDS = [0, 450, 900, 1350, 1800]
+PERCENTILE_STATS = [f"{s} p90" for s in PER_90_STATS]
+
+
+def primary_position(matrix):
+    # Основная группа позиций - где у игрока больше всего действий за сезон
+    pos_cols = [f"pos_{g}" for g in POSITION_GROUPS]
+    if not set(pos_cols) <= set(matrix.columns):
+        return pd.Series('', index=matrix.index)
+    counts = matrix[pos_cols].to_numpy(float)
+    group = np.array(POSITION_GROUPS)[counts.argmax(axis=1)]
+    return pd.Series(np.where(counts.sum(axis=1) > 0, group, ''), index=matrix.index)
+
+
+def percentile_table(matrix, min_minutes=0, stats=PERCENTILE_STATS):
+    # Один rank(pct=True) по всем показателям сразу внутри каждой группы позиций
+    table = matrix.loc[matrix['Minutes'] >= min_minutes, ['Minutes'] + stats].copy()
+    table.insert(0, 'Position', primary_position(matrix).reindex(table.index))
+    pct = table.groupby('Position')[stats].rank(pct=True, method='average') * 100
+    table[[f"{s} pct" for s in stats]] = pct.round(0).to_numpy()
+    return table
+
+
+def build_percentile_tables(matrix, thresholds=MINUTE_THRESHOLDS, stats=PERCENTILE_STATS):
+    return {t: percentile_table(matrix, t, stats) for t in thresholds}
+
+
+@st.cache_data(ttl=3600)
+@shared_cache.cached('percentile_tables', ttl=3600)
+def load_percentile_tables(competition_id, season_id):
+    matrix = load_season_per_90(competition_id, season_id, team_name=None)
+    if matrix.empty:
+        return {}
+    return build_percentile_tables(matrix)
+
+
+def percentile_row(tables, player_name, min_minutes=0, team=None):
+    # Строка игрока из готовой таблицы (порог округляется вниз до ближайшего посчитанного)
+    available = [t for t in tables if t <= min_minutes]
+    if not available:
+        return None
+    table = tables[max(available)]
+    if player_name not in table.index.get_level_values('player'):
+        return None
+    rows = table.loc[player_name]
+    if team is not None and team in rows.index:
+        return rows.loc[team]
+    return rows.iloc[0]
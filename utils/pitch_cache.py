@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+# --- ГОТОВЫЕ ФОНЫ ПОЛЯ ---
+# pitch.draw() в каждом графике заново строит линии, дуги и прямоугольники разметки,
+# и больше всего времени уходит на add_patch (пересчёт границ осей по кривым Безье
+# для каждой дуги). Здесь разметка строится один раз на каждую комбинацию
+# (тема, ориентация, половина / всё поле) и хранится готовой геометрией в координатах
+# данных. На новые оси она кладётся одной коллекцией на слой (zorder), без пересчёта границ.
+# От размера фигуры геометрия не зависит, поэтому размер в ключ не входит.
+# События рисуются поверх как обычно, методами того же объекта Pitch / VerticalPitch.
+
+# Всё, что меняет внешний вид разметки - часть ключа кеша
+STYLE_ATTRS = ['pitch_type', 'half', 'pitch_color', 'line_color', 'line_alpha', 'linewidth', 'linestyle',
+               'line_zorder', 'pad_left', 'pad_right', 'pad_bottom', 'pad_top', 'stripe', 'stripe_color',
+               'goal_type', 'goal_alpha', 'corner_arcs', 'positional', 'shade_middle', 'spot_scale',
+               'axis', 'label', 'tick']
+MAX_BACKGROUNDS = 32
+
+
+def style_key(pitch):
+    return (type(pitch).__name__,) + tuple(repr(getattr(pitch, attr, None)) for attr in STYLE_ATTRS)
+
+
+class _Style:
+    # Ключ для lru_cache: два объекта Pitch с одинаковым стилем дают один фон
+    def __init__(self, pitch):
+        self.pitch = pitch
+        self.key = style_key(pitch)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, _Style) and self.key == other.key
+
+
+def _geometry(artist):
+    # Путь в координатах данных и стиль одной линии / патча разметки
+    if isinstance(artist, Line2D):
+        path = artist.get_path().transformed(artist.get_transform() - artist.axes.transData)
+        return path, 'none', to_rgba(artist.get_color(), artist.get_alpha()), artist.get_linewidth(), artist.get_linestyle()
+    path = artist.get_path().transformed(artist.get_patch_transform())
+    face = artist.get_facecolor() if artist.get_fill() else 'none'
+    return path, face, artist.get_edgecolor(), artist.get_linewidth(), artist.get_linestyle()
+
+
+@lru_cache(maxsize=MAX_BACKGROUNDS)
+def _background(style):
+    # Разметка рисуется один раз на невидимой фигуре, геометрия собирается по слоям
+    fig = Figure()
+    ax = fig.add_subplot()
+    style.pitch.draw(ax=ax)
+
+    # Полосы, картинки и подписи осей коллекцией не повторить - такие поля рисуются как раньше
+    if ax.images or ax.collections or ax.texts or ax.axison:
+        return None
+
+    layers = {}
+    for artist in ax.lines + ax.patches:
+        if not artist.get_visible():
+            continue
+        layer = layers.setdefault(artist.get_zorder(), ([], [], [], [], []))
+        for column, value in zip(layer, _geometry(artist)):
+            column.append(value)
+    return {
+        'layers': layers,
+        'xlim': ax.get_xlim(),
+        'ylim': ax.get_ylim(),
+        'aspect': ax.get_aspect(),
+        'facecolor': ax.get_facecolor(),
+    }
+
+
+def draw(pitch, ax=None, figsize=None, tight_layout=True, constrained_layout=False, **_):
+    """Как pitch.draw(): с ax рисует на нём, без ax создаёт фигуру и возвращает (fig, ax)."""
+    created = ax is None
+    if created:
+        fig, ax = plt.subplots(figsize=figsize, constrained_layout=constrained_layout)
+        # как в mplsoccer: без tight_layout движок компоновки выключается совсем
+        fig.set_layout_engine('tight' if tight_layout else 'none')
+
+    background = _background(_Style(pitch))
+    if background is None:
+        pitch.draw(ax=ax)
+        return (ax.figure, ax) if created else None
+
+    for zorder, (paths, faces, edges, widths, styles) in background['layers'].items():
+        ax.add_collection(PathCollection(paths, facecolors=faces, edgecolors=edges, linewidths=widths,
+                                         linestyles=styles, transform=ax.transData, zorder=zorder),
+                          autolim=False)
+    ax.set_facecolor(background['facecolor'])
+    ax.set_xlim(background['xlim'])
+    ax.set_ylim(background['ylim'])
+    ax.set_aspect(background['aspect'])
+    ax.axis('off')
+    return (ax.figure, ax) if created else None
+
+
+def cache_info():
+    return _background.cache_info()
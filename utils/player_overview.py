@@ -0,0 +1,295 @@
+"""The Player Overview graphic (passes & carries, touch map, event map) for one or all players of a match.
+
+`match_bundle` collects everything the graphic needs from the processed match
+once: the slim event table, Player Impact, each team's opponent and badge, the
+league colours. Players are identified by their player_key (utils/opta_keys.py);
+names are only used for titles and file names, so two players with the same
+name get two graphics. `draw` renders one player into a figure from that
+bundle. The page uses it for the selected player. `export_zip` renders every
+player in a process pool and streams the PNGs into one zip archive.
+"""
+
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.error import URLError
+from urllib.request import urlopen
+
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+from matplotlib.font_manager import FontProperties
+from matplotlib.lines import Line2D
+from mplsoccer import VerticalPitch, add_image
+from PIL import Image
+
+from utils import pitch_cache, render
+
+EVENT_COLUMNS = ['player_key', 'typeId', 'outcome', 'x', 'y', 'end_x', 'end_y', 'keyPass', 'assist']
+BADGE_URL = "https://omo.akamai.opta.net/image.php?h=www.scoresway.com&sport=football&entity=team&description=badges&dimensions=150&id={team_id}"
+# teams whose own badge id has no image on the badge service
+BADGE_ALIASES = {
+    "cpxv65ua10liq2k8ovsezf7ox": "1qtaiy11gswx327s0vkibf70n",
+    "7ft9s47h5gbc35sbndoswkdwl": "1qtaiy11gswx327s0vkibf70n",
+}
+BADGE_TIMEOUT = 5 # seconds; a slow badge host must not hold up the page or the export
+FIGSIZE = (24, 8.25)
+EXPORT_DPI = 150
+MAX_WORKERS = 4 # capped by the number of CPUs; with one CPU the export runs in-process
+TITLE_FONT = FontProperties(family='Tahoma', size=15)
+
+
+# --- BUNDLE ---
+
+def _badge(team_id):
+    # No badge (None) when the badge host is down, slow or returns something that is not an image
+    team_id = BADGE_ALIASES.get(team_id, team_id)
+    try:
+        with urlopen(BADGE_URL.format(team_id=team_id), timeout=BADGE_TIMEOUT) as response:
+            return np.asarray(Image.open(io.BytesIO(response.read())))
+    except (URLError, TimeoutError, OSError):
+        return None
+
+
+def match_bundle(events, lineups, impact, teamdata, colors, watermark=None):
+    """Everything the graphic needs, built once per processed match (plain data, safe to send to worker processes)."""
+    teams = {}
+    for _, team in teamdata.iterrows():
+        others = teamdata.loc[teamdata['name'] != team['name'], 'name']
+        teams[team['name']] = {
+            'opponent': others.values[0] if len(others) else '',
+            'badge': _badge(team['id']),
+        }
+    impact = impact.drop_duplicates('player_key').set_index('player_key')
+    lineups = lineups.dropna(subset=['player_name']).drop_duplicates('player_key').set_index('player_key')
+    return {
+        'events': events[[c for c in EVENT_COLUMNS if c in events.columns]].copy(),
+        'lineups': lineups['team_name'].to_dict(),
+        'names': lineups['player_name'].to_dict(),
+        'impact': {key: (row['Player Impact'], row['Match Rank']) for key, row in impact.iterrows()},
+        'teams': teams,
+        'colors': dict(colors),
+        'watermark': None if watermark is None else np.asarray(watermark),
+    }
+
+
+def players(bundle):
+    """player_key of every player in the lineups, ordered by name."""
+    return sorted(bundle['lineups'], key=lambda key: (bundle['names'][key], key))
+
+
+def player_name(bundle, player):
+    return bundle['names'].get(player, str(player))
+
+
+def player_events(bundle, player):
+    events = bundle['events']
+    return events[events['player_key'] == player]
+
+
+# --- DRAWING ---
+
+def _frames(events):
+    # Event groups of one player, as on the single-player page
+    events = events[~events['typeId'].isin(['Out', 'Player off', 'Player on'])]
+    events = events[~((events['x'] == 0) & (events['y'] == 0))]
+    typed = lambda name: events[events['typeId'] == name]
+    won = lambda frame: frame[frame['outcome'] == 'Successful']
+    lost = lambda frame: frame[frame['outcome'] != 'Successful']
+
+    passes = typed('Pass')
+    carries = typed('Carry')
+    carries = carries[(carries['end_y'] > 0) & (carries['end_x'] > 0) & (carries['x'] > 2.5) &
+                      (carries['end_y'] < 100) & (carries['end_x'] < 99.5)]
+    y_diff = carries['y'] - carries['end_y']
+    x_diff = carries['x'] - carries['end_x']
+    carries = carries[(y_diff > -25) & (y_diff < 25) & (x_diff < 25) & (x_diff > -25)]
+    carries = carries[~(((carries['x'] == 0) & (carries['end_x'] == 0)) | ((carries['y'] == 0) & (carries['end_y'] == 0)))]
+    fouls = typed('Foul')
+    return {
+        'pass_complete': passes[passes['outcome'] == 'Successful'],
+        'pass_incomplete': passes[passes['outcome'] == 'Unsuccessful'],
+        'shot_assist': passes[passes['keyPass'] == 1],
+        'goal_assist': passes[passes['assist'] == 1],
+        'carry': carries,
+        'touches': events,
+        'take_on_won': won(typed('Take On')), 'take_on_lost': lost(typed('Take On')),
+        'tackle_won': won(typed('Tackle')), 'tackle_lost': lost(typed('Tackle')),
+        'aerial_won': won(typed('Aerial')), 'aerial_lost': lost(typed('Aerial')),
+        'fouls': fouls[fouls['outcome'] == 'Unsuccessful'],
+        'ball_recovery': typed('Ball recovery'),
+        'clearance': typed('Clearance'),
+        'interception': typed('Interception'),
+        'shot_blocked': typed('Save'),
+        'dispossessed': typed('Dispossessed'),
+        'shot_off': typed('Miss'),
+        'shot_on': typed('Attempt Saved'),
+        'goal': typed('Goal'),
+    }
+
+
+def _comet(ax, frame, color, segments=20, linewidth=None):
+    # Line from the end of the action back to its start, fading out: one collection
+    # with `segments` pieces per action instead of one plot() call per piece
+    frame = frame[np.isfinite(frame[['x', 'y', 'end_x', 'end_y']].to_numpy(float)).all(axis=1)]
+    if frame.empty:
+        return
+    x_start, y_start = frame['end_y'].to_numpy(float), frame['end_x'].to_numpy(float)
+    dx = (frame['y'].to_numpy(float) - x_start) / segments
+    dy = (frame['x'].to_numpy(float) - y_start) / segments
+    steps = np.arange(segments)
+    x0 = x_start[:, None] + steps * dx[:, None]
+    y0 = y_start[:, None] + steps * dy[:, None]
+    lines = np.stack([np.stack([x0, y0], -1), np.stack([x0 + dx[:, None], y0 + dy[:, None]], -1)], axis=2)
+    colors = np.tile(to_rgba(color), (segments, 1))
+    colors[:, 3] = np.linspace(1, 0, segments)
+    ax.add_collection(LineCollection(
+        lines.reshape(-1, 2, 2), colors=np.tile(colors, (len(frame), 1)),
+        linewidths=linewidth or 1.5, capstyle='projecting', zorder=2
+    ), autolim=False)
+
+
+def draw(fig, axes, bundle, player):
+    """The three-pitch overview of `player` (a player_key) on a 1x3 grid of axes."""
+    colors = bundle['colors']
+    name = player_name(bundle, player)
+    text_color = colors['TextColor']
+    frames = _frames(player_events(bundle, player))
+    team = bundle['teams'].get(bundle['lineups'].get(player), {})
+    impact, rank = bundle['impact'].get(player, (None, None))
+
+    fig.subplots_adjust(wspace=-0.5)
+    pitch = VerticalPitch(pitch_type='opta', pitch_color=colors['PitchColor'], line_color=colors['PitchLineColor'])
+    for ax in axes:
+        pitch_cache.draw(pitch, ax=ax)
+
+    # Passes & carries
+    axes[0].set_title(f'{name} - Passes & Carries', fontproperties=TITLE_FONT, color=text_color)
+    _comet(axes[0], frames['pass_complete'], 'green')
+    _comet(axes[0], frames['pass_incomplete'], 'red')
+    _comet(axes[0], frames['shot_assist'], 'orange')
+    _comet(axes[0], frames['carry'], 'purple')
+    _comet(axes[0], frames['goal_assist'], 'blue', segments=10, linewidth=2)
+
+    # Touch map
+    axes[1].set_title(f'{name} - Touch Map', fontproperties=TITLE_FONT, color=text_color)
+    touches = frames['touches']
+    axes[1].plot(touches['y'], touches['x'], linestyle='none', marker='o', markeredgecolor=colors['HullColor'],
+                 markerfacecolor='none', markersize=5)
+
+    # Event map
+    axes[2].set_title(f'{name} - Event Map', fontproperties=TITLE_FONT, color=text_color)
+    marks = [
+        # (frame, colour, marker, legend label, size)
+        ('tackle_won', 'green', '>', 'Tackle', 40),
+        ('tackle_lost', 'red', '>', None, 40),
+        ('aerial_won', 'green', 's', 'Aerial', 40),
+        ('aerial_lost', 'red', 's', None, 40),
+        ('shot_blocked', 'green', 'p', 'Attempts Blocked', 40),
+        ('ball_recovery', 'green', 'd', 'Ball Recoveries', 40),
+        ('clearance', 'green', '^', 'Clearance', 40),
+        ('take_on_won', 'green', 'P', 'Take On', 40),
+        ('take_on_lost', 'red', 'P', None, 40),
+        ('dispossessed', 'red', 'x', 'Dispossesed', 40),
+        ('shot_off', 'red', 'o', None, 40),
+        ('shot_on', 'green', 'o', 'Shot On Target', 40),
+        ('goal', 'green', '*', 'Goal', 100),
+        ('fouls', 'red', '>', None, 40),
+    ]
+    handles = []
+    for name, color, marker, label, size in marks:
+        frame = frames[name]
+        scatter = pitch.scatter(frame.x, frame.y, ax=axes[2], facecolor=color, edgecolor=color,
+                                marker=marker, label=label, s=size)
+        if label:
+            handles.append(scatter)
+    axes[2].legend(handles=handles, loc='upper center', bbox_to_anchor=(0.5, -0.02), ncol=2,
+                   facecolor='silver', frameon=False, labelcolor=text_color)
+
+    legend_labels = ['Completed Pass', 'Incompleted Pass', 'Shot Assist', 'Assist', 'Ball Carry']
+    legend_colors = ['green', 'red', 'orange', 'blue', 'purple']
+    axes[0].legend([Line2D([0], [0], color=color, linewidth=3) for color in legend_colors], legend_labels,
+                   loc='upper center', bbox_to_anchor=(0.22, -0.02), ncol=1,
+                   facecolor=colors['BackgroundColor'], frameon=False, labelcolor=text_color)
+
+    axes[0].text(50, -5, 'Data from Opta', ha='center', fontsize=9, color=text_color)
+    axes[0].text(25, -9, 'Opponent:', ha='center', fontsize=14, color=text_color)
+    axes[0].text(25, -13, f"{team.get('opponent', '')}", ha='center', fontsize=14, color=text_color, fontweight='bold')
+    axes[0].text(25, -19, 'Player Impact Score:', ha='center', fontsize=14, color=text_color)
+    axes[0].text(25, -23, f'{impact} (#{rank})', ha='center', fontsize=14, color=text_color, fontweight='bold')
+    axes[1].text(50, -5, 'All events plotted', ha='center', fontsize=9, color=text_color)
+    axes[2].text(50, -5, 'Green shows successful action, red shows unsuccessful', ha='center', fontsize=9, color=text_color)
+
+    if team.get('badge') is not None:
+        add_image(team['badge'], fig, left=0.5375, bottom=-0.049, width=0.055, alpha=1, interpolation='hanning')
+    if bundle['watermark'] is not None:
+        add_image(bundle['watermark'], fig, left=0.4375, bottom=-0.029, width=0.055, alpha=1, interpolation='hanning')
+
+
+# --- BULK EXPORT ---
+
+_context = None # bundle without the event table, set once per worker process
+
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+
+def render_png(bundle, player, dpi=EXPORT_DPI):
+    with render.chart('player_overview_export', figsize=FIGSIZE, ncols=3,
+                      facecolor=bundle['colors']['BackgroundColor'], layout=None) as (fig, axes):
+        draw(fig, axes, bundle, player)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor=fig.get_facecolor())
+    return buffer.getvalue()
+
+
+def _render_task(player, events, dpi):
+    return player, render_png({**_context, 'events': events}, player, dpi)
+
+
+def file_names(bundle, players):
+    """Zip entry per player_key: the player's name, plus the key when two players share it."""
+    stems = {player: re.sub(r'[^\w\-]+', '_', player_name(bundle, player)).strip('_') for player in players}
+    counts = {}
+    for stem in stems.values():
+        counts[stem] = counts.get(stem, 0) + 1
+    return {player: (stem if counts[stem] == 1 else f"{stem}_{player}") + '.png' for player, stem in stems.items()}
+
+
+def _render_serial(bundle, names, dpi):
+    for name in names:
+        yield name, render_png(bundle, name, dpi)
+
+
+def _render_pool(bundle, names, dpi, workers):
+    context = {key: value for key, value in bundle.items() if key != 'events'}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(context,)) as pool:
+        tasks = [pool.submit(_render_task, name, player_events(bundle, name), dpi) for name in names]
+        for task in as_completed(tasks):
+            yield task.result()
+
+
+def export_zip(bundle, names=None, dpi=EXPORT_DPI, workers=MAX_WORKERS, progress=None):
+    """PNG of every player's overview in one zip (bytes). `progress(done, total, name)` is called as files arrive.
+
+    The shared part of the bundle goes to each worker once; every task carries
+    only that player's events. Workers start with 'spawn' so the pool does
+    not fork the threads of the running server.
+    """
+    names = players(bundle) if names is None else list(names)
+    entries = file_names(bundle, names)
+    workers = max(1, min(workers, os.cpu_count() or 1, len(names)))
+    rendered = _render_serial(bundle, names, dpi) if workers == 1 else _render_pool(bundle, names, dpi, workers)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for done, (player, png) in enumerate(rendered, start=1):
+            zf.writestr(entries[player], png)
+            if progress is not None:
+                progress(done, len(names), player_name(bundle, player))
+    return archive.getvalue()
@@ -0,0 +1,163 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# --- ПУЛ ФИГУР ---
+# Каждый график получает фигуру из пула по ключу (имя графика, размер, сетка осей).
+# Фигуры создаются без pyplot: они не попадают в глобальный реестр plt, поэтому
+# фигура, которую забыли вернуть, просто соберётся сборщиком мусора, а не будет
+# висеть в памяти процесса до plt.close(). После st.pyplot фигура возвращается
+# в пул: снимаются только слои художников (линии, точки, тексты, картинки,
+# добавленные оси), а сама фигура, оси и Agg-canvas с рендерером остаются
+# для следующего перезапуска страницы.
+MAX_IDLE = 16 # столько свободных фигур держим всего; самые давние выбрасываются
+SLOW_CHART_MS = 1000
+
+_lock = threading.Lock()
+_idle = OrderedDict() # key -> [slot, ...]
+_in_use = weakref.WeakSet()
+_timings = {} # имя графика -> список времени отрисовки, мс
+MAX_TIMINGS = 50
+
+
+class _Slot:
+    # Фигура пула и исходное состояние её осей, к которому она возвращается при очистке
+    def __init__(self, key, figsize, nrows, ncols, facecolor, layout, subplot_kw):
+        self.key = key
+        self.figure = Figure(figsize=figsize, facecolor=facecolor, layout=layout)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(nrows, ncols, squeeze=False, subplot_kw=subplot_kw)
+        self.facecolor = self.figure.get_facecolor()
+        self.subplotpars = vars(self.figure.subplotpars).copy()
+        self.state = [(ax, ax.get_position(original=True), ax.get_facecolor(), ax.get_xlim(), ax.get_ylim())
+                      for ax in self.axes.flat]
+
+    def handles(self):
+        axes = self.axes
+        if axes.size == 1:
+            return self.figure, axes[0, 0]
+        return self.figure, axes.squeeze() if 1 in axes.shape else axes
+
+    def clear(self):
+        fig = self.figure
+        own_axes = {ax for ax, *_ in self.state}
+        # оси, добавленные графиком (add_image, twinx, колорбары), удаляются целиком
+        for ax in list(fig.axes):
+            if ax not in own_axes:
+                ax.remove()
+        for artist in [*fig.texts, *fig.legends, *fig.images, *fig.patches, *fig.lines, *fig.artists]:
+            artist.remove()
+        if fig._suptitle is not None:
+            fig._suptitle.set_text('')
+        fig.set_facecolor(self.facecolor)
+        fig.subplots_adjust(**self.subplotpars)
+
+        for ax, position, facecolor, xlim, ylim in self.state:
+            if ax.xaxis.have_units() or ax.yaxis.have_units():
+                # категории / даты запоминаются в оси - такие оси сбрасываются полностью
+                ax.cla()
+            else:
+                for artist in [*ax.lines, *ax.patches, *ax.collections, *ax.images,
+                               *ax.texts, *ax.artists, *ax.tables]:
+                    artist.remove()
+                if ax.legend_ is not None:
+                    ax.legend_.remove()
+                ax.containers.clear()
+                for loc in ('left', 'center', 'right'):
+                    ax.set_title('', loc=loc)
+                ax.set_xlabel('')
+                ax.set_ylabel('')
+                ax.grid(False)
+                ax.set_aspect('auto')
+                ax.set_xlim(xlim)
+                ax.set_ylim(ylim)
+                ax.autoscale(True)
+            ax.set_axis_on()
+            ax.set_facecolor(facecolor)
+            ax.set_position(position)
+
+
+def _acquire(key, *args):
+    with _lock:
+        free = _idle.get(key)
+        slot = free.pop() if free else None
+        if free is not None and not free:
+            del _idle[key]
+    if slot is None:
+        slot = _Slot(key, *args)
+    _in_use.add(slot)
+    return slot
+
+
+def _release(slot):
+    _in_use.discard(slot)
+    slot.clear()
+    with _lock:
+        _idle.setdefault(slot.key, []).append(slot)
+        _idle.move_to_end(slot.key)
+        while sum(len(free) for free in _idle.values()) > MAX_IDLE:
+            oldest = next(iter(_idle))
+            _idle[oldest].pop(0)
+            if not _idle[oldest]:
+                del _idle[oldest]
+
+
+def _record(name, seconds):
+    with _lock:
+        times = _timings.setdefault(name, [])
+        times.append(seconds * 1000)
+        del times[:-MAX_TIMINGS]
+
+
+@contextmanager
+def chart(name, figsize=None, nrows=1, ncols=1, facecolor=None, layout='tight', **subplot_kw):
+    """Фигура из пула на время блока: with chart(...) as (fig, ax). По выходу (в том числе по ошибке)
+    фигура очищается и возвращается в пул, время блока записывается под именем графика."""
+    figsize = tuple(figsize or plt.rcParams['figure.figsize'])
+    key = (name, figsize, nrows, ncols, facecolor, layout, tuple(sorted(subplot_kw.items())))
+    slot = _acquire(key, figsize, nrows, ncols, facecolor, layout, subplot_kw)
+    started = time.perf_counter()
+    try:
+        yield slot.handles()
+    finally:
+        _record(name, time.perf_counter() - started)
+        _release(slot)
+
+
+# --- ОТЧЁТ ---
+
+def live_figures():
+    """Сколько фигур живёт в процессе: в реестре pyplot, выдано из пула и свободно в пуле."""
+    with _lock:
+        idle = sum(len(free) for free in _idle.values())
+    return {'pyplot': len(plt.get_fignums()), 'in_use': len(_in_use), 'idle': idle}
+
+
+def timings():
+    """Время отрисовки по графикам, мс: число отрисовок, последнее, медиана, максимум."""
+    with _lock:
+        rows = [(name, len(t), t[-1], float(np.median(t)), max(t)) for name, t in _timings.items() if t]
+    frame = pd.DataFrame(rows, columns=['chart', 'renders', 'last_ms', 'median_ms', 'max_ms'])
+    return frame.sort_values('last_ms', ascending=False, ignore_index=True)
+
+
+def report(container=None):
+    # Небольшая панель в сайдбаре: живые фигуры и самые медленные графики
+    container = container or st.sidebar.expander("Рендер графиков")
+    counts = live_figures()
+    container.caption(f"Фигуры: pyplot {counts['pyplot']}, в работе {counts['in_use']}, в пуле {counts['idle']}")
+    frame = timings()
+    if not frame.empty:
+        container.dataframe(frame.round(1), hide_index=True, use_container_width=True)
+        slow = frame[frame['last_ms'] > SLOW_CHART_MS]
+        if not slow.empty:
+            container.caption("Медленные: " + ", ".join(slow['chart']))
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# --- ИНДЕКСЫ ПО ТАБЛИЦЕ СОБЫТИЙ ---
+# События сортируются один раз по (player, match_id). После этого все события игрока
+# (и игрока в конкретном матче) лежат подряд, и выборка - это срез iloc[start:stop]
+# без маски по сотням тысяч строк. Для команды, матча и типа события храним
+# готовые номера строк.
+
+
+def _ranges(*keys):
+    # keys отсортированы: {значение (или кортеж значений): (start, stop)} по границам смены значения
+    keys = [np.asarray(k) for k in keys]
+    n = len(keys[0])
+    if n == 0:
+        return {}
+    changed = np.zeros(n - 1, dtype=bool)
+    for k in keys:
+        changed |= k[1:] != k[:-1]
+    change = np.flatnonzero(changed) + 1
+    starts = np.r_[0, change]
+    stops = np.r_[change, n]
+    labels = keys[0][starts] if len(keys) == 1 else list(zip(*(k[starts] for k in keys)))
+    return {k: (int(a), int(b)) for k, a, b in zip(labels, starts, stops)}
+
+
+def build_index(events):
+    # Строки без игрока (начало тайма, смена тактики) уходят в конец
+    # Сортировка устойчивая: внутри матча игрока события остаются в хронологическом порядке.
+    # Исходные метки индекса сохраняются, чтобы срезы можно было сопоставлять с исходной таблицей
+    order = np.arange(len(events))
+    events = events.assign(_order=order).sort_values(['player', 'match_id'], kind='mergesort', na_position='last')
+    original_order = events.pop('_order').to_numpy()
+
+    has_player = events['player'].notna().to_numpy()
+    players = events['player'].to_numpy()[has_player]
+    match_ids = events['match_id'].to_numpy()[has_player]
+
+    def positions(col):
+        if col not in events.columns:
+            return {}
+        # Номера строк в хронологическом (исходном) порядке
+        return {k: v[np.argsort(original_order[v], kind='stable')]
+                for k, v in events.groupby(col, observed=True, sort=False).indices.items()}
+
+    return {
+        'events': events,
+        'player': _ranges(players),
+        'player_match': _ranges(players, match_ids),
+        'team': positions('team'),
+        'match': positions('match_id'),
+        'type': positions('type'),
+    }
+
+
+def player_events(index, player_name, match_id=None):
+    # Срез-представление: O(1) поиск границ, без копирования
+    if match_id is None:
+        start, stop = index['player'].get(player_name, (0, 0))
+    else:
+        start, stop = index['player_match'].get((player_name, match_id), (0, 0))
+    return index['events'].iloc[start:stop]
+
+
+def rows_by(index, kind, value):
+    # Команда / матч / тип события: выборка по готовым номерам строк
+    rows = index[kind].get(value)
+    if rows is None:
+        return index['events'].iloc[0:0]
+    return index['events'].iloc[rows]
+
+
+def players(index):
+    return sorted(index['player'])
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+
+# --- ХРАНИЛИЩЕ СЕЗОННЫХ ТАБЛИЦ ---
+# Готовые таблицы сезона (xT по игрокам, xG Chain по матчам) лежат на диске рядом с приложением.
+# Их пишут фоновые задачи страниц xT и Deep Stats, читают эти страницы и поиск похожих игроков.
+STORE_DIR = os.environ.get(
+    "SEASON_STORE_DIR",
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+)
+
+TABLES = {
+    'xt_totals': "xt_totals_comp_{competition_id}_season_{season_id}.csv",
+    # Старый формат страницы xT: все события сезона, сворачиваются при чтении
+    'xt_events': "xt_stats_comp_{competition_id}_season_{season_id}.csv",
+    'deep_stats': "deep_stats_comp_{competition_id}_season_{season_id}_by_match.csv",
+    # Какие матчи Deep Stats уже обработал (и матчи без цепочек, и не скачавшиеся) - match_id, status, checked
+    'deep_stats_done': "deep_stats_comp_{competition_id}_season_{season_id}_done.csv",
+}
+
+
+def table_path(table, competition_id, season_id):
+    return os.path.join(STORE_DIR, TABLES[table].format(competition_id=competition_id, season_id=season_id))
+
+
+def has_table(table, competition_id, season_id):
+    return os.path.exists(table_path(table, competition_id, season_id))
+
+
+def read_table(table, competition_id, season_id, **kwargs):
+    # None, если таблицы ещё нет
+    path = table_path(table, competition_id, season_id)
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, **kwargs)
+
+
+def write_table(table, competition_id, season_id, frame, index=True):
+    path = table_path(table, competition_id, season_id)
+    # Как в event_store: временный файл и атомарная подмена, читатели не увидят половину таблицы
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    frame.to_csv(tmp_path, index=index)
+    os.replace(tmp_path, path)
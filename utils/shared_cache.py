@@ -0,0 +1,284 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+
+# --- ОБЩИЙ КЭШ ДЛЯ НЕСКОЛЬКИХ ПРОЦЕССОВ ---
+# st.cache_data живёт в памяти одного процесса: несколько копий приложения на одном
+# сервере каждая скачивают и считают одно и то же. Загрузчики, обёрнутые cached(),
+# сначала смотрят в общий кэш на диске, и только при промахе считают сами и кладут
+# результат туда. st.cache_data остаётся сверху как быстрый слой в памяти процесса.
+#
+# Хранилище выбирается переменной SHARED_CACHE:
+#   disk   - по файлу на запись (по умолчанию; подходит и для больших таблиц сезона)
+#   sqlite - одна встроенная база key-value
+#   off    - выключить, загрузчики считают как раньше
+# Общий лимит размера SHARED_CACHE_MAX_MB; при превышении удаляются записи,
+# которые дольше всех не читали (LRU). Слишком большие записи (больше четверти
+# лимита) не сохраняются, чтобы одна запись не вытесняла весь кэш.
+CACHE_DIR = os.environ.get(
+    "SHARED_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache"),
+)
+BACKEND = os.environ.get("SHARED_CACHE", "disk")
+MAX_BYTES = int(float(os.environ.get("SHARED_CACHE_MAX_MB", 2048)) * 1024 * 1024)
+MAX_ENTRY_BYTES = MAX_BYTES // 4
+DAY = 24 * 3600 # срок для списков турниров и матчей
+EVICT_TO = 0.9 # после вытеснения кэш занимает не больше 90% лимита
+
+# Аргументы, которые не входят в ключ: колбэк прогресса у сборщиков сезона и,
+# как в st.cache_data, всё, что начинается с '_' (уже скачанный фид матча и т.п.)
+IGNORED_KWARGS = {'on_progress'}
+
+_lock = threading.Lock()
+_stats = {} # имя загрузчика -> счётчики этого процесса
+
+
+def _counters(name):
+    return _stats.setdefault(name, {'hits': 0, 'misses': 0, 'stores': 0, 'too_big': 0, 'errors': 0})
+
+
+def _count(name, field):
+    with _lock:
+        _counters(name)[field] += 1
+
+
+# --- ХРАНИЛИЩА ---
+# get(key) -> (найдено, значение); put(key, blob, expires) -> сколько записей вытеснено;
+# usage() -> (записей, байт); clear()
+
+class DiskBackend:
+    # Файл на запись: <ключ>.pkl. Время последнего чтения - mtime файла (os.utime при попадании)
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, blob = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        if expires is not None and expires < time.time():
+            self._remove(path)
+            return False, None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass # другой процесс как раз вытеснил запись - значение уже прочитано
+        return True, blob
+
+    def put(self, key, blob, expires):
+        path = self._path(key)
+        # Временный файл и атомарная подмена: другие процессы не увидят половину записи
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((expires, blob), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        return evicted
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def usage(self):
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+
+class SqliteBackend:
+    # Одна база: таблица entries(key, value, size, expires, used). WAL - читатели не ждут писателя
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                       "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, used REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries(used)")
+
+    def _db(self):
+        # Соединение на поток: sqlite3 не разрешает делить его между потоками
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def get(self, key):
+        now = time.time()
+        with self._db() as db:
+            row = db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if row[1] is not None and row[1] < now:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return False, None
+            db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        return True, row[0]
+
+    def put(self, key, blob, expires):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                       (key, blob, len(blob), expires, time.time()))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            doomed = []
+            for old_key, size in db.execute("SELECT key, size FROM entries ORDER BY used"):
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                doomed.append((old_key,))
+                total -= size
+            db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        return len(doomed)
+
+    def usage(self):
+        with self._db() as db:
+            return db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def clear(self):
+        with self._db() as db:
+            db.execute("DELETE FROM entries")
+
+
+def _make_backend():
+    if BACKEND == 'off':
+        return None
+    if BACKEND == 'sqlite':
+        return SqliteBackend(os.path.join(CACHE_DIR, "cache.sqlite"), MAX_BYTES)
+    return DiskBackend(CACHE_DIR, MAX_BYTES)
+
+
+_backend = _make_backend()
+_evictions = 0
+
+
+# --- ЗАГРУЗЧИКИ ---
+
+def cache_key(name, args, kwargs):
+    kwargs = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS and not k.startswith('_')}
+    raw = pickle.dumps((name, args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    return f"{name}-{hashlib.sha1(raw).hexdigest()}"
+
+
+def cached(name, ttl=None):
+    """Декоратор: результат fn общий для всех процессов на сервере. ttl - в секундах, None - без срока."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            global _evictions
+            if _backend is None:
+                return fn(*args, **kwargs)
+            key = cache_key(name, args, kwargs)
+            try:
+                found, blob = _backend.get(key)
+                if found:
+                    value = pickle.loads(blob)
+                    _count(name, 'hits')
+                    return value
+            except Exception:
+                # Битая запись или занятая база - считаем промахом, загрузчик не должен падать из-за кэша
+                _count(name, 'errors')
+            _count(name, 'misses')
+
+            value = fn(*args, **kwargs)
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(blob) > MAX_ENTRY_BYTES:
+                _count(name, 'too_big')
+                return value
+            try:
+                evicted = _backend.put(key, blob, time.time() + ttl if ttl else None)
+            except Exception:
+                _count(name, 'errors')
+                return value
+            with _lock:
+                _counters(name)['stores'] += 1
+                _evictions += evicted
+            return value
+        return wrapper
+    return decorator
+
+
+# --- ОТЧЁТ ---
+
+def stats():
+    """Попадания / промахи по загрузчикам в этом процессе."""
+    with _lock:
+        rows = [(name, c['hits'], c['misses'], c['stores'], c['too_big'], c['errors']) for name, c in _stats.items()]
+    frame = pd.DataFrame(rows, columns=['loader', 'hits', 'misses', 'stores', 'too_big', 'errors'])
+    calls = frame['hits'] + frame['misses']
+    frame['hit_rate'] = (frame['hits'] / calls.where(calls > 0)).fillna(0.0)
+    return frame.sort_values('loader', ignore_index=True)
+
+
+def usage():
+    """Общий объём кэша (все процессы): записей, байт, лимит, вытеснено этим процессом."""
+    if _backend is None:
+        return {'backend': 'off', 'entries': 0, 'bytes': 0, 'max_bytes': 0, 'evictions': 0}
+    entries, size = _backend.usage()
+    return {'backend': BACKEND, 'entries': entries, 'bytes': size, 'max_bytes': MAX_BYTES, 'evictions': _evictions}
+
+
+def clear():
+    if _backend is not None:
+        _backend.clear()
+
+
+def report(container=None):
+    # Панель в сайдбаре: заполненность общего кэша и попадания по загрузчикам
+    container = container or st.sidebar.expander("Общий кэш")
+    info = usage()
+    if info['backend'] == 'off':
+        container.caption("Общий кэш выключен (SHARED_CACHE=off)")
+        return
+    container.caption(f"{info['backend']}: {info['entries']} записей, "
+                      f"{info['bytes'] / 2**20:.0f} из {info['max_bytes'] / 2**20:.0f} МБ, "
+                      f"вытеснено {info['evictions']}")
+    frame = stats()
+    if not frame.empty:
+        container.dataframe(frame.round(2), hide_index=True, use_container_width=True)
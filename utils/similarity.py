@@ -0,0 +1,139 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import event_store, lazy, season_store, singleflight
+from utils.utils.season_engine import (PER_90_COLUMNS, PER_90_STATS, per_90_counts, per_90_matrix, fold_season,
+                                       load_season_per_90_with_ids, season_dtypes, season_xg_chain)
+
+cKDTree = lazy.attrs('scipy.spatial', 'cKDTree')
+
+# --- ПОИСК ПОХОЖИХ ИГРОКОВ ---
+# Профиль игрока = показатели per 90 за сезон (+ xT и xG Chain / Buildup, если они уже посчитаны
+# страницами 5 и 6). Признаки стандартизуются (z-score), по ним строится KD-дерево:
+# запрос top-k - это один поиск по дереву, а не перебор всех пар игроков.
+BASE_FEATURES = [f"{s} p90" for s in PER_90_STATS]
+MIN_MINUTES = 270 # меньше трёх полных матчей - профиль слишком шумный
+
+
+def load_extra_tables(competition_id, season_id):
+    # Таблицы, которые страницы xT и Deep Stats уже сохранили на диск (если сохранили)
+    xt = season_store.read_table('xt_totals', competition_id, season_id, index_col=['player', 'team'])
+    chain = season_store.read_table('deep_stats', competition_id, season_id)
+    if chain is not None:
+        chain = season_xg_chain(chain).set_index(['player', 'team'])
+    return xt, chain
+
+
+def build_profiles(per90, xt=None, chain=None, min_minutes=MIN_MINUTES):
+    # per90 - матрица из load_season_per_90 (индекс player, team)
+    profiles = per90[per90['Minutes'] >= min_minutes][BASE_FEATURES + ['Minutes']].copy()
+    n90 = profiles['Minutes'] / 90.0
+    if xt is not None:
+        profiles['xT p90'] = xt['Total xT'].reindex(profiles.index).fillna(0) / n90
+    if chain is not None:
+        profiles['xG Chain p90'] = chain['xG Chain'].reindex(profiles.index).fillna(0) / n90
+        profiles['xG Buildup p90'] = chain['xG Buildup'].reindex(profiles.index).fillna(0) / n90
+    return profiles
+
+
+def build_similarity_index(profiles):
+    features = [c for c in profiles.columns if c != 'Minutes']
+    values = profiles[features].to_numpy(float)
+    mean = values.mean(axis=0)
+    std = values.std(axis=0)
+    std[std == 0] = 1.0 # признак без разброса ни на что не влияет
+    z = (values - mean) / std
+
+    return {
+        'profiles': profiles,
+        'features': features,
+        'mean': mean,
+        'std': std,
+        'z': z,
+        'tree': cKDTree(z),
+        'position': {key: i for i, key in enumerate(profiles.index)},
+        'by_player': profiles.reset_index().groupby('player')['team'].agg(list).to_dict(),
+    }
+
+
+def similar_players(index, player_name, team=None, k=10):
+    # top-k ближайших профилей (евклидово расстояние в z-пространстве)
+    teams = index['by_player'].get(player_name, [])
+    if team is not None:
+        teams = [t for t in teams if t == team]
+    if not teams:
+        return pd.DataFrame()
+    pos = index['position'][(player_name, teams[0])]
+
+    k = min(k + 1, len(index['position']))
+    dist, found = index['tree'].query(index['z'][pos], k=k)
+    dist, found = np.atleast_1d(dist), np.atleast_1d(found)
+    keep = found != pos
+
+    result = index['profiles'].iloc[found[keep]].copy()
+    result.insert(0, 'Similarity', (1 / (1 + dist[keep])).round(3))
+    return result.reset_index()
+
+
+def add_matches(per90, new_events, xt=None, chain=None, min_minutes=MIN_MINUTES):
+    # Инкрементальное обновление: новые матчи сворачиваются в накопитель,
+    # пересчитываются только стандартизация и дерево (сотни игроков - миллисекунды)
+    # new_events - события новых матчей: одна таблица или список таблиц по матчам
+    if isinstance(new_events, pd.DataFrame):
+        new_events = [new_events]
+    totals = per90[[c for c in per90.columns if not c.endswith(' p90')]]
+    new_totals = fold_season(new_events, per_90_counts)
+    if not new_totals.empty:
+        totals = totals.add(new_totals, fill_value=0)
+    per90 = per_90_matrix(totals)
+    return per90, build_similarity_index(build_profiles(per90, xt, chain, min_minutes))
+
+
+# --- ИНДЕКС СЕЗОНА ---
+# Один индекс на (турнир, сезон) в процессе. Первый раз он строится из матрицы per 90 сезона,
+# дальше при появлении в сезоне новых матчей скачиваются и сворачиваются только они (add_matches).
+# Покрытые матчи - те, из которых матрица действительно посчитана (она из кэша и может быть старше
+# списка матчей страницы). Построение и досворачивание одного сезона идут через singleflight:
+# две сессии не считают его параллельно и не перезаписывают друг друга.
+MAX_INDEXES = 4 # сезонов в памяти; дольше всех не нужный вытесняется
+
+_lock = threading.Lock()
+_indexes = {} # (competition_id, season_id) -> {'per90', 'match_ids', 'index'}, порядок - по последнему обращению
+
+
+def _refresh(competition_id, season_id, match_ids):
+    key = (competition_id, season_id)
+    with _lock:
+        state = _indexes.get(key)
+
+    if state is None:
+        per90, built_ids = load_season_per_90_with_ids(competition_id, season_id, team_name=None)
+        if per90.empty:
+            return None
+        state = {'per90': per90, 'match_ids': set(built_ids), 'index': None}
+
+    new_ids = [m_id for m_id in match_ids if m_id not in state['match_ids']]
+    events = event_store.load_many(new_ids, columns=PER_90_COLUMNS, dtypes=season_dtypes(PER_90_COLUMNS)) if new_ids else {}
+    if events or state['index'] is None:
+        xt, chain = load_extra_tables(competition_id, season_id)
+        if events:
+            per90, index = add_matches(state['per90'], list(events.values()), xt, chain)
+        else:
+            per90, index = state['per90'], build_similarity_index(build_profiles(state['per90'], xt, chain))
+        # Не скачавшиеся матчи остаются непокрытыми и попадут в следующее обновление
+        state = {'per90': per90, 'match_ids': state['match_ids'] | set(events), 'index': index}
+
+    with _lock:
+        _indexes.pop(key, None)
+        _indexes[key] = state
+        while len(_indexes) > MAX_INDEXES:
+            del _indexes[next(iter(_indexes))]
+    return state['index']
+
+
+def season_index(competition_id, season_id, match_ids):
+    """Индекс похожих игроков по всему сезону; None, если данных сезона нет."""
+    return singleflight.do('similarity.index', (competition_id, season_id), _refresh,
+                           competition_id, season_id, list(match_ids))
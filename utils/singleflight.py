@@ -0,0 +1,112 @@
+import threading
+import time
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+
+# --- ОДНА ЗАГРУЗКА НА КЛЮЧ ---
+# Если несколько сессий одновременно просят один и тот же матч / сезон / фид,
+# считает только первая (ведущая), остальные ждут её и получают тот же результат
+# (или ту же ошибку). Это не кэш: как только загрузка закончилась, следующий вызов
+# снова идёт в источник. st.cache_data уже не считает один ключ дважды, поэтому
+# здесь обёрнуто то, что идёт мимо него: скачивание матчей в хранилище, sb.matches
+# в расчётах сезона, фиды performfeeds. Расчёты сезона уже объединяются по id задачи
+# в utils/jobs.py и только пишут сюда счётчики.
+# Результат общий для всех ждавших - вызывающий код не должен менять его на месте.
+
+_lock = threading.Lock()
+_calls = {} # (имя, ключ) -> _Call
+_stats = {} # имя -> счётчики
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _counters(name):
+    return _stats.setdefault(name, {'calls': 0, 'loads': 0, 'shared': 0, 'errors': 0, 'wait_s': 0.0})
+
+
+def do(name, key, fn, *args, **kwargs):
+    """fn(*args, **kwargs) не больше одного раза одновременно для (name, key)."""
+    flight = (name, key)
+    with _lock:
+        counters = _counters(name)
+        counters['calls'] += 1
+        call = _calls.get(flight)
+        leader = call is None
+        if leader:
+            call = _calls[flight] = _Call()
+            counters['loads'] += 1
+        else:
+            counters['shared'] += 1
+
+    if not leader:
+        started = time.perf_counter()
+        call.event.wait()
+        with _lock:
+            counters['wait_s'] += time.perf_counter() - started
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn(*args, **kwargs)
+        return call.result
+    except BaseException as error:
+        call.error = error
+        with _lock:
+            counters['errors'] += 1
+        raise
+    finally:
+        # Сначала снимаем ключ, потом будим ждущих: следующий запрос начнёт новую загрузку
+        with _lock:
+            del _calls[flight]
+        call.event.set()
+
+
+def record(name, shared):
+    # Только счётчики - для слоёв со своей дедупликацией (фоновые задачи utils/jobs.py)
+    with _lock:
+        counters = _counters(name)
+        counters['calls'] += 1
+        counters['shared' if shared else 'loads'] += 1
+
+
+def shared(name):
+    """Декоратор: ключ загрузки - аргументы вызова."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return do(name, (args, tuple(sorted(kwargs.items()))), fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- ОТЧЁТ ---
+
+def stats():
+    """По загрузчикам: вызовы, реальные загрузки, сэкономленные (дождались чужой), ошибки, идут сейчас."""
+    with _lock:
+        in_flight = {}
+        for name, _ in _calls:
+            in_flight[name] = in_flight.get(name, 0) + 1
+        rows = [(name, c['calls'], c['loads'], c['shared'], c['errors'], in_flight.get(name, 0), c['wait_s'])
+                for name, c in _stats.items()]
+    frame = pd.DataFrame(rows, columns=['loader', 'calls', 'loads', 'shared', 'errors', 'in_flight', 'wait_s'])
+    return frame.sort_values('shared', ascending=False, ignore_index=True)
+
+
+def report(container=None):
+    # Панель в сайдбаре: сколько загрузок удалось не делать повторно
+    container = container or st.sidebar.expander("Общие загрузки")
+    frame = stats()
+    if frame.empty:
+        container.caption("Загрузок пока не было")
+        return
+    container.caption(f"Сэкономлено загрузок: {int(frame['shared'].sum())} из {int(frame['calls'].sum())}")
+    container.dataframe(frame.round(2), hide_index=True, use_container_width=True)
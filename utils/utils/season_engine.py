@@ -1,88 +1,304 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from statsbombpy import sb
-from mplsoccer import Pitch, VerticalPitch
+from utils import event_store, season_index, jobs, shared_cache
+
+# --- ПРОЕКЦИЯ: какие колонки реально нужны страницам и calculate_per_90 ---
+# Остальные ~100 колонок (freeze frame, tactics, вложенные списки) не читаются с диска вообще.
+# Имена игроков/команд оставляем строками: groupby по категориям дал бы декартово произведение.
+SEASON_DTYPES = {
+    'match_id': 'int32',
+    'minute': 'int16',
+    'second': 'int16',
+    'period': 'int8',
+    'possession': 'int32',
+    'type': 'category',
+    'player': None,
+    'team': None,
+    'position': 'category',
+    'x': 'float32',
+    'y': 'float32',
+    'end_x': 'float32',
+    'end_y': 'float32',
+    'shot_outcome': 'category',
+    'shot_statsbomb_xg': 'float32',
+    'pass_outcome': 'category',
+    'pass_goal_assist': 'bool',
+    'pass_shot_assist': 'bool',
+    'dribble_outcome': 'category',
+    'tactics': None,
+    'substitution_replacement': None,
+    'foul_committed_card': 'category',
+    'bad_behaviour_card': 'category',
+    'opponent': 'category',
+}
+SEASON_COLUMNS = [c for c in SEASON_DTYPES if c != 'opponent'] # opponent добавляется после загрузки
+
+
+def season_dtypes(columns):
+    return {c: SEASON_DTYPES[c] for c in columns if SEASON_DTYPES.get(c) is not None}
+
 
 # --- КЭШИРОВАНИЕ ГИГАБАЙТОВ ДАННЫХ ---
-@st.cache_data(ttl=3600) # Кэш живет 1 час
-def load_season_data(competition_id, season_id, team_name="Barcelona"):
+@shared_cache.cached('season_data', ttl=3600)
+def build_season_data(competition_id, season_id, team_name="Barcelona", on_progress=None):
     # 1. Получаем список всех матчей сезона
-    matches = sb.matches(competition_id=competition_id, season_id=season_id)
+    matches = event_store.fetch_matches(competition_id, season_id)
     
     # Фильтруем матчи только нашей команды (чтобы ускорить загрузку в 2 раза)
     team_matches = matches[(matches['home_team'] == team_name) | (matches['away_team'] == team_name)]
     
     match_ids = team_matches['match_id'].tolist()
     
-    # 2. Скачиваем события ВСЕХ матчей (Это долгий процесс)
+    # 2. События ВСЕХ матчей: из общего хранилища, недостающие качаются параллельно
+    events_by_match = event_store.load_many(
+        match_ids,
+        on_progress=on_progress,
+        columns=SEASON_COLUMNS,
+        dtypes=season_dtypes(SEASON_COLUMNS),
+    )
+
     all_events = []
-    
-    # Используем мультипроцессинг StatsBombPy, если доступен, или цикл
-    # Для надежности делаем цикл с прогресс-баром
-    progress_text = "Анализируем сезон... Скачиваем матчи..."
-    my_bar = st.progress(0, text=progress_text)
-    
-    total = len(match_ids)
-    for i, m_id in enumerate(match_ids):
-        try:
-            ev = sb.events(match_id=m_id)
-            ev['match_id'] = m_id # Запоминаем ID матча
-            
-            # Добавляем инфо о сопернике и дате
-            match_meta = team_matches[team_matches['match_id'] == m_id].iloc[0]
-            opponent = match_meta['away_team'] if match_meta['home_team'] == team_name else match_meta['home_team']
-            ev['opponent'] = opponent
-            ev['match_date'] = match_meta['match_date']
-            
-            all_events.append(ev)
-        except:
-            pass # Если матч битый, пропускаем
-        
-        # Обновляем бар
-        percent = int(((i + 1) / total) * 100)
-        my_bar.progress(percent, text=f"Загрузка матча {i+1} из {total} ({opponent})")
-    
-    my_bar.empty() # Убираем бар
-    
-    # Соединяем все в один огромный DataFrame
-    if all_events:
-        full_df = pd.concat(all_events, ignore_index=True)
-        
-        # Исправляем координаты
-        if 'location' in full_df.columns:
-            full_df['x'] = full_df['location'].apply(lambda x: x[0] if isinstance(x, list) else None)
-            full_df['y'] = full_df['location'].apply(lambda x: x[1] if isinstance(x, list) else None)
-            
-        return full_df
-    else:
-        return pd.DataFrame()
+    for m_id in match_ids:
+        if m_id not in events_by_match:
+            continue # Если матч битый, пропускаем
+        ev = events_by_match[m_id]
+
+        # Добавляем инфо о сопернике и дате
+        match_meta = team_matches[team_matches['match_id'] == m_id].iloc[0]
+        opponent = match_meta['away_team'] if match_meta['home_team'] == team_name else match_meta['home_team']
+        ev['opponent'] = opponent
+        ev['match_date'] = match_meta['match_date']
+
+        all_events.append(ev)
+
+    # Соединяем все в один огромный DataFrame (координаты x / y уже распакованы в хранилище)
+    return event_store.concat_events(all_events, season_dtypes(SEASON_COLUMNS + ['opponent']))
+
+@st.cache_data(ttl=3600) # Кэш живет 1 час
+def load_season_data(competition_id, season_id, team_name="Barcelona"):
+    # Сборка идёт фоновой задачей: не обрывается при уходе со страницы,
+    # и две сессии, открывшие один сезон, ждут одну и ту же загрузку
+    job = jobs.submit('season_data', build_season_data, competition_id, season_id, team_name)
+    return jobs.wait(job, "Анализируем сезон... Скачиваем матчи...")
+
+@st.cache_data(ttl=3600)
+def load_season_index(competition_id, season_id, team_name="Barcelona"):
+    # Таблица сезона, отсортированная по (player, match_id), с индексами игрок / команда / матч / тип.
+    # Выборка игрока: season_index.player_events(idx, name) - срез, а не маска по всему сезону
+    return season_index.build_index(load_season_data(competition_id, season_id, team_name))
+
+# --- ПОТОКОВАЯ АГРЕГАЦИЯ (память не зависит от длины сезона) ---
+PLAYER_KEY = ['player', 'team']
+
+def fold_season(match_frames, reducer):
+    # Каждый матч сразу сворачивается reducer'ом в таблицу сумм по (player, team)
+    # и прибавляется к накопителю; сами события матча после этого не хранятся.
+    totals = None
+    for events in match_frames:
+        part = reducer(events)
+        if part.empty:
+            continue
+        totals = part if totals is None else totals.add(part, fill_value=0)
+    return totals if totals is not None else pd.DataFrame()
+
+def stream_season(competition_id, season_id, reducer, columns, team_name=None, on_progress=None, loaded_ids=None):
+    # Матчи сезона идут из хранилища по одному (с ограниченной очередью загрузки).
+    # loaded_ids - список, куда дописываются id реально свёрнутых матчей (не скачавшиеся пропускаются)
+    matches = event_store.fetch_matches(competition_id, season_id)
+    if team_name is not None:
+        matches = matches[(matches['home_team'] == team_name) | (matches['away_team'] == team_name)]
+
+    def frames():
+        for m_id, ev in event_store.iter_many(
+                matches['match_id'].tolist(), on_progress=on_progress, columns=columns, dtypes=season_dtypes(columns)):
+            if loaded_ids is not None:
+                loaded_ids.append(m_id)
+            yield ev
+    return fold_season(frames(), reducer)
+
+PER_90_STATS = ["Goals", "Assists", "Shots", "Key Passes", "Dribbles", "xG"]
+POSITION_GROUPS = ['GK', 'DEF', 'MID', 'FWD']
+PER_90_COLUMNS = ['match_id', 'minute', 'second', 'player', 'team', 'position', 'type', 'shot_outcome', 'pass_goal_assist',
+                  'pass_shot_assist', 'dribble_outcome', 'shot_statsbomb_xg',
+                  'tactics', 'substitution_replacement', 'foul_committed_card', 'bad_behaviour_card']
+RED_CARDS = ['Red Card', 'Second Yellow']
+
+def position_group(position):
+    # Позиции StatsBomb -> 4 группы. 'Back' проверяем раньше 'Wing' (Left Wing Back - защитник)
+    position = position.astype(str)
+    return pd.Series(np.select(
+        [position.str.contains('Goalkeeper'), position.str.contains('Back'),
+         position.str.contains('Midfield'), position.str.contains('Wing|Forward|Striker')],
+        POSITION_GROUPS, default=''), index=position.index)
+
+def player_minutes(events):
+    # Реальные минуты в ОДНОМ матче: старт из Starting XI, замены, удаления.
+    # Конец матча - последнее событие (с учетом компенсированного времени)
+    t = events['minute'] + events['second'] / 60
+    match_end = t.max()
+
+    # Выход на поле: основа с 0-й минуты, запасные - с минуты замены
+    xi = events[events['type'] == 'Starting XI']
+    starters = [(p['player']['name'], team, 0.0)
+                for tactics, team in zip(xi['tactics'], xi['team']) if isinstance(tactics, dict)
+                for p in tactics.get('lineup', [])]
+    subs = events[events['type'] == 'Substitution']
+    on = pd.concat([
+        pd.DataFrame(starters, columns=['player', 'team', 't']),
+        pd.DataFrame({'player': subs['substitution_replacement'], 'team': subs['team'], 't': t[subs.index]}),
+    ]).dropna(subset=['player']).groupby(PLAYER_KEY)['t'].min()
+
+    # Уход с поля: замена или красная карточка
+    red = pd.Series(False, index=events.index)
+    for col in ['foul_committed_card', 'bad_behaviour_card']:
+        if col in events.columns:
+            red |= events[col].isin(RED_CARDS)
+    gone = events[(events['type'] == 'Substitution') | red]
+    off = t[gone.index].groupby([gone['player'], gone['team']]).min()
+
+    off = off.reindex(on.index).fillna(match_end)
+    return (off - on).clip(lower=0).rename('Minutes')
+
+def per_90_counts(events):
+    # Reducer: счётчики calculate_per_90 и реальные минуты для всех игроков за один groupby
+    minutes = None
+    if 'tactics' in events.columns:
+        # Минуты считаются внутри каждого матча, потом суммируются
+        minutes = pd.concat([player_minutes(m) for _, m in events.groupby('match_id', sort=False)])
+        minutes = minutes.groupby(level=PLAYER_KEY).sum()
+    events = events.dropna(subset=['player'])
+    flags = pd.DataFrame({
+        "Goals": events['shot_outcome'] == 'Goal',
+        "Assists": events['pass_goal_assist'] == True if 'pass_goal_assist' in events.columns else False,
+        "Shots": events['type'] == 'Shot',
+        "Key Passes": events['pass_shot_assist'] == True if 'pass_shot_assist' in events.columns else False,
+        "Dribbles": (events['type'] == 'Dribble') & (events['dribble_outcome'] == 'Complete'),
+        "xG": events['shot_statsbomb_xg'].fillna(0) if 'shot_statsbomb_xg' in events.columns else 0.0,
+    }, index=events.index).astype(float)
+    flags['player'] = events['player']
+    flags['team'] = events['team']
+    counts = flags.groupby(PLAYER_KEY)[PER_90_STATS].sum()
+    counts['Matches'] = events.groupby(PLAYER_KEY)['match_id'].nunique()
+    if 'position' in events.columns:
+        # Сколько действий игрок сделал на каждой позиции (суммируется по матчам, основная - максимум)
+        group = position_group(events['position'])
+        pos_counts = pd.crosstab([events['player'], events['team']], group).reindex(columns=POSITION_GROUPS, fill_value=0)
+        counts = counts.join(pos_counts.add_prefix('pos_'))
+    if minutes is not None:
+        # Игроки, вышедшие на поле без единого действия, тоже попадают в таблицу
+        counts = counts.reindex(counts.index.union(minutes.index), fill_value=0)
+        counts['Minutes'] = minutes.reindex(counts.index).fillna(0)
+        counts.loc[counts['Matches'] == 0, 'Matches'] = 1
+    return counts
+
+def per_90_matrix(totals):
+    # Матрица игрок x показатель с колонками p90 для всех игроков сразу
+    matrix = totals.copy()
+    minutes = matrix['Minutes'] if 'Minutes' in matrix.columns else matrix['Matches'] * 90 # Грубая оценка без минут
+    n90 = (minutes / 90.0).clip(lower=1.0)
+    for k in PER_90_STATS:
+        matrix[k + " p90"] = (matrix[k] / n90).round(2)
+    return matrix
+
+@shared_cache.cached('season_per_90_ids', ttl=3600)
+def build_season_per_90(competition_id, season_id, team_name="Barcelona", on_progress=None):
+    # (матрица, id матчей, из которых она посчитана) - по ним поиск похожих игроков досворачивает новые матчи
+    match_ids = []
+    totals = stream_season(competition_id, season_id, per_90_counts, PER_90_COLUMNS, team_name=team_name,
+                           on_progress=on_progress, loaded_ids=match_ids)
+    if totals.empty:
+        return totals, match_ids
+    return per_90_matrix(totals), match_ids
+
+@st.cache_data(ttl=3600)
+def load_season_per_90_with_ids(competition_id, season_id, team_name="Barcelona"):
+    job = jobs.submit('season_per_90', build_season_per_90, competition_id, season_id, team_name)
+    return jobs.wait(job, "Считаем сезон per 90...")
+
+def load_season_per_90(competition_id, season_id, team_name="Barcelona"):
+    # То же, что load_season_data + calculate_per_90, но для всех игроков сразу
+    # и без таблицы событий сезона в памяти. Поиск игрока: matrix.loc[player]
+    return load_season_per_90_with_ids(competition_id, season_id, team_name)[0]
 
 def calculate_per_90(df, player_name):
-    # Считаем сыгранные минуты
-    # В StatsBomb нет простой колонки "minutes played", нужно считать разницу time
-    # Упростим: считаем количество матчей в старте * 90 + замены
-    # Для точности возьмем просто: (Кол-во матчей * 90) - это грубо, но работает для демо
-    # В идеале нужно парсить события Substitution
-    
-    p_events = df[df['player'] == player_name]
-    matches_played = p_events['match_id'].nunique()
-    minutes = matches_played * 90 # Грубая оценка
+    # df - события (как раньше) или накопитель per_90_counts / load_season_per_90
+    if 'player' in df.columns:
+        df = per_90_counts(df) if 'tactics' in df.columns else per_90_counts(df[df['player'] == player_name])
+    totals = df.xs(player_name, level='player') if player_name in df.index.get_level_values('player') else df.iloc[0:0]
+
+    matches_played = int(totals['Matches'].sum())
+    if 'Minutes' in totals.columns:
+        minutes = float(totals['Minutes'].sum())
+    else:
+        minutes = matches_played * 90 # Грубая оценка
     n90 = minutes / 90.0
-    
+
     if n90 < 1: n90 = 1.0
-    
-    stats = {
-        "Goals": len(p_events[p_events['shot_outcome'] == 'Goal']),
-        "Assists": len(p_events[p_events['pass_goal_assist'] == True]) if 'pass_goal_assist' in p_events.columns else 0,
-        "Shots": len(p_events[p_events['type'] == 'Shot']),
-        "Key Passes": len(p_events[p_events.get('pass_shot_assist', pd.Series(0)) == True]),
-        "Dribbles": len(p_events[(p_events['type'] == 'Dribble') & (p_events['dribble_outcome'] == 'Complete')]),
-        "xG": p_events['shot_statsbomb_xg'].sum() if 'shot_statsbomb_xg' in p_events.columns else 0
-    }
-    
+
+    stats = {k: totals[k].sum() for k in PER_90_STATS}
+    stats = {k: (int(v) if k != "xG" else float(v)) for k, v in stats.items()}
+
     # Добавляем per 90
     stats_per_90 = {k + " p90": round(v / n90, 2) for k, v in stats.items()}
     stats.update(stats_per_90)
     stats['Matches'] = matches_played
-    
-    return stats
\ No newline at end of file
+    stats['Minutes'] = int(round(minutes))
+
+    return stats
+
+# --- xG CHAIN / xG BUILDUP ПО ВСЕМУ СЕЗОНУ ---
+POSSESSION_ACTIONS = ['Pass', 'Carry', 'Dribble', 'Shot']
+XG_CHAIN_COLUMNS = ['match_id', 'possession', 'type', 'player', 'team', 'shot_statsbomb_xg', 'pass_shot_assist']
+
+def calculate_xg_chain(events):
+    # Один проход по всем событиям сезона. Владение уникально только внутри матча,
+    # поэтому ключ владения - (match_id, possession).
+    # Возвращает разбивку по матчам: match_id, player, team, xG Chain, xG Buildup
+    columns = ['match_id', 'player', 'team', 'xG Chain', 'xG Buildup']
+    if events.empty:
+        return pd.DataFrame(columns=columns)
+
+    poss_key = ['match_id', 'possession']
+    df = events[events['type'].isin(POSSESSION_ACTIONS)]
+
+    # 1. xG владения = сумма xG всех его ударов
+    shots = df[df['type'] == 'Shot'].dropna(subset=['shot_statsbomb_xg'])
+    poss_xg = shots.groupby(poss_key)['shot_statsbomb_xg'].sum().rename('possession_xg')
+
+    # 2. Оставляем только владения с ударом
+    df = df.join(poss_xg, on=poss_key, how='inner')
+    df = df[df['possession_xg'] > 0]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    # 3. Бьющий и автор паса под удар исключаются из Buildup только в ЭТОМ владении
+    finisher = df['type'] == 'Shot'
+    if 'pass_shot_assist' in df.columns:
+        finisher = finisher | (df['pass_shot_assist'] == True)
+    df = df.assign(finisher=finisher)
+
+    # Каждый игрок считается один раз за владение
+    per_poss = df.groupby(poss_key + ['player', 'team'], sort=False).agg(
+        possession_xg=('possession_xg', 'first'),
+        finisher=('finisher', 'any'),
+    ).reset_index()
+    per_poss['buildup_xg'] = per_poss['possession_xg'].where(~per_poss['finisher'], 0.0)
+
+    per_match = per_poss.groupby(['match_id', 'player', 'team'], sort=False).agg(
+        **{'xG Chain': ('possession_xg', 'sum'), 'xG Buildup': ('buildup_xg', 'sum')}
+    ).reset_index()
+    return per_match[columns]
+
+def season_xg_chain(per_match):
+    # Суммируем разбивку по матчам в таблицу сезона
+    season_total = per_match.groupby(['player', 'team']).agg(**{
+        'xG Chain': ('xG Chain', 'sum'),
+        'xG Buildup': ('xG Buildup', 'sum'),
+        'Matches': ('match_id', 'nunique'),
+    }).reset_index()
+
+    # Нормализуем Per 90 (упрощенно)
+    season_total['xG Chain p90'] = season_total['xG Chain'] / season_total['Matches']
+    season_total['xG Buildup p90'] = season_total['xG Buildup'] / season_total['Matches']
+    return season_total